@@ -0,0 +1,66 @@
+"""Micro-benchmark for ResourcePool.
+
+Measures the average cost of `add`, `find`, `visit` and `get_unvisited` as the
+pool grows. Per-op cost should stay flat from 100 to 100k resources.
+
+Usage: python -m benchmarks.resource_pool
+"""
+import time
+from blockagi.resource_pool import ResourcePool
+
+SIZES = [100, 1_000, 10_000, 100_000]
+SAMPLES = 1_000
+
+
+def bench(size: int) -> dict:
+    urls = [f"https://example.com/articles/{i}?ref=search" for i in range(size)]
+    pool = ResourcePool()
+
+    start = time.perf_counter()
+    for url in urls:
+        pool.add(url=url, description=f"Article {url}")
+    add_us = (time.perf_counter() - start) / size * 1e6
+
+    # Sample lookups spread across the whole pool
+    sample = urls[:: max(1, size // SAMPLES)][:SAMPLES]
+
+    start = time.perf_counter()
+    for url in sample:
+        pool.find(url)
+    find_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    start = time.perf_counter()
+    for url in sample:
+        pool.add(url=url)  # Duplicate add is a lookup
+    dup_add_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    start = time.perf_counter()
+    for url in sample:
+        pool.visit(url, "content")
+    visit_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    start = time.perf_counter()
+    unvisited = pool.get_unvisited()
+    unvisited_us = (time.perf_counter() - start) / max(1, len(unvisited)) * 1e6
+
+    return {
+        "size": size,
+        "add": add_us,
+        "find": find_us,
+        "dup_add": dup_add_us,
+        "visit": visit_us,
+        "unvisited/item": unvisited_us,
+    }
+
+
+def main():
+    columns = ["size", "add", "find", "dup_add", "visit", "unvisited/item"]
+    print("Per-op cost in microseconds")
+    print("".join(f"{c:>16}" for c in columns))
+    for size in SIZES:
+        row = bench(size)
+        print(f"{row['size']:>16}" + "".join(f"{row[c]:>16.2f}" for c in columns[1:]))
+
+
+if __name__ == "__main__":
+    main()
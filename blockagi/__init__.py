@@ -1,4 +1,9 @@
 from blockagi.chains import BlockAGIChain, BlockAGICallbackHandler
-from blockagi.resource_pool import ResourcePool
+from blockagi.resource_pool import ResourcePool, SQLiteResourcePool
 
-__all__ = ["BlockAGIChain", "BlockAGICallbackHandler", "ResourcePool"]
+__all__ = [
+    "BlockAGIChain",
+    "BlockAGICallbackHandler",
+    "ResourcePool",
+    "SQLiteResourcePool",
+]
@@ -2,6 +2,7 @@ from blockagi.chains.plan import PlanChain
 from blockagi.chains.research import ResearchChain
 from blockagi.chains.narrate import NarrateChain
 from blockagi.chains.evaluate import EvaluateChain
+from blockagi.chains.evaluate_plan import EvaluatePlanChain
 from blockagi.chains.compose import BlockAGIChain
 from blockagi.chains.base import BlockAGICallbackHandler
 
@@ -11,6 +12,7 @@ __all__ = [
     "ResearchChain",
     "NarrateChain",
     "EvaluateChain",
+    "EvaluatePlanChain",
     "BlockAGIChain",
     "BlockAGICallbackHandler",
 ]
@@ -1,9 +1,17 @@
+import asyncio
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.chains.base import Chain
 from langchain.chat_models.base import BaseChatModel
 
+from blockagi.llm_cache import LLMCache
+from blockagi.model_router import ModelRouter, label
+from blockagi.structured_output import describe, structured_output
+
+# Attempts at a model before falling back to the next one
+FALLBACK_RETRY_COUNT = 2
+
 
 # HACK: LangChain doesn't support custom handlers yet, so we have to use this workaround
 # TODO: Change to use on_chain_start and on_chain_end and follow LandChain's conventions
@@ -34,6 +42,10 @@ class BlockAGICallbackHandler(BaseCallbackHandler):
         """Run whenever there is a new log message."""
         pass
 
+    def on_llm_retry(self, error: Exception) -> Any:
+        """Run when an LLM call failed and is about to be retried."""
+        pass
+
 
 # Base class that supports custom handlers
 class CustomCallbackChain(Chain):
@@ -51,14 +63,157 @@ class CustomCallbackChain(Chain):
 
 class CustomCallbackLLMChain(CustomCallbackChain):
     llm: BaseChatModel
+    llm_cache: Optional[LLMCache] = None
+    # Picks the model of each chain and phase; all chains use `llm` if None
+    model_router: Optional[ModelRouter] = None
+
+    def models(self, phase=None):
+        """Models to try for this chain (and phase), in fallback order."""
+        if self.model_router is None:
+            return [self.llm]
+        return self.model_router.models(self.__class__.__name__, phase)
+
+    def retry_llm(self, messages, retry_count=5, llm=None, callbacks=None, phase=None):
+        models = [llm] if llm else self.models(phase)
+        cached = self._cached(models, messages)
+        if cached is not None:
+            model, content = cached
+            return self.llm_cache.replay(model, messages, content, callbacks)
+        for index, model in enumerate(models):
+            last = index == len(models) - 1
+            try:
+                response = self._retry_llm(
+                    model,
+                    messages,
+                    retry_count if last else FALLBACK_RETRY_COUNT,
+                    callbacks,
+                )
+            except Exception as e:
+                if last:
+                    raise
+                self._log_fallback(model, models[index + 1], e)
+                continue
+            if self.llm_cache is not None:
+                self.llm_cache.put(model, messages, response.content)
+            return response
+
+    async def aretry_llm(
+        self, messages, retry_count=5, llm=None, callbacks=None, phase=None
+    ):
+        models = [llm] if llm else self.models(phase)
+        cached = self._cached(models, messages)
+        if cached is not None:
+            model, content = cached
+            return await self.llm_cache.areplay(model, messages, content, callbacks)
+        for index, model in enumerate(models):
+            last = index == len(models) - 1
+            try:
+                response = await self._aretry_llm(
+                    model,
+                    messages,
+                    retry_count if last else FALLBACK_RETRY_COUNT,
+                    callbacks,
+                )
+            except Exception as e:
+                if last:
+                    raise
+                self._log_fallback(model, models[index + 1], e)
+                continue
+            if self.llm_cache is not None:
+                self.llm_cache.put(model, messages, response.content)
+            return response
+
+    def _cached(self, models, messages):
+        """The first model with a cached response, and the response."""
+        if self.llm_cache is None:
+            return None
+        # Responses are stored under the model that answered, which may be
+        # a fallback
+        cached = self.llm_cache.get_first(models, messages)
+        if cached is not None:
+            self.fire_log("Using cached LLM response")
+        return cached
+
+    def structured_llm(self, messages, schema, callbacks=None):
+        """Call the LLM and parse its JSON response against `schema`."""
+        response = self.retry_llm(messages, callbacks=callbacks)
+        value, invalid = structured_output.parse(response.content, schema)
+        if not invalid:
+            return value
+        self._log_reask(invalid)
+        fix = self.retry_llm(
+            messages + [response, structured_output.reask_message(invalid)]
+        )
+        return structured_output.merge(value, invalid, fix.content, schema)
 
-    def retry_llm(self, messages, retry_count=5):
+    async def astructured_llm(self, messages, schema, callbacks=None):
+        response = await self.aretry_llm(messages, callbacks=callbacks)
+        value, invalid = structured_output.parse(response.content, schema)
+        if not invalid:
+            return value
+        self._log_reask(invalid)
+        fix = await self.aretry_llm(
+            messages + [response, structured_output.reask_message(invalid)]
+        )
+        return structured_output.merge(value, invalid, fix.content, schema)
+
+    def _log_reask(self, invalid):
+        self.fire_log(
+            "Re-asking the LLM for the invalid parts of its response\n"
+            + describe(invalid)
+        )
+
+    def _log_fallback(self, model, fallback, error):
+        self.fire_log(
+            f"LLM {label(model)} failed with error: {error}; "
+            f"falling back to {label(fallback)}"
+        )
+
+    def _record(self, llm, messages, response, started_at):
+        if self.model_router is not None:
+            latency = time.monotonic() - started_at
+            self.model_router.record(llm, latency, messages, response)
+
+    def _call_llm(self, llm, messages, callbacks):
+        started_at = time.monotonic()
+        try:
+            response = llm(messages, callbacks=callbacks)
+        except Exception:
+            self._record(llm, messages, None, started_at)
+            raise
+        self._record(llm, messages, response, started_at)
+        return response
+
+    async def _acall_llm(self, llm, messages, callbacks):
+        started_at = time.monotonic()
+        try:
+            response = await llm.apredict_messages(messages, callbacks=callbacks)
+        except Exception:
+            self._record(llm, messages, None, started_at)
+            raise
+        self._record(llm, messages, response, started_at)
+        return response
+
+    def _retry_llm(self, llm, messages, retry_count, callbacks):
         sleep_duration = 0.5
         for _idx in range(retry_count - 1):
             try:
-                return self.llm(messages)
+                return self._call_llm(llm, messages, callbacks)
             except Exception as e:
                 self.fire_log(f"LLM failed with error: {e}; Retrying")
+                self.fire_callback(event="on_llm_retry", error=e)
                 time.sleep(sleep_duration)
             sleep_duration *= 2
-        return self.llm(messages)
+        return self._call_llm(llm, messages, callbacks)
+
+    async def _aretry_llm(self, llm, messages, retry_count, callbacks):
+        sleep_duration = 0.5
+        for _idx in range(retry_count - 1):
+            try:
+                return await self._acall_llm(llm, messages, callbacks)
+            except Exception as e:
+                self.fire_log(f"LLM failed with error: {e}; Retrying")
+                self.fire_callback(event="on_llm_retry", error=e)
+                await asyncio.sleep(sleep_duration)
+            sleep_duration *= 2
+        return await self._acall_llm(llm, messages, callbacks)
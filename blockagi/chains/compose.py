@@ -1,15 +1,18 @@
-from typing import List, Dict, Any, Optional
+from typing import Generator, List, Dict, Any, Optional, Tuple
 from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chains.base import Chain
 from langchain.chat_models.base import BaseChatModel
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.tools.base import BaseTool
 
+from blockagi.iteration_scheduler import IterationScheduler
 from blockagi.schema import BaseResourcePool
 from blockagi.chains.base import CustomCallbackLLMChain, CustomCallbackChain
 from blockagi.chains.plan import PlanChain
 from blockagi.chains.research import ResearchChain
 from blockagi.chains.narrate import NarrateChain
 from blockagi.chains.evaluate import EvaluateChain
+from blockagi.chains.evaluate_plan import EvaluatePlanChain
 
 
 class BlockAGIChain(CustomCallbackLLMChain):
@@ -19,6 +22,11 @@ class BlockAGIChain(CustomCallbackLLMChain):
     resource_pool: BaseResourcePool
     tools: List[BaseTool] = []
     callbacks: Optional[List[BaseCallbackHandler]] = None
+    # Evaluate a round and plan the next one in a single LLM call
+    fuse_evaluate_plan: bool = False
+    evaluate_plan_chain: Optional[EvaluatePlanChain] = None
+    # Decides when to stop; runs exactly `iteration_count` rounds if None
+    scheduler: Optional[IterationScheduler] = None
 
     @property
     def input_keys(self) -> List[str]:
@@ -42,31 +50,77 @@ class BlockAGIChain(CustomCallbackLLMChain):
 
     def __init__(self, **kwargs: Any):
         super().__init__(**kwargs)
+        research_chain = ResearchChain(**kwargs)
         self.chains = [
-            PlanChain(**kwargs),
-            ResearchChain(**kwargs),
+            PlanChain(research_chain=research_chain, **kwargs),
+            research_chain,
             NarrateChain(**kwargs),
             EvaluateChain(**kwargs),
         ]
+        if self.scheduler is None:
+            self.scheduler = IterationScheduler(rounds=self.iteration_count)
+        if self.fuse_evaluate_plan:
+            self.evaluate_plan_chain = EvaluatePlanChain(**kwargs)
 
     def _call(
         self,
         inputs: Dict[str, Any],
     ) -> Dict[str, Any]:
+        rounds = self._rounds(inputs)
+        try:
+            chain, chain_inputs = next(rounds)
+            while True:
+                chain, chain_inputs = rounds.send(chain(inputs=chain_inputs))
+        except StopIteration:
+            return {}
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        rounds = self._rounds(inputs)
+        try:
+            chain, chain_inputs = next(rounds)
+            while True:
+                outputs = await chain.acall(inputs=chain_inputs)
+                chain, chain_inputs = rounds.send(outputs)
+        except StopIteration:
+            return {}
+
+    def _rounds(
+        self, inputs: Dict[str, Any]
+    ) -> Generator[Tuple[Chain, Dict[str, Any]], Dict[str, Any], None]:
+        """Yield each chain with its inputs and receive its outputs.
+
+        Shared by the sync and async paths, which only differ in how a chain
+        is called.
+        """
+        self.scheduler.start(inputs["objectives"], inputs["findings"].narrative)
+        round_count = 0
+        another_round = True
         # Run in multiple iterations
-        for step_count in range(self.iteration_count):
-            self.fire_log(f"Beginning round {step_count+1}/{self.iteration_count}")
+        while another_round:
+            round_count += 1
+            self.fire_log(f"Beginning round {round_count}/{self.scheduler.rounds}")
             outputs = None
             # Call the callback
             self.fire_callback(event="on_iteration_start", inputs=inputs)
+            fused = (
+                self.evaluate_plan_chain is not None
+                and round_count < self.scheduler.max_rounds
+            )
             # Run through all the chains
             for chain in self.chains:
+                if isinstance(chain, PlanChain) and "research_tasks" in inputs:
+                    continue  # Already planned by the previous round
+                if isinstance(chain, EvaluateChain) and fused:
+                    chain = self.evaluate_plan_chain
                 # Call the callback
                 self.fire_callback(
                     event="on_step_start", step=chain.__class__.__name__, inputs=inputs
                 )
                 # Call the current step
-                outputs = chain(inputs=inputs)
+                outputs = yield chain, inputs
                 # Call the callback
                 self.fire_callback(
                     event="on_step_end",
@@ -77,6 +131,10 @@ class BlockAGIChain(CustomCallbackLLMChain):
                 # Update the inputs for the next step
                 inputs = outputs
 
+            another_round, report = self.scheduler.end_round(
+                outputs["updated_objectives"], outputs["narrative"].markdown
+            )
+            self.fire_log(report)
             # Call the callback
             self.fire_callback(event="on_iteration_end", outputs=outputs)
             # Set the inputs for the next iteration
@@ -84,6 +142,7 @@ class BlockAGIChain(CustomCallbackLLMChain):
                 "objectives": outputs["updated_objectives"],
                 "findings": outputs["updated_findings"],
             }
+            if fused:
+                inputs["research_tasks"] = outputs["research_tasks"]
 
-        self.fire_log(f"Agent finished running ({self.iteration_count} rounds)")
-        return {}
+        self.fire_log(f"Agent finished running ({round_count} rounds)")
@@ -1,13 +1,75 @@
-import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from langchain.chat_models.base import BaseChatModel
 from langchain.tools.base import BaseTool
-from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
 from blockagi.chains.base import CustomCallbackLLMChain
 from blockagi.utils import to_json_str, format_objectives
 
 from blockagi.schema import Objective, Findings, Narrative
 
+EVALUATION_SCHEMA = {
+    "updated_findings": {
+        "generated_objectives": List[Objective],
+        "remark": str,
+    },
+    "updated_objectives": List[Objective],
+}
+
+EVALUATION_FORMAT = {
+    "updated_findings": {
+        "generated_objectives": [
+            Objective(
+                topic="additional objective that helps achieve the user objectives",
+                expertise="a new float value in [0, 1] range indicating the expertise of this objective",
+            ),
+            "... include all generated objectives",
+        ],
+        "remark": "a note to the next iteration of BlockAGI to help it improve",
+    },
+    "updated_objectives": [
+        Objective(
+            topic="same as the user objectives",
+            expertise="a new float value in [0, 1] range indicating the expertise of this objective",
+        ),
+        "... include all objectives",
+    ],
+}
+
+EVALUATION_INSTRUCTIONS = (
+    "Give a thorough evaluation of your work and plan to become a better expert. "
+    "Your evaluation should include:\n"
+    "- Modified up to 1 new GENERATED OBJECTIVE to help yourself become an "
+    "expert and answer USER OBJECTIVES with further research. Do not modify the USER OBJECTIVES.\n"
+    "- A remark to help the next iteration of BlockAGI improve. Be critical and suggest "
+    "only concise and helpful feedback for the AI agent.\n"
+    "- A new expertise weight between (0 and 1) of all the OBJECTIVES. "
+    "If the goal is close to being met, its expertise should be higher."
+)
+
+
+def parse_evaluation(
+    result: Dict[str, Any], narrative: Narrative
+) -> Tuple[Findings, List[Objective]]:
+    updated_findings = Findings(
+        generated_objectives=[
+            Objective(
+                topic=obj["topic"],
+                expertise=float(obj["expertise"]),
+            )
+            for obj in result["updated_findings"]["generated_objectives"]
+        ],
+        remark=result["updated_findings"]["remark"],
+        narrative=narrative.markdown,
+    )
+    updated_objectives = [
+        Objective(
+            topic=obj["topic"],
+            expertise=float(obj["expertise"]),
+        )
+        for obj in result["updated_objectives"]
+    ]
+    return updated_findings, updated_objectives
+
 
 class EvaluateChain(CustomCallbackLLMChain):
     agent_role: str = "a Research Assistant"
@@ -30,31 +92,19 @@ class EvaluateChain(CustomCallbackLLMChain):
         ]
 
     def _call(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.structured_llm(self._prepare(inputs), EVALUATION_SCHEMA)
+        return self._process(inputs, result)
+
+    async def _acall(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self.astructured_llm(self._prepare(inputs), EVALUATION_SCHEMA)
+        return self._process(inputs, result)
+
+    def _prepare(self, inputs: Dict[str, Any]) -> List[BaseMessage]:
         objectives: List[Objective] = inputs["objectives"]
         findings: Findings = inputs["findings"]
         narrative: Narrative = inputs["narrative"]
 
         self.fire_log("Evaluating the narrative for the next iteration")
-        response_format = {
-            "updated_findings": {
-                "generated_objectives": [
-                    Objective(
-                        topic="additional objective that helps achieve the user objectives",
-                        expertise="a new float value in [0, 1] range indicating the expertise of this objective",
-                    ),
-                    "... include all generated objectives",
-                ],
-                "remark": "a note to the next iteration of BlockAGI to help it improve",
-            },
-            "updated_objectives": [
-                Objective(
-                    topic="same as the user objectives",
-                    expertise="a new float value in [0, 1] range indicating the expertise of this objective",
-                ),
-                "... include all objectives",
-            ],
-        }
-
         messages = [
             SystemMessage(
                 content=f"You are {self.agent_role}. "
@@ -70,7 +120,7 @@ class EvaluateChain(CustomCallbackLLMChain):
                 f"{findings.remark}\n\n"
                 "You should ONLY respond in the JSON format as described below\n"
                 "## RESPONSE FORMAT:\n"
-                f"{to_json_str(response_format)}"
+                f"{to_json_str(EVALUATION_FORMAT)}"
             ),
             HumanMessage(
                 content="You just finished a research iteration and formulated a FINDING below.\n"
@@ -79,45 +129,22 @@ class EvaluateChain(CustomCallbackLLMChain):
                 f"{narrative.markdown}\n"
                 "```\n\n"
                 "# YOUR TASK:\n"
-                "Give a thorough evaluation of your work and plan to become a better expert. "
-                "Your evaluation should include:\n"
-                "- Modified up to 1 new GENERATED OBJECTIVE to help yourself become an "
-                "expert and answer USER OBJECTIVES with further research. Do not modify the USER OBJECTIVES.\n"
-                "- A remark to help the next iteration of BlockAGI improve. Be critical and suggest "
-                "only concise and helpful feedback for the AI agent.\n"
-                "- A new expertise weight between (0 and 1) of all the OBJECTIVES. "
-                "If the goal is close to being met, its expertise should be higher."
+                f"{EVALUATION_INSTRUCTIONS}"
                 "\n\n"
                 "# YOUR TASK:\n"
                 "Respond using ONLY the format specified above:"
             ),
         ]
 
-        response = self.retry_llm(messages)
-
-        result = json.loads(response.content)
+        return messages
 
-        updated_findings = Findings(
-            generated_objectives=[
-                Objective(
-                    topic=obj["topic"],
-                    expertise=obj["expertise"],
-                )
-                for obj in result["updated_findings"]["generated_objectives"]
-            ],
-            remark=result["updated_findings"]["remark"],
-            narrative=narrative.markdown,
+    def _process(
+        self, inputs: Dict[str, Any], result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        updated_findings, updated_objectives = parse_evaluation(
+            result, inputs["narrative"]
         )
-
         self.fire_log(f'Agent\'s remark: "{updated_findings.remark}"')
-        updated_objectives = [
-            Objective(
-                topic=obj["topic"],
-                expertise=obj["expertise"],
-            )
-            for obj in result["updated_objectives"]
-        ]
-
         return {
             "updated_findings": updated_findings,
             "updated_objectives": updated_objectives,
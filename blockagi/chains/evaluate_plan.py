@@ -0,0 +1,127 @@
+from typing import List, Dict, Any, Tuple
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from blockagi.chains.evaluate import (
+    EVALUATION_FORMAT,
+    EVALUATION_INSTRUCTIONS,
+    EVALUATION_SCHEMA,
+    parse_evaluation,
+)
+from blockagi.chains.plan import (
+    PLAN_FORMAT,
+    PLAN_INSTRUCTIONS,
+    PlanChain,
+    format_plan_context,
+)
+from blockagi.utils import to_json_str, format_objectives
+
+from blockagi.schema import Objective, Findings, Narrative, Resource, ResearchTask
+
+EVALUATION_PLAN_SCHEMA = {
+    **EVALUATION_SCHEMA,
+    "research_tasks": List[ResearchTask],
+}
+
+EVALUATION_PLAN_FORMAT = {
+    **EVALUATION_FORMAT,
+    "research_tasks": PLAN_FORMAT,
+}
+
+
+class EvaluatePlanChain(PlanChain):
+    """Evaluates the narrative and plans the next round in one LLM call.
+
+    Replaces EvaluateChain of one round and PlanChain of the next.
+    """
+
+    @property
+    def input_keys(self) -> List[str]:
+        return [
+            "objectives",  # Primary input
+            "findings",  # Previous findings
+            "narrative",  # Narrate    -> Evaluate
+        ]
+
+    @property
+    def output_keys(self) -> List[str]:
+        return [
+            # Feedback to next iteration
+            "updated_findings",  # Evaluate   -> Plan
+            "updated_objectives",  # Evaluate   -> Plan
+            "research_tasks",  # Plan -> Research of the next iteration
+        ]
+
+    def _call(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages, resources = self._prepare(inputs)
+        result = self.structured_llm(messages, EVALUATION_PLAN_SCHEMA)
+        return self._process_fused(inputs, result, resources)
+
+    async def _acall(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages, resources = self._prepare(inputs)
+        result = await self.astructured_llm(messages, EVALUATION_PLAN_SCHEMA)
+        return self._process_fused(inputs, result, resources)
+
+    def _prepare(
+        self, inputs: Dict[str, Any]
+    ) -> Tuple[List[BaseMessage], List[Resource]]:
+        objectives: List[Objective] = inputs["objectives"]
+        findings: Findings = inputs["findings"]
+        narrative: Narrative = inputs["narrative"]
+
+        self.fire_log("Evaluating the narrative and planning the next iteration")
+
+        resources, tools, executed_tasks = self._plan_context(objectives, findings)
+
+        messages = [
+            SystemMessage(
+                content=f"You are {self.agent_role}. "
+                "Your job is to evaluate YOUR FINDING and create a plan to utilize tools to "
+                "become expert in the primary goals under OBJECTIVES and the secondary goals "
+                "under GENERATED_OBJECTIVES. "
+                "Take into account the limitation of all the tools available to you."
+                "\n\n"
+                "## USER OBJECTIVES:\n"
+                f"{format_objectives(objectives)}\n\n"
+                "## GENERATED OBJECTIVES:\n"
+                f"{format_objectives(findings.generated_objectives)}\n\n"
+                "## REMARK:\n"
+                f"{findings.remark}\n\n"
+                "You should ONLY respond in the JSON format as described below\n"
+                "## RESPONSE FORMAT:\n"
+                f"{to_json_str(EVALUATION_PLAN_FORMAT)}"
+            ),
+            HumanMessage(
+                content="You just finished a research iteration and formulated a FINDING below.\n"
+                "## YOUR FINDINGS:\n"
+                "```\n"
+                f"{narrative.markdown}\n"
+                "```\n\n"
+                f"{format_plan_context(resources, tools, executed_tasks)}"
+                "# YOUR TASK:\n"
+                f"{EVALUATION_INSTRUCTIONS}"
+                "\n\n"
+                "Then, under research_tasks, plan the next iteration:\n"
+                f"{PLAN_INSTRUCTIONS}"
+                "\n"
+                "Respond using ONLY the format specified above:"
+            ),
+        ]
+
+        return messages, resources
+
+    def _process_fused(
+        self,
+        inputs: Dict[str, Any],
+        result: Dict[str, Any],
+        resources: List[Resource],
+    ) -> Dict[str, Any]:
+        updated_findings, updated_objectives = parse_evaluation(
+            result, inputs["narrative"]
+        )
+        self.fire_log(f'Agent\'s remark: "{updated_findings.remark}"')
+        # Not dispatched early: the scheduler may still skip the next round
+        planned = self._process(result["research_tasks"], resources)
+        return {
+            "updated_findings": updated_findings,
+            "updated_objectives": updated_objectives,
+            "research_tasks": planned["research_tasks"],
+        }
@@ -1,16 +1,61 @@
-from typing import List, Dict, Any
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import List, Dict, Any, Optional, Set
 from langchain.chat_models.base import BaseChatModel
 from langchain.tools.base import BaseTool
-from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from pydantic import validator
 from blockagi.chains.base import CustomCallbackLLMChain
+from blockagi.narrative_document import NarrativeDocument
+from blockagi.passage_index import Passage, PassageIndex
+from blockagi.structured_output import structured_output
 from blockagi.utils import to_json_str, format_objectives
+from blockagi.utils.tokens import (
+    context_size,
+    count_message_tokens,
+    count_tokens,
+    model_name,
+    pack_bins,
+    truncate_tokens,
+)
 
 from blockagi.schema import Objective, Findings, ResearchResult, Narrative
 
 
+NARRATE_MODES = ("sequential", "map_reduce", "patch")
+
+
+def _result_url(result: ResearchResult) -> str:
+    if isinstance(result.args, dict) and isinstance(result.args.get("url"), str):
+        return result.args["url"]
+    return result.citation or f"{result.tool}:{to_json_str(result.args)}"
+
+
 class NarrateChain(CustomCallbackLLMChain):
     agent_role: str = "a Research Assistant"
     tools: List[BaseTool]
+    # "sequential" narrates chunk by chunk. "map_reduce" extracts findings
+    # from all chunks concurrently, then merges them in a single call.
+    # "patch" narrates chunk by chunk, but asks for section edits only.
+    narrate_mode: str = "sequential"
+    map_concurrency: int = 4
+    # Tokens kept free in every prompt for the model's response
+    reserve_output_tokens: int = 3000
+    # Smallest chunk, should the prompt leave less room than that
+    min_chunk_tokens: int = 1000
+    # If set, long results are cut down to their passages most relevant to
+    # the objectives before narrating
+    passage_index: Optional[PassageIndex] = None
+    passages_per_objective: int = 4
+
+    @validator("narrate_mode")
+    def check_narrate_mode(cls, value):
+        if value not in NARRATE_MODES:
+            raise ValueError(
+                f"Invalid narrate mode {value}; use one of {NARRATE_MODES}"
+            )
+        return value
 
     @property
     def input_keys(self) -> List[str]:
@@ -27,55 +72,385 @@ class NarrateChain(CustomCallbackLLMChain):
         ]
 
     def _call(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
-        # As research results can be large, we chunk them into smaller pieces
-        # Max size of each chunk is 20,000 characters, approximately
+        inputs = self._select_passages(inputs)
         findings: Findings = inputs["findings"]
         research_results: List[ResearchResult] = inputs["research_results"]
 
-        chunks = []
-        current_chunk = []
-        current_size = 0
+        chunks = self._chunks(inputs)
+        if self.narrate_mode == "map_reduce" and len(chunks) > 1:
+            # Re-pack for the map model, whose prompt is smaller
+            chunks = self._chunks(inputs, map_step=True)
 
-        # Sort research results by size (smaller first)
-        sorted_results = sorted(research_results, key=lambda x: len(to_json_str(x)))
+        self.fire_log(
+            f"Applying {len(research_results)} results splitting into {len(chunks)} chunks"
+        )
+        if self.narrate_mode == "map_reduce" and len(chunks) > 1:
+            self.fire_log(f"Extracting findings from {len(chunks)} chunks concurrently")
+            with ThreadPoolExecutor(max_workers=self.map_concurrency) as executor:
+                extracts = list(
+                    executor.map(
+                        lambda chunk: self.retry_llm(
+                            self._map_messages(inputs, chunk), phase="map"
+                        ).content,
+                        chunks,
+                    )
+                )
+            return self._reduce(inputs, extracts)
 
-        # Put researches into chunks
-        for research_result in sorted_results:
-            research_result_size = len(to_json_str(research_result))
-            if len(current_chunk) > 0 and current_size + research_result_size > 20000:
-                # Cannot fit into current chunk, start a new one
-                chunks.append(current_chunk)
-                current_chunk = [research_result]
-                current_size = research_result_size
-            else:
-                current_chunk.append(research_result)
-                current_size += research_result_size
+        # Call each chunk and pass the narrative to the next chunk
+        current_narrative = findings.narrative
+        for index, chunk in enumerate(chunks):
+            self.fire_log(f"Narrating chunk {index+1}/{len(chunks)}")
+            current_narrative = self._narrate_chunk(
+                self._chunk_inputs(inputs, chunk, current_narrative)
+            )
 
-        if len(current_chunk) > 0:
-            chunks.append(current_chunk)
+        return {"narrative": Narrative(markdown=current_narrative)}
+
+    async def _acall(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = self._select_passages(inputs)
+        findings: Findings = inputs["findings"]
+        research_results: List[ResearchResult] = inputs["research_results"]
+
+        chunks = self._chunks(inputs)
+        if self.narrate_mode == "map_reduce" and len(chunks) > 1:
+            # Re-pack for the map model, whose prompt is smaller
+            chunks = self._chunks(inputs, map_step=True)
 
         self.fire_log(
             f"Applying {len(research_results)} results splitting into {len(chunks)} chunks"
         )
-        # Call each chunk and pass the narrative to the next chunk
+        if self.narrate_mode == "map_reduce" and len(chunks) > 1:
+            self.fire_log(f"Extracting findings from {len(chunks)} chunks concurrently")
+            semaphore = asyncio.Semaphore(self.map_concurrency)
+
+            async def extract(chunk: List[ResearchResult]) -> str:
+                async with semaphore:
+                    messages = self._map_messages(inputs, chunk)
+                    return (await self.aretry_llm(messages, phase="map")).content
+
+            extracts = await asyncio.gather(*[extract(chunk) for chunk in chunks])
+            return await self._areduce(inputs, extracts)
+
         current_narrative = findings.narrative
         for index, chunk in enumerate(chunks):
             self.fire_log(f"Narrating chunk {index+1}/{len(chunks)}")
-            current_narrative = self._call_chunk(
-                {
-                    **inputs,
-                    "research_results": chunk,
-                    "findings": Findings(
-                        generated_objectives=findings.generated_objectives,
-                        remark=findings.remark,
-                        narrative=current_narrative,
-                    ),
-                }
+            current_narrative = await self._anarrate_chunk(
+                self._chunk_inputs(inputs, chunk, current_narrative)
             )
 
         return {"narrative": Narrative(markdown=current_narrative)}
 
-    def _call_chunk(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    def _select_passages(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace long results with their passages relevant to the objectives."""
+        if self.passage_index is None:
+            return inputs
+        objectives: List[Objective] = inputs["objectives"]
+        findings: Findings = inputs["findings"]
+        research_results: List[ResearchResult] = inputs["research_results"]
+
+        urls: Dict[int, str] = {}
+        for index, result in enumerate(research_results):
+            # Only long page content is split. Other results, e.g. search
+            # answers or JSON lists of links, are kept whole.
+            if (
+                result.tool == "VisitWeb"
+                and isinstance(result.result, str)
+                and len(result.result) > 2 * self.passage_index.passage_chars
+            ):
+                urls[index] = _result_url(result)
+                self.passage_index.add(urls[index], result.result, result.citation)
+        # Earlier rounds' pages are narrated already; keep the index small
+        self.passage_index.retain(urls.values())
+        if not urls:
+            return inputs
+
+        selected: Dict[str, Set[Passage]] = {url: set() for url in urls.values()}
+        for objective in objectives + findings.generated_objectives:
+            for passage, _score in self.passage_index.search(
+                objective.topic, self.passages_per_objective, urls=selected.keys()
+            ):
+                selected[passage.url].add(passage)
+
+        results = list(research_results)
+        kept = total = 0
+        for index, url in urls.items():
+            # Keep the lead of a page that matches no objective
+            passages = (
+                sorted(selected[url], key=lambda p: p.position)
+                or self.passage_index.documents(url)[:1]
+            )
+            results[index] = replace(
+                results[index], result="\n\n[...]\n\n".join(p.text for p in passages)
+            )
+            kept += len(passages)
+            total += len(self.passage_index.documents(url))
+        self.fire_log(
+            f"Kept {kept} of {total} passages from {len(urls)} results "
+            "relevant to the objectives"
+        )
+        return {**inputs, "research_results": results}
+
+    def _narrate_chunk(self, inputs: Dict[str, Any]) -> str:
+        if self.narrate_mode == "patch":
+            response = self.retry_llm(self._patch_messages(inputs), phase="patch")
+            narrative = self._patched(inputs, response.content)
+            if narrative is not None:
+                return narrative
+        return self.retry_llm(self._chunk_messages(inputs)).content
+
+    async def _anarrate_chunk(self, inputs: Dict[str, Any]) -> str:
+        if self.narrate_mode == "patch":
+            response = await self.aretry_llm(
+                self._patch_messages(inputs), phase="patch"
+            )
+            narrative = self._patched(inputs, response.content)
+            if narrative is not None:
+                return narrative
+        return (await self.aretry_llm(self._chunk_messages(inputs))).content
+
+    def _patched(self, inputs: Dict[str, Any], response: str) -> Optional[str]:
+        """Apply the edits in `response` to the previous narrative."""
+        findings: Findings = inputs["findings"]
+        document = NarrativeDocument.parse(findings.narrative)
+        if not document.title and not document.sections:
+            document.preamble = ""  # Placeholder of the first round
+        try:
+            # Repairs fenced or slightly malformed JSON rather than rewriting
+            applied = document.apply(structured_output.loads(response))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.fire_log(f"Cannot apply narrative edits: {e}; rewriting instead")
+            return None
+        self.fire_log(
+            "Applied narrative edits: "
+            + (", ".join(f"{n} {op}" for op, n in applied.items()) or "none")
+        )
+        return document.render()
+
+    def _reduce(self, inputs: Dict[str, Any], extracts: List[str]) -> Dict[str, Any]:
+        findings: Findings = inputs["findings"]
+        self.fire_log(f"Merging findings of {len(extracts)} chunks")
+        extracts = self._fit_extracts(inputs, extracts)
+        messages = self._chunk_messages(
+            self._chunk_inputs(inputs, extracts, findings.narrative)
+        )
+        response = self.retry_llm(messages, phase="reduce")
+        return {"narrative": Narrative(markdown=response.content)}
+
+    async def _areduce(
+        self, inputs: Dict[str, Any], extracts: List[str]
+    ) -> Dict[str, Any]:
+        findings: Findings = inputs["findings"]
+        self.fire_log(f"Merging findings of {len(extracts)} chunks")
+        extracts = self._fit_extracts(inputs, extracts)
+        messages = self._chunk_messages(
+            self._chunk_inputs(inputs, extracts, findings.narrative)
+        )
+        response = await self.aretry_llm(messages, phase="reduce")
+        return {"narrative": Narrative(markdown=response.content)}
+
+    def _map_messages(
+        self, inputs: Dict[str, Any], chunk: List[ResearchResult]
+    ) -> List[BaseMessage]:
+        objectives: List[Objective] = inputs["objectives"]
+        findings: Findings = inputs["findings"]
+        return [
+            SystemMessage(
+                content=f"You are {self.agent_role}. "
+                "Your job is to extract the facts relevant to the primary goals "
+                "under OBJECTIVES and the secondary goals under GENERATED_OBJECTIVES "
+                "from raw research results."
+                "\n\n"
+                "## USER OBJECTIVES:\n"
+                f"{format_objectives(objectives)}\n\n"
+                "## GENERATED OBJECTIVES:\n"
+                f"{format_objectives(findings.generated_objectives)}\n\n"
+                "## RESPONSE FORMAT:\n"
+                "- Markdown bullet points, one fact per bullet.\n"
+                "- End each bullet with its source as `[<description>](<link>)`, "
+                "using the citation of the research result it came from.\n"
+                "- Respond with `- None` if no result is relevant."
+            ),
+            HumanMessage(
+                content="## RESEARCH RESULTS:\n"
+                f"{to_json_str(chunk)}"
+                "\n\n"
+                "## YOUR TASK:\n"
+                "List every new fact from RESEARCH RESULTS that helps with the OBJECTIVES. "
+                "Be concise and do not add facts that are not in the results.\n"
+                "Respond using ONLY the format specified above:"
+            ),
+        ]
+
+    def _chunk_inputs(
+        self,
+        inputs: Dict[str, Any],
+        chunk: List[Any],
+        narrative: str,
+    ) -> Dict[str, Any]:
+        findings: Findings = inputs["findings"]
+        return {
+            **inputs,
+            "research_results": chunk,
+            "findings": Findings(
+                generated_objectives=findings.generated_objectives,
+                remark=findings.remark,
+                narrative=narrative,
+            ),
+        }
+
+    def _chunks(
+        self, inputs: Dict[str, Any], map_step: bool = False
+    ) -> List[List[ResearchResult]]:
+        """Pack research results into as few prompts as fit the model's context."""
+        research_results: List[ResearchResult] = list(inputs["research_results"])
+        phase = self._phase(map_step)
+        model = model_name(self.models(phase)[0])
+        capacity = self._chunk_capacity(inputs, phase)
+
+        # Measure each result once
+        sizes = [count_tokens(to_json_str(r), model) for r in research_results]
+        truncated = 0
+        for index, size in enumerate(sizes):
+            if size <= capacity or not isinstance(research_results[index].result, str):
+                continue
+            # Too big for any prompt; keep what fits rather than overflow
+            result = research_results[index]
+            others = count_tokens(to_json_str(replace(result, result="")), model)
+            research_results[index] = replace(
+                result,
+                result=truncate_tokens(result.result, capacity - others, model),
+            )
+            sizes[index] = count_tokens(to_json_str(research_results[index]), model)
+            truncated += 1
+        if truncated > 0:
+            self.fire_log(f"Truncated {truncated} results to fit {capacity} tokens")
+
+        bins = pack_bins(sizes, capacity)
+        # Keep plan order within each chunk
+        return [[research_results[i] for i in sorted(b)] for b in bins]
+
+    def _chunk_capacity(self, inputs: Dict[str, Any], phase: Optional[str]) -> int:
+        """Tokens left for research results in a single prompt of `phase`."""
+        findings: Findings = inputs["findings"]
+        models = self.models(phase)
+        model = model_name(models[0])
+        if phase == "map":
+            prompt = self._map_messages(inputs, [])
+            headroom = 0
+        else:
+            prompt = self._chunk_messages(
+                self._chunk_inputs(inputs, [], findings.narrative)
+            )
+            # Later chunks carry the rewritten narrative, up to a full response
+            headroom = max(
+                0,
+                self.reserve_output_tokens - count_tokens(findings.narrative, model),
+            )
+        overhead = count_message_tokens(prompt, model) + headroom
+        # Leave room to fall back to a model with a smaller context
+        context = min(context_size(model_name(m)) for m in models)
+        capacity = context - self.reserve_output_tokens - overhead
+        if capacity < self.min_chunk_tokens:
+            self.fire_log(
+                f"Prompt leaves {max(capacity, 0)} of {context} tokens for results; "
+                f"using {self.min_chunk_tokens} tokens, which may overflow the context"
+            )
+            return self.min_chunk_tokens
+        return capacity
+
+    def _fit_extracts(self, inputs: Dict[str, Any], extracts: List[str]) -> List[str]:
+        """Cut the map extracts down to fit the prompt of the reduce model."""
+        model = model_name(self.models("reduce")[0])
+        capacity = self._chunk_capacity(inputs, "reduce")
+        if count_tokens(to_json_str(extracts), model) <= capacity:
+            return extracts
+        share = capacity // len(extracts)
+        fitted = [truncate_tokens(extract, share, model) for extract in extracts]
+        truncated = sum(a != b for a, b in zip(extracts, fitted))
+        self.fire_log(
+            f"Truncated {truncated} extracts to fit {capacity} tokens of the reduce prompt"
+        )
+        return fitted
+
+    def _phase(self, map_step: bool) -> Optional[str]:
+        if map_step:
+            return "map"
+        return "patch" if self.narrate_mode == "patch" else None
+
+    def _patch_messages(self, inputs: Dict[str, Any]) -> List[BaseMessage]:
+        objectives: List[Objective] = inputs["objectives"]
+        findings: Findings = inputs["findings"]
+        research_results: List[ResearchResult] = inputs["research_results"]
+
+        response_format = [
+            {"op": "set_title", "heading": "# ⛳️ Title"},
+            {
+                "op": "replace_section",
+                "heading": "## 🌈 Existing Section Title",
+                "content": "full new content of the section",
+            },
+            {
+                "op": "add_section",
+                "heading": "## 📚 New Section Title",
+                "content": "content of the section",
+                "after": "## 🌈 Existing Section Title",
+            },
+            {"op": "delete_section", "heading": "## 🤖 Outdated Section Title"},
+            {"op": "add_footnotes", "footnotes": ["[^3^]: [<description>](<link>)"]},
+            "... only include the edits you need",
+        ]
+
+        return [
+            SystemMessage(
+                content=f"You are {self.agent_role}. "
+                "Your job is to keep a comprehensive report up to date to fulfill the primary goals "
+                "under OBJECTIVES and the secondary goals under GENERATED_OBJECTIVES."
+                "\n\n"
+                "## USER OBJECTIVES:\n"
+                f"{format_objectives(objectives)}\n\n"
+                "## GENERATED OBJECTIVES:\n"
+                f"{format_objectives(findings.generated_objectives)}\n\n"
+                "## REMARK:\n"
+                f"{findings.remark}\n\n"
+                "## PREVIOUS FINDINGS:\n"
+                "```\n"
+                f"{findings.narrative}\n"
+                "```\n\n"
+                "You should ONLY respond in the JSON format as described below\n"
+                "## RESPONSE FORMAT:\n"
+                f"{to_json_str(response_format)}\n\n"
+                "## REPORT FORMAT:\n"
+                "- Markdown document with up to 8 sections, each with up to 350 words.\n"
+                "- A H1 title with emoji (e.g. `# ⛳️ Title`) and H2 section headings with emoji "
+                "(e.g. `## 🤖 Section Title`).\n"
+                "- Use bullet points when appropriate to make the document easy to digest.\n"
+                "- Use footnote for citations (e.g. `[^1^]` for refering to link [1]), "
+                "each described by a footnote (e.g `[^1^]: [<description>](<link>)`)."
+            ),
+            HumanMessage(
+                content="You just finished a research iteration. Here are the raw results:\n\n"
+                "## RESEARCH RESULTS:\n"
+                f"{to_json_str(research_results)}"
+                "\n\n"
+                "## YOUR TASK:\n"
+                "Update the report in PREVIOUS FINDINGS with new information from RESEARCH RESULTS "
+                "by responding with edits to its sections. "
+                "All new facts must be supported by references to RESEARCH RESULTS."
+                "\n"
+                "Important notes:\n"
+                "- Only edit sections that change. Sections you do not mention are kept as they are.\n"
+                "- `replace_section` and `add_section` take the full content of the section, without its heading.\n"
+                "- Refer to existing sections by their exact heading.\n"
+                "- Add a footnote for every new citation, numbered after the existing footnotes.\n"
+                f"- Avoid mentioning how {self.agent_role} works.\n"
+                "- Avoid mentioning tools used in the writing. If result is not helpful then exclude it.\n"
+                "- Results marked `cached: true` repeat earlier research and are likely already in PREVIOUS FINDINGS.\n"
+                "Respond using ONLY the format specified above:"
+            ),
+        ]
+
+    def _chunk_messages(self, inputs: Dict[str, Any]) -> List[BaseMessage]:
         objectives: List[Objective] = inputs["objectives"]
         findings: Findings = inputs["findings"]
         research_results: List[ResearchResult] = inputs["research_results"]
@@ -141,11 +516,10 @@ class NarrateChain(CustomCallbackLLMChain):
                 "- Make sure the number of footnote references is greater or equal to PREVIOUS FINDINGS footnotes.\n"
                 f"- Avoid mentioning how {self.agent_role} works.\n"
                 "- Avoid mentioning tools used in the writing. If result is not helpful then exclude it.\n"
+                "- Results marked `cached: true` repeat earlier research and are likely already in PREVIOUS FINDINGS.\n"
                 "- Avoid mentioning `## PREVIOUS FINDINGS` section in the markdown. Return new content only.\n"
                 "Respond using ONLY the markdown format specified above:"
             ),
         ]
 
-        response = self.retry_llm(messages)
-
-        return response.content
+        return messages
@@ -1,17 +1,124 @@
-import json
-from typing import List, Dict, Any
+import asyncio
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.chat_models.base import BaseChatModel
 from langchain.tools.base import BaseTool
-from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from pydantic import Field
 from blockagi.chains.base import CustomCallbackLLMChain
+from blockagi.chains.research import ResearchBatch, ResearchChain
+from blockagi.research_memo import ResearchMemo
+from blockagi.resource_ranker import ResourceRanker
+from blockagi.structured_output import validate
+from blockagi.tools.throttle import throttle
 from blockagi.utils import (
     to_json_str,
     format_tools,
     format_objectives,
     format_resources,
+    format_executed_tasks,
 )
+from blockagi.utils.json_stream import JSONArrayStream
 
-from blockagi.schema import BaseResourcePool, Objective, Findings, ResearchTask
+from blockagi.schema import (
+    BaseResourcePool,
+    Objective,
+    Findings,
+    Resource,
+    ResearchTask,
+)
+
+PLAN_FORMAT = [
+    ResearchTask(
+        tool="ToolName",
+        args="tool arguments",
+        reasoning="why you choose this tool",
+    ),
+    "... use up to 3 tools",
+]
+
+PLAN_INSTRUCTIONS = (
+    "Consider PREVIOUS FINDINGS and derive a plan to use up to 3 tools to become expert. "
+    "Only use tools and links specified above. Do NOT use tools to visit unknown links.\n"
+    "Prioritize visiting links under RESOURCE POOL over searching the internet "
+    "unless the existing resources are not enough to answer your research questions.\n"
+    "\n"
+    "Important notes:\n"
+    "- Prioritize finding more about topics with low expertise.\n"
+    "- When your expertise is low, consider finding more resource and gather generic information.\n"
+    "- When your expertise is high, consider visiting specific resources over finding generic answer.\n"
+    '- When "No resources available", do not visit any link.\n'
+    "- Tasks under PREVIOUSLY EXECUTED TASKS return cached results and add no new information. Do not repeat them.\n"
+)
+
+
+def format_plan_context(
+    resources: List[Resource],
+    tools: List[BaseTool],
+    executed_tasks: List[ResearchTask],
+) -> str:
+    return (
+        "## RESOURCE POOL\n"
+        f"{format_resources(resources)}\n\n"
+        "## AVAILABLE TOOLS:\n"
+        f"{format_tools(tools)}"
+        "\n\n"
+        "## PREVIOUSLY EXECUTED TASKS:\n"
+        f"{format_executed_tasks(executed_tasks)}\n\n"
+    )
+
+
+def _to_task(item: Any) -> Optional[ResearchTask]:
+    if validate(item, ResearchTask):
+        return None  # Left to the final parse to repair
+    return ResearchTask(
+        tool=item["tool"], args=item["args"], reasoning=item["reasoning"]
+    )
+
+
+class _Dispatcher:
+    """Submits each distinct research task to the batch exactly once.
+
+    The batch is started on the first task, so its deadline does not run
+    while the LLM is still thinking.
+    """
+
+    def __init__(self, start_batch: Callable[[], ResearchBatch]):
+        self.start_batch = start_batch
+        self.batch: Optional[ResearchBatch] = None
+        self.submitted: Set[str] = set()
+
+    def __call__(self, task: ResearchTask) -> None:
+        key = ResearchMemo.key(task)
+        if key not in self.submitted:
+            self.submitted.add(key)
+            if self.batch is None:
+                self.batch = self.start_batch()
+            self.batch.submit(task)
+
+    def cancel(self) -> None:
+        if self.batch is not None:
+            self.batch.cancel()
+
+
+class _TaskStreamHandler(BaseCallbackHandler):
+    """Dispatches research tasks as soon as their JSON objects are streamed."""
+
+    # Submit on the event loop itself, so async tasks start right away
+    run_inline = True
+
+    def __init__(self, dispatch: Callable[[ResearchTask], None]):
+        self.dispatch = dispatch
+        self.stream = JSONArrayStream()
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        self.stream = JSONArrayStream()  # A retried call starts over
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        for item in self.stream.feed(token):
+            task = _to_task(item)
+            if task is not None:
+                self.dispatch(task)
 
 
 class PlanChain(CustomCallbackLLMChain):
@@ -19,6 +126,11 @@ class PlanChain(CustomCallbackLLMChain):
     llm: BaseChatModel
     resource_pool: BaseResourcePool
     tools: List[BaseTool]
+    resource_ranker: ResourceRanker = Field(default_factory=ResourceRanker)
+    research_memo: Optional[ResearchMemo] = None
+    # Start running research tasks while the rest of the plan is streamed
+    research_chain: Optional[ResearchChain] = None
+    early_dispatch: bool = True
 
     @property
     def input_keys(self) -> List[str]:
@@ -29,9 +141,52 @@ class PlanChain(CustomCallbackLLMChain):
 
     @property
     def output_keys(self) -> List[str]:
-        return ["research_tasks"]  # Plan -> Research
+        return [
+            "research_tasks",  # Plan -> Research
+            "research_batch",  # Tasks already running, if dispatched early
+        ]
 
     def _call(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages, resources = self._prepare(inputs)
+        dispatch = self._dispatcher(use_async=False)
+        try:
+            result = self.structured_llm(
+                messages, List[ResearchTask], callbacks=self._stream_callbacks(dispatch)
+            )
+        except BaseException:
+            if dispatch is not None:
+                dispatch.cancel()  # Nobody will collect the tasks started so far
+            raise
+        return self._process(result, resources, dispatch)
+
+    async def _acall(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages, resources = self._prepare(inputs)
+        dispatch = self._dispatcher(use_async=True)
+        try:
+            result = await self.astructured_llm(
+                messages, List[ResearchTask], callbacks=self._stream_callbacks(dispatch)
+            )
+        except BaseException:
+            if dispatch is not None:
+                dispatch.cancel()  # Nobody will collect the tasks started so far
+            raise
+        outputs = self._process(result, resources, dispatch)
+        await asyncio.sleep(0)  # Let the remaining tasks start
+        return outputs
+
+    def _dispatcher(self, use_async: bool) -> Optional[_Dispatcher]:
+        if not self.early_dispatch or self.research_chain is None:
+            return None
+        return _Dispatcher(lambda: self.research_chain.start_batch(use_async))
+
+    def _stream_callbacks(
+        self, dispatch: Optional[_Dispatcher]
+    ) -> Optional[List[BaseCallbackHandler]]:
+        return None if dispatch is None else [_TaskStreamHandler(dispatch)]
+
+    def _prepare(
+        self, inputs: Dict[str, Any]
+    ) -> Tuple[List[BaseMessage], List[Resource]]:
         objectives: List[Objective] = inputs["objectives"]
         findings: Findings = inputs["findings"]
 
@@ -40,14 +195,7 @@ class PlanChain(CustomCallbackLLMChain):
             + "\n".join([f"- {o.topic}" for o in inputs["objectives"]])
         )
 
-        response_format = [
-            ResearchTask(
-                tool="ToolName",
-                args="tool arguments",
-                reasoning="why you choose this tool",
-            ),
-            "... use up to 3 tools",
-        ]
+        resources, tools, executed_tasks = self._plan_context(objectives, findings)
 
         messages = [
             SystemMessage(
@@ -64,43 +212,86 @@ class PlanChain(CustomCallbackLLMChain):
                 f"{findings.remark}\n\n"
                 "You should ONLY respond in the JSON format as described below\n"
                 "## RESPONSE FORMAT:\n"
-                f"{to_json_str(response_format)}"
+                f"{to_json_str(PLAN_FORMAT)}"
             ),
             HumanMessage(
                 content="## PREVIOUS FINDINGS:\n"
                 "```\n"
                 f"{findings.narrative}\n"
                 "```\n\n"
-                "## RESOURCE POOL\n"
-                f"{format_resources(self.resource_pool.get_unvisited())}\n\n"
-                "## AVAILABLE TOOLS:\n"
-                f"{format_tools(self.tools)}"
-                "\n\n"
+                f"{format_plan_context(resources, tools, executed_tasks)}"
                 "# YOUR TASK:\n"
-                "Consider PREVIOUS FINDINGS and derive a plan to use up to 3 tools to become expert. "
-                "Only use tools and links specified above. Do NOT use tools to visit unknown links.\n"
-                "Prioritize visiting links under RESOURCE POOL over searching the internet "
-                "unless the existing resources are not enough to answer your research questions.\n"
-                "\n"
-                "Important notes:\n"
-                "- Prioritize finding more about topics with low expertise.\n"
-                "- When your expertise is low, consider finding more resource and gather generic information.\n"
-                "- When your expertise is high, consider visiting specific resources over finding generic answer.\n"
-                '- When "No resources available", do not visit any link.\n'
+                f"{PLAN_INSTRUCTIONS}"
                 "\n"
                 "Respond using ONLY the format specified above:"
             ),
         ]
 
-        response = self.retry_llm(messages)
+        return messages, resources
+
+    def _plan_context(
+        self, objectives: List[Objective], findings: Findings
+    ) -> Tuple[List[Resource], List[BaseTool], List[ResearchTask]]:
+        """Resources, tools and executed tasks to show the planner."""
+        # Only show the most relevant unvisited resources to keep the prompt bounded
+        unvisited = self.resource_pool.get_unvisited()
+        resources = self.resource_ranker.rank(
+            unvisited,
+            query="\n".join(
+                [o.topic for o in objectives + findings.generated_objectives]
+                + [findings.remark]
+            ),
+        )
+        if len(resources) < len(unvisited):
+            self.fire_log(
+                f"Showing top {len(resources)} of {len(unvisited)} unvisited resources"
+            )
 
+        # Don't advertise tools whose backends keep failing
+        tools = [t for t in self.tools if throttle.is_available(t.name)]
+        if len(tools) < len(self.tools):
+            self.fire_log(
+                "Temporarily unavailable tools: "
+                + ", ".join(t.name for t in self.tools if t not in tools)
+            )
+
+        executed_tasks = (
+            self.research_memo.executed_tasks() if self.research_memo else []
+        )
+        return resources, tools, executed_tasks
+
+    def _process(
+        self,
+        result: List[Dict[str, Any]],
+        resources: List[Resource],
+        dispatch: Optional[_Dispatcher] = None,
+    ) -> Dict[str, Any]:
         research_tasks = [
             ResearchTask(
                 tool=task["tool"],
                 args=task["args"],
                 reasoning=task["reasoning"],
             )
-            for task in json.loads(response.content)
+            for task in result
         ]
 
-        return {"research_tasks": research_tasks}
+        self.resource_ranker.record_round(
+            shown=resources,
+            chosen_urls=[
+                task.args["url"]
+                for task in research_tasks
+                if isinstance(task.args, dict) and isinstance(task.args.get("url"), str)
+            ],
+        )
+
+        if dispatch is None:
+            return {"research_tasks": research_tasks, "research_batch": None}
+
+        if dispatch.submitted:
+            self.fire_log(
+                f"Started {len(dispatch.submitted)} research tasks while planning"
+            )
+        # Tasks the stream parser missed (e.g. malformed mid-stream) start now
+        for task in research_tasks:
+            dispatch(task)
+        return {"research_tasks": research_tasks, "research_batch": dispatch.batch}
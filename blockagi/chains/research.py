@@ -1,14 +1,237 @@
+import asyncio
 import json
-from typing import List, Dict, Any
-from dataclasses import asdict
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Any, Optional, Set
+from dataclasses import asdict, dataclass
 from blockagi.chains.base import CustomCallbackChain
 from langchain.tools.base import BaseTool
 
+from blockagi.research_memo import ResearchMemo
 from blockagi.schema import ResearchTask, ResearchResult
 
+# How often to check on queued tasks, whose task timeout starts when they run
+QUEUED_POLL_INTERVAL = 0.25
+
+
+def parse_tool_concurrency(spec: str) -> Dict[str, int]:
+    """Parse per-tool caps like "VisitWeb=3,DuckDuckGoSearchLinks=1"."""
+    caps: Dict[str, int] = {}
+    for item in filter(None, (i.strip() for i in spec.split(","))):
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid tool concurrency {item!r}; use Tool=count")
+        caps[name.strip()] = int(value)
+    return caps
+
+
+@dataclass
+class _Job:
+    index: int
+    task: ResearchTask
+    future: Optional[Future] = None
+    started_at: Optional[float] = None
+
+
+class ResearchBatch:
+    """Runs research tasks concurrently and collects results in plan order.
+
+    Each tool has a concurrency cap. A task times out `task_timeout` seconds
+    after it starts running, and the whole batch `deadline` seconds after it
+    was created. Timed-out tasks are reported as error results.
+    """
+
+    def __init__(
+        self,
+        tools: List[BaseTool],
+        log: Callable[[str], None],
+        max_workers: int,
+        tool_concurrency: Dict[str, int],
+        default_tool_concurrency: int,
+        task_timeout: float,
+        deadline: float,
+        memo: Optional[ResearchMemo] = None,
+    ):
+        self.tools_by_name = {t.name: t for t in tools}
+        self.log = log
+        self.max_workers = max_workers
+        self.task_timeout = task_timeout
+        self.deadline = time.monotonic() + deadline
+        self.memo = memo
+        self.jobs: List[_Job] = []
+        self.cached: Dict[int, ResearchResult] = {}
+        self.task_count = 0
+        self._semaphores = {
+            name: self._semaphore(tool_concurrency.get(name, default_tool_concurrency))
+            for name in self.tools_by_name
+        }
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, task: ResearchTask) -> None:
+        index = self.task_count
+        self.task_count += 1
+        self.log(f"Task {index+1}) {task.tool} {json.dumps(task.args)}")
+        tool = self.tools_by_name.get(task.tool)
+        if tool is None:
+            self.log(f"Task {index+1}) Unknown tool {task.tool}; skipping")
+            return
+        cached = self.memo.get(task) if self.memo else None
+        if cached is not None:
+            self.log(
+                f"Task {index+1}) served from memo, "
+                f"saving {self.memo.saved(task):.1f}s"
+            )
+            self.cached[index] = cached
+            return
+        job = _Job(index=index, task=task)
+        self._start(job, tool)
+        self.jobs.append(job)
+
+    def collect(self) -> List[ResearchResult]:
+        results: Dict[int, ResearchResult] = dict(self.cached)
+        pending = {job.future: job for job in self.jobs}
+        while pending:
+            done, _ = wait(
+                pending.keys(),
+                timeout=self._wait_timeout(pending),
+                return_when=FIRST_COMPLETED,
+            )
+            self._settle(done, pending, results)
+        if self._executor is not None:
+            # Abandon timed-out tasks; their threads finish in the background
+            self._executor.shutdown(wait=False)
+        return [results[index] for index in sorted(results)]
+
+    def cancel(self) -> None:
+        """Drop the batch without collecting it."""
+        running = [job for job in self.jobs if not job.future.done()]
+        for job in running:
+            job.future.cancel()
+        if self._executor is not None:
+            # Queued tasks are cancelled; running threads finish in the background
+            self._executor.shutdown(wait=False)
+        if running:
+            self.log(f"Cancelled {len(running)} research tasks")
+
+    def _semaphore(self, value: int):
+        return threading.Semaphore(value)
+
+    def _start(self, job: _Job, tool: BaseTool) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="blockagi-research"
+            )
+        job.future = self._executor.submit(self._run, job, tool)
+
+    def _run(self, job: _Job, tool: BaseTool) -> ResearchResult:
+        with self._semaphores[tool.name]:
+            job.started_at = time.monotonic()
+            task_result = tool.run(job.task.args)
+            duration = time.monotonic() - job.started_at
+        return self._result(job, task_result, duration)
+
+    def _result(
+        self, job: _Job, task_result: Dict[str, Any], duration: float
+    ) -> ResearchResult:
+        if "source" in task_result:
+            self.log(f"Task {job.index+1}) served from {task_result['source']}")
+        result = ResearchResult(
+            result=task_result.get("result", None),
+            citation=task_result.get("citation", None),
+            **asdict(job.task),
+        )
+        if self.memo:
+            self.memo.put(job.task, result, duration)
+        return result
+
+    def _expires_at(self, job: _Job) -> float:
+        if job.started_at is None:
+            return self.deadline
+        return min(self.deadline, job.started_at + self.task_timeout)
+
+    def _wait_timeout(self, pending: Dict[Any, _Job]) -> float:
+        expires_at = min(self._expires_at(job) for job in pending.values())
+        timeout = max(0, expires_at - time.monotonic())
+        if any(job.started_at is None for job in pending.values()):
+            # Queued jobs get their own timeout once started; check back soon
+            timeout = min(timeout, QUEUED_POLL_INTERVAL)
+        return timeout
+
+    def _settle(
+        self,
+        done: Set[Any],
+        pending: Dict[Any, _Job],
+        results: Dict[int, ResearchResult],
+    ) -> None:
+        """Move finished and expired jobs from `pending` to `results`."""
+        for future in done:
+            job = pending.pop(future)
+            try:
+                results[job.index] = future.result()
+            except Exception as e:
+                self.log(f"Task {job.index+1}) {job.task.tool} failed: {e}")
+        now = time.monotonic()
+        for future, job in list(pending.items()):
+            if now < self._expires_at(job):
+                continue
+            del pending[future]
+            future.cancel()
+            self.log(f"Task {job.index+1}) {job.task.tool} timed out")
+            results[job.index] = ResearchResult(
+                result="Error: The task timed out before returning any result.",
+                citation=None,
+                **asdict(job.task),
+            )
+
+
+class AsyncResearchBatch(ResearchBatch):
+    """Same as ResearchBatch, running the tools' coroutines on the event loop.
+
+    Must be created and used from within the running event loop. Timed-out
+    tasks are cancelled rather than abandoned.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._workers = asyncio.Semaphore(self.max_workers)
+
+    async def collect(self) -> List[ResearchResult]:
+        results: Dict[int, ResearchResult] = dict(self.cached)
+        pending = {job.future: job for job in self.jobs}
+        while pending:
+            done, _ = await asyncio.wait(
+                pending.keys(),
+                timeout=self._wait_timeout(pending),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            self._settle(done, pending, results)
+        return [results[index] for index in sorted(results)]
+
+    def _semaphore(self, value: int):
+        return asyncio.Semaphore(value)
+
+    def _start(self, job: _Job, tool: BaseTool) -> None:
+        job.future = asyncio.ensure_future(self._arun(job, tool))
+
+    async def _arun(self, job: _Job, tool: BaseTool) -> ResearchResult:
+        async with self._workers, self._semaphores[tool.name]:
+            job.started_at = time.monotonic()
+            task_result = await tool.arun(job.task.args)
+            duration = time.monotonic() - job.started_at
+        return self._result(job, task_result, duration)
+
 
 class ResearchChain(CustomCallbackChain):
     tools: List[BaseTool]
+    max_workers: int = 4
+    # Max concurrent tasks per tool, e.g. {"VisitWeb": 3}
+    tool_concurrency: Dict[str, int] = {}
+    default_tool_concurrency: int = 2
+    task_timeout: float = 90
+    iteration_deadline: float = 240
+    # Shared with PlanChain so repeated tasks are not executed twice
+    research_memo: Optional[ResearchMemo] = None
 
     @property
     def input_keys(self) -> List[str]:
@@ -18,30 +241,47 @@ class ResearchChain(CustomCallbackChain):
     def output_keys(self) -> List[str]:
         return ["research_results"]  # Research -> Understand
 
+    def start_batch(self, use_async: bool = False) -> ResearchBatch:
+        batch_class = AsyncResearchBatch if use_async else ResearchBatch
+        return batch_class(
+            tools=self.tools,
+            log=self.fire_log,
+            max_workers=self.max_workers,
+            tool_concurrency=self.tool_concurrency,
+            default_tool_concurrency=self.default_tool_concurrency,
+            task_timeout=self.task_timeout,
+            deadline=self.iteration_deadline,
+            memo=self.research_memo,
+        )
+
+    def _batch(self, inputs: Dict[str, Any], use_async: bool) -> ResearchBatch:
+        # PlanChain may have started the tasks while streaming the plan
+        batch = inputs.get("research_batch")
+        if batch is None:
+            batch = self.start_batch(use_async)
+            for task in inputs["research_tasks"]:
+                batch.submit(task)
+        return batch
+
     def _call(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         research_tasks: List[ResearchTask] = inputs["research_tasks"]
 
-        research_results = []
+        self.fire_log(f"Executing {len(research_tasks)} research tasks")
+
+        # Use the tools to run the research tasks concurrently
+        batch = self._batch(inputs, use_async=False)
+        research_results = batch.collect()
+
+        self.fire_log("Updating resource pool ...")
+        return {"research_results": research_results}
+
+    async def _acall(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        research_tasks: List[ResearchTask] = inputs["research_tasks"]
 
         self.fire_log(f"Executing {len(research_tasks)} research tasks")
 
-        # Use the tools to run the research tasks
-        for index, task in enumerate(research_tasks):
-            self.fire_log(f"Task {index+1}) {task.tool} {json.dumps(task.args)}")
-            tool = [t for t in self.tools if t.name == task.tool][0]
-            if tool is None:
-                continue
-            try:
-                task_result = tool.run(task.args)
-                research_results.append(
-                    ResearchResult(
-                        result=task_result.get("result", None),
-                        citation=task_result.get("citation", None),
-                        **asdict(task),
-                    )
-                )
-            except Exception as e:
-                print(e)
+        batch = self._batch(inputs, use_async=True)
+        research_results = await batch.collect()
 
         self.fire_log("Updating resource pool ...")
         return {"research_results": research_results}
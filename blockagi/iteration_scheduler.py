@@ -0,0 +1,177 @@
+import time
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Optional, Tuple
+
+from blockagi.schema import Objective
+
+
+def narrative_change(before: str, after: str) -> float:
+    """Share of the narrative that changed, from 0 (same) to 1 (all new)."""
+    matcher = SequenceMatcher(
+        None, before.splitlines(), after.splitlines(), autojunk=False
+    )
+    return 1 - matcher.ratio()
+
+
+@dataclass
+class RoundProgress:
+    round: int
+    expertise_gain: float  # Largest gain of any objective
+    narrative_change: float
+    tokens: int
+    duration: float  # Seconds
+
+
+class IterationScheduler:
+    """Decides after each round whether to run another one.
+
+    Runs `rounds` rounds, unless (after at least `min_rounds`) every objective
+    reached `expertise_target`, or `stale_rounds` rounds in a row raised no
+    objective's expertise by `min_expertise_gain` and changed less than
+    `min_narrative_change` of the narrative. While the last planned round
+    still made progress, rounds are added up to `max_rounds`.
+
+    Stops before a round that would likely exceed `token_budget` or
+    `time_budget` (seconds), judging by the rounds so far. `tokens_used`
+    returns the tokens spent by all LLM calls.
+
+    With the defaults, exactly `rounds` rounds run.
+    """
+
+    def __init__(
+        self,
+        rounds: int,
+        max_rounds: Optional[int] = None,
+        min_rounds: int = 1,
+        expertise_target: Optional[float] = None,
+        min_expertise_gain: float = 0.05,
+        min_narrative_change: float = 0.05,
+        stale_rounds: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        tokens_used: Optional[Callable[[], int]] = None,
+    ):
+        self.planned_rounds = rounds
+        self.max_rounds = max(rounds, max_rounds or rounds)
+        self.min_rounds = min_rounds
+        self.expertise_target = expertise_target
+        self.min_expertise_gain = min_expertise_gain
+        self.min_narrative_change = min_narrative_change
+        self.stale_rounds = stale_rounds
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.tokens_used = tokens_used or (lambda: 0)
+        self.start([], "")
+
+    def start(self, objectives: List[Objective], narrative: str) -> None:
+        self.rounds = self.planned_rounds
+        self.history: List[RoundProgress] = []
+        self.stop_reason: Optional[str] = None
+        self._expertise = self._by_topic(objectives)
+        self._narrative = narrative
+        self._started_at = self._round_started_at = time.monotonic()
+        self._tokens_at_start = self._tokens_at_round = self.tokens_used()
+
+    @staticmethod
+    def _by_topic(objectives: List[Objective]) -> Dict[str, float]:
+        return {o.topic: float(o.expertise) for o in objectives}
+
+    def end_round(
+        self, objectives: List[Objective], narrative: str
+    ) -> Tuple[bool, str]:
+        """Record a finished round; return whether to run another and why."""
+        now, tokens = time.monotonic(), self.tokens_used()
+        expertise = self._by_topic(objectives)
+        progress = RoundProgress(
+            round=len(self.history) + 1,
+            expertise_gain=max(
+                [e - self._expertise.get(t, 0.0) for t, e in expertise.items()],
+                default=0.0,
+            ),
+            narrative_change=narrative_change(self._narrative, narrative),
+            tokens=tokens - self._tokens_at_round,
+            duration=now - self._round_started_at,
+        )
+        self.history.append(progress)
+        self._expertise, self._narrative = expertise, narrative
+        self._round_started_at, self._tokens_at_round = now, tokens
+
+        report = (
+            f"Round {progress.round}: expertise "
+            f"{progress.expertise_gain:+.2f} at most, "
+            f"{progress.narrative_change:.0%} of the narrative changed, "
+            f"{progress.tokens} tokens, {progress.duration:.0f}s"
+        )
+        self.stop_reason = self._stop_reason(expertise)
+        if self.stop_reason is None:
+            return True, report
+        saved = self.rounds - progress.round
+        return False, (
+            f"{report}\nStopping after round {progress.round}: {self.stop_reason}"
+            + (f" ({saved} planned rounds skipped)" if saved > 0 else "")
+        )
+
+    def _stop_reason(self, expertise: Dict[str, float]) -> Optional[str]:
+        count = len(self.history)
+        if count >= self.max_rounds:
+            if self.max_rounds > self.planned_rounds:
+                return f"reached the maximum of {self.max_rounds} rounds"
+            return f"finished the {self.rounds} planned rounds"
+        budget = self._budget_reason()
+        if budget:
+            return budget
+        if count >= self.min_rounds:
+            if self.expertise_target is not None and all(
+                e >= self.expertise_target for e in expertise.values()
+            ):
+                return f"every objective reached expertise {self.expertise_target}"
+            stale = self._stale_rounds()
+            if self.stale_rounds and stale >= self.stale_rounds:
+                return (
+                    f"{stale} rounds in a row raised no expertise by "
+                    f"{self.min_expertise_gain} and changed less than "
+                    f"{self.min_narrative_change:.0%} of the narrative"
+                )
+        if count < self.rounds:
+            return None
+        if self._stale_rounds():
+            return f"finished the {self.rounds} planned rounds"
+        self.rounds += 1  # Still making progress
+        return None
+
+    def _stale_rounds(self) -> int:
+        """Number of rounds in a row that made too little progress."""
+        count = 0
+        for progress in reversed(self.history):
+            if (
+                progress.expertise_gain >= self.min_expertise_gain
+                or progress.narrative_change >= self.min_narrative_change
+            ):
+                break
+            count += 1
+        return count
+
+    def _budget_reason(self) -> Optional[str]:
+        count = len(self.history)
+        tokens = self._tokens_at_round - self._tokens_at_start
+        if self.token_budget and tokens + tokens / count > self.token_budget:
+            return (
+                f"another round would likely exceed the token budget "
+                f"({tokens} of {self.token_budget} used)"
+            )
+        elapsed = self._round_started_at - self._started_at
+        if self.time_budget and elapsed + elapsed / count > self.time_budget:
+            return (
+                f"another round would likely exceed the time budget "
+                f"({elapsed:.0f}s of {self.time_budget:.0f}s used)"
+            )
+        return None
+
+    def summary(self) -> str:
+        return (
+            f"Scheduler: round {len(self.history)} of {self.rounds} planned "
+            f"(max {self.max_rounds}), "
+            f"{self._tokens_at_round - self._tokens_at_start} tokens, "
+            f"{time.monotonic() - self._started_at:.0f}s"
+        )
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+from langchain.callbacks.manager import (
+    AsyncCallbackManager,
+    CallbackManager,
+    Callbacks,
+)
+from langchain.chat_models.base import BaseChatModel
+from langchain.load.dump import dumpd
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, LLMResult
+
+MODES = ("off", "read-write", "read-only", "record")
+
+# Replayed responses are streamed to the callbacks in word-sized tokens
+TOKEN_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+class LLMCache:
+    """On-disk cache of chat completions keyed by model, params and prompt.
+
+    Modes:
+    - "off": never read or write.
+    - "read-write": serve hits, store misses.
+    - "read-only": serve hits, never store (e.g. to replay a run).
+    - "record": always call the LLM and store the response.
+
+    The least recently used responses are evicted once the cache exceeds
+    `max_bytes`.
+    """
+
+    def __init__(
+        self, path: str, mode: str = "read-write", max_bytes: int = 100_000_000
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Invalid LLM cache mode {mode}; use one of {MODES}")
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "  key TEXT PRIMARY KEY,"
+            "  model TEXT NOT NULL,"
+            "  content BLOB NOT NULL,"
+            "  size INTEGER NOT NULL,"
+            "  created_at REAL NOT NULL,"
+            "  accessed_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        # Running total of stored bytes, so puts don't scan the whole table
+        (self._total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    @staticmethod
+    def model_name(llm: BaseChatModel) -> str:
+        return getattr(llm, "model_name", None) or llm.__class__.__name__
+
+    @classmethod
+    def key(cls, llm: BaseChatModel, messages: List[BaseMessage]) -> str:
+        payload = json.dumps(
+            [
+                cls.model_name(llm),
+                getattr(llm, "temperature", None),
+                [[m.type, m.content] for m in messages],
+            ]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, llm: BaseChatModel, messages: List[BaseMessage]) -> Optional[str]:
+        found = self.get_first([llm], messages)
+        return None if found is None else found[1]
+
+    def get_first(
+        self, llms: Sequence[BaseChatModel], messages: List[BaseMessage]
+    ) -> Optional[Tuple[BaseChatModel, str]]:
+        """The first of `llms` with a stored response, and that response.
+
+        Counts a single hit or miss, however many models are looked up.
+        """
+        if self.mode not in ("read-write", "read-only"):
+            return None
+        with self._lock:
+            for llm in llms:
+                key = self.key(llm, messages)
+                row = self._conn.execute(
+                    "SELECT content FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                self.counts["hit"] += 1
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._conn.commit()
+                return llm, zlib.decompress(row[0]).decode("utf-8")
+            self.counts["miss"] += 1
+        return None
+
+    def put(self, llm: BaseChatModel, messages: List[BaseMessage], content: str):
+        if self.mode not in ("read-write", "record"):
+            return
+        data = zlib.compress(content.encode("utf-8"))
+        key = self.key(llm, messages)
+        now = time.time()
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, content, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    self.model_name(llm),
+                    data,
+                    len(data),
+                    now,
+                    now,
+                ),
+            )
+            self._total += len(data) - (replaced[0] if replaced else 0)
+            self.counts["evicted"] += self._evict()
+            self._conn.commit()
+
+    def replay(
+        self,
+        llm: BaseChatModel,
+        messages: List[BaseMessage],
+        content: str,
+        callbacks: Callbacks = None,
+    ) -> BaseMessage:
+        """Stream a cached response through the LLM's callbacks, like a live call."""
+        callback_manager = CallbackManager.configure(
+            callbacks, llm.callbacks, llm.verbose
+        )
+        (run_manager,) = callback_manager.on_chat_model_start(
+            dumpd(llm), [messages], invocation_params=self._params(llm)
+        )
+        for token in TOKEN_PATTERN.findall(content):
+            run_manager.on_llm_new_token(token)
+        message = AIMessage(content=content)
+        run_manager.on_llm_end(
+            LLMResult(generations=[[ChatGeneration(message=message)]])
+        )
+        return message
+
+    async def areplay(
+        self,
+        llm: BaseChatModel,
+        messages: List[BaseMessage],
+        content: str,
+        callbacks: Callbacks = None,
+    ) -> BaseMessage:
+        callback_manager = AsyncCallbackManager.configure(
+            callbacks, llm.callbacks, llm.verbose
+        )
+        (run_manager,) = await callback_manager.on_chat_model_start(
+            dumpd(llm), [messages], invocation_params=self._params(llm)
+        )
+        for token in TOKEN_PATTERN.findall(content):
+            await run_manager.on_llm_new_token(token)
+        message = AIMessage(content=content)
+        await run_manager.on_llm_end(
+            LLMResult(generations=[[ChatGeneration(message=message)]])
+        )
+        return message
+
+    def _params(self, llm: BaseChatModel) -> dict:
+        # Lets callbacks tell replayed responses from live calls
+        return {"model_name": self.model_name(llm), "cached": True}
+
+    def summary(self) -> str:
+        total = self.counts["hit"] + self.counts["miss"]
+        if total == 0:
+            return f"LLM cache ({self.mode}): no lookups yet"
+        return (
+            f"LLM cache ({self.mode}): {self.counts['hit']}/{total} hits "
+            f"({self.counts['hit'] / total:.0%}), {self.counts['evicted']} evicted"
+        )
+
+    def _evict(self) -> int:
+        evicted = 0
+        if self._total <= self.max_bytes:
+            return evicted
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        )
+        for key, size in rows.fetchall():
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total -= size
+            evicted += 1
+        return evicted
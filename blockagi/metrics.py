@@ -0,0 +1,384 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain.schema import BaseMessage, LLMResult
+
+from blockagi.chains.base import BlockAGICallbackHandler
+from blockagi.utils.tokens import count_message_tokens, count_tokens
+
+# USD per 1K (prompt, completion) tokens, matched by longest prefix
+MODEL_PRICES = {
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+    "gpt-3.5-turbo": (0.0015, 0.002),
+}
+
+# Upper bounds in seconds of the Prometheus latency histograms
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(prefix):
+            prompt_price, completion_price = MODEL_PRICES[prefix]
+            return (
+                prompt_tokens * prompt_price + completion_tokens * completion_price
+            ) / 1000
+    return 0.0
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+@dataclass
+class LLMStats:
+    calls: int = 0
+    cached: int = 0
+    failures: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    durations: List[float] = field(default_factory=list)
+
+
+@dataclass
+class ToolStats:
+    calls: int = 0
+    failures: int = 0
+    durations: List[float] = field(default_factory=list)
+
+
+@dataclass
+class _Run:
+    started_at: float
+    key: Tuple[Any, ...]
+    prompt_tokens: int = 0
+    cached: bool = False
+
+
+def _latency(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "total": sum(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+    }
+
+
+def _sample(name: str, labels: Dict[str, Any], value: Any) -> str:
+    if not labels:
+        return f"{name} {value}"
+    escaped = (
+        str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for v in labels.values()
+    )
+    pairs = ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped))
+    return f"{name}{{{pairs}}} {value}"
+
+
+class MetricsCollector(BlockAGICallbackHandler):
+    """Counts tokens, cost, retries, failures and wall time of the agent.
+
+    Add it to the chain's callbacks for rounds and steps, and to the LLMs'
+    and tools' callbacks for their calls. LLM calls and tool calls are
+    attributed to the round and step that was running when they started.
+    """
+
+    # Callbacks only update counters; run them inline on the event loop
+    run_inline = True
+
+    def __init__(self):
+        self.round = 0
+        self.step: Optional[str] = None
+        # (round, step, model) -> stats
+        self.llm: Dict[Tuple[int, str, str], LLMStats] = OrderedDict()
+        # (round, tool) -> stats
+        self.tools: Dict[Tuple[int, str], ToolStats] = OrderedDict()
+        # (round, step) -> seconds
+        self.steps: Dict[Tuple[int, str], float] = OrderedDict()
+        # (round, step) -> LLM calls retried after an error
+        self.retries: Dict[Tuple[int, str], int] = OrderedDict()
+        self._step_started_at: Optional[float] = None
+        self._runs: Dict[UUID, _Run] = {}
+        self._lock = threading.Lock()
+
+    # BlockAGI events ====================================
+
+    def on_iteration_start(self, inputs: Dict[str, Any]) -> Any:
+        self.round += 1
+
+    def on_step_start(self, step: str, inputs: Dict[str, Any]) -> Any:
+        self.step = step
+        self._step_started_at = time.monotonic()
+
+    def on_step_end(
+        self, step: str, inputs: Dict[str, Any], outputs: Dict[str, Any]
+    ) -> Any:
+        with self._lock:
+            self.steps[(self.round, step)] = time.monotonic() - self._step_started_at
+
+    def on_llm_retry(self, error: Exception) -> Any:
+        with self._lock:
+            key = (self.round, self.step or "")
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    # LangChain events ===================================
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        invocation_params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        params = invocation_params or {}
+        model = (
+            params.get("model_name")
+            or params.get("model")
+            or serialized.get("id", [""])[-1]  # Class name of other models
+        )
+        with self._lock:
+            self._runs[run_id] = _Run(
+                started_at=time.monotonic(),
+                key=(self.round, self.step or "", model),
+                prompt_tokens=sum(count_message_tokens(m, model) for m in messages),
+                cached=params.get("cached", False),
+            )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            model = run.key[2]
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", run.prompt_tokens)
+            completion_tokens = usage.get("completion_tokens") or sum(
+                count_tokens(g.text, model) for gs in response.generations for g in gs
+            )
+            stats = self.llm.setdefault(run.key, LLMStats())
+            stats.calls += 1
+            if run.cached:
+                stats.cached += 1  # No tokens were spent
+                return
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.cost += cost(model, prompt_tokens, completion_tokens)
+            stats.durations.append(time.monotonic() - run.started_at)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is not None:
+                stats = self.llm.setdefault(run.key, LLMStats())
+                stats.calls += 1
+                stats.failures += 1
+
+    def on_tool_start(
+        self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs
+    ) -> Any:
+        with self._lock:
+            self._runs[run_id] = _Run(
+                started_at=time.monotonic(),
+                key=(self.round, serialized.get("name", "")),
+            )
+
+    def on_tool_end(self, output: str, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._end_tool(run_id, failed=False)
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> Any:
+        self._end_tool(run_id, failed=True)
+
+    def _end_tool(self, run_id: UUID, failed: bool) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            stats = self.tools.setdefault(run.key, ToolStats())
+            stats.calls += 1
+            stats.failures += failed
+            stats.durations.append(time.monotonic() - run.started_at)
+
+    # Reports ============================================
+
+    def summary_json(self) -> Dict[str, Any]:
+        """Metrics aggregated by round and step, plus totals."""
+        with self._lock:
+            rounds: Dict[int, Dict[str, Any]] = OrderedDict()
+
+            def round_entry(round: int) -> Dict[str, Any]:
+                return rounds.setdefault(
+                    round, {"round": round, "steps": OrderedDict(), "tools": {}}
+                )
+
+            def step_entry(round: int, step: str) -> Dict[str, Any]:
+                return round_entry(round)["steps"].setdefault(
+                    step,
+                    {
+                        "duration": self.steps.get((round, step)),
+                        "retries": self.retries.get((round, step), 0),
+                        "llm": {},
+                    },
+                )
+
+            for round, step in list(self.steps) + list(self.retries):
+                step_entry(round, step)
+            for (round, step, model), stats in self.llm.items():
+                step_entry(round, step)["llm"][model] = self._llm_json(stats)
+            for (round, tool), stats in self.tools.items():
+                round_entry(round)["tools"][tool] = self._tool_json(stats)
+
+            llm_total = LLMStats()
+            for stats in self.llm.values():
+                llm_total.calls += stats.calls
+                llm_total.cached += stats.cached
+                llm_total.failures += stats.failures
+                llm_total.prompt_tokens += stats.prompt_tokens
+                llm_total.completion_tokens += stats.completion_tokens
+                llm_total.cost += stats.cost
+                llm_total.durations += stats.durations
+            tools_total: Dict[str, ToolStats] = OrderedDict()
+            for (_, tool), stats in self.tools.items():
+                total = tools_total.setdefault(tool, ToolStats())
+                total.calls += stats.calls
+                total.failures += stats.failures
+                total.durations += stats.durations
+
+            return {
+                "round": self.round,
+                "step": self.step,
+                "rounds": list(rounds.values()),
+                "totals": {
+                    "llm": self._llm_json(llm_total),
+                    "llm_retries": sum(self.retries.values()),
+                    "tools": {
+                        tool: self._tool_json(stats)
+                        for tool, stats in tools_total.items()
+                    },
+                },
+            }
+
+    def _llm_json(self, stats: LLMStats) -> Dict[str, Any]:
+        return {
+            "calls": stats.calls,
+            "cached": stats.cached,
+            "failures": stats.failures,
+            "prompt_tokens": stats.prompt_tokens,
+            "completion_tokens": stats.completion_tokens,
+            "cost_usd": round(stats.cost, 6),
+            "latency": _latency(stats.durations),
+        }
+
+    def _tool_json(self, stats: ToolStats) -> Dict[str, Any]:
+        return {
+            "calls": stats.calls,
+            "failures": stats.failures,
+            "latency": _latency(stats.durations),
+        }
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help: str, samples) -> None:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(_sample(name, labels, value))
+
+        def histogram(name: str, help: str, series) -> None:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, durations in series:
+                for bound in LATENCY_BUCKETS:
+                    count = sum(1 for d in durations if d <= bound)
+                    lines.append(
+                        _sample(f"{name}_bucket", {**labels, "le": bound}, count)
+                    )
+                lines.append(
+                    _sample(f"{name}_bucket", {**labels, "le": "+Inf"}, len(durations))
+                )
+                lines.append(_sample(f"{name}_sum", labels, sum(durations)))
+                lines.append(_sample(f"{name}_count", labels, len(durations)))
+
+        with self._lock:
+            llm = [
+                (dict(round=r, step=s, model=m), stats)
+                for (r, s, m), stats in self.llm.items()
+            ]
+            retries = [(dict(round=r, step=s), n) for (r, s), n in self.retries.items()]
+            tools = [
+                (dict(round=r, tool=t), stats) for (r, t), stats in self.tools.items()
+            ]
+            metric(
+                "blockagi_round",
+                "gauge",
+                "Current round of the agent.",
+                [({}, self.round)],
+            )
+            metric(
+                "blockagi_step_duration_seconds",
+                "gauge",
+                "Wall time of each step.",
+                [(dict(round=r, step=s), d) for (r, s), d in self.steps.items()],
+            )
+            for name, attribute, help in (
+                ("llm_calls_total", "calls", "LLM calls, including cached ones."),
+                ("llm_cached_calls_total", "cached", "LLM calls served by the cache."),
+                ("llm_failures_total", "failures", "Failed LLM calls."),
+                ("llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens sent."),
+                (
+                    "llm_completion_tokens_total",
+                    "completion_tokens",
+                    "Completion tokens received.",
+                ),
+                ("llm_cost_usd_total", "cost", "Estimated cost of LLM calls in USD."),
+            ):
+                metric(
+                    f"blockagi_{name}",
+                    "counter",
+                    help,
+                    [(labels, getattr(stats, attribute)) for labels, stats in llm],
+                )
+            metric(
+                "blockagi_llm_retries_total",
+                "counter",
+                "LLM calls retried after an error.",
+                retries,
+            )
+            histogram(
+                "blockagi_llm_latency_seconds",
+                "Wall time of LLM calls.",
+                [(labels, stats.durations) for labels, stats in llm],
+            )
+            metric(
+                "blockagi_tool_calls_total",
+                "counter",
+                "Tool calls.",
+                [(labels, stats.calls) for labels, stats in tools],
+            )
+            metric(
+                "blockagi_tool_failures_total",
+                "counter",
+                "Failed tool calls.",
+                [(labels, stats.failures) for labels, stats in tools],
+            )
+            histogram(
+                "blockagi_tool_latency_seconds",
+                "Wall time of tool calls.",
+                [(labels, stats.durations) for labels, stats in tools],
+            )
+        return "\n".join(lines) + "\n"
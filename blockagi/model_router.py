@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import BaseMessage
+
+from blockagi.utils.tokens import count_message_tokens, count_tokens, model_name
+
+# Route used by chains and phases without a route of their own
+DEFAULT_ROUTE = "default"
+
+ModelSpec = Tuple[str, Dict[str, Any]]
+
+
+def parse_routes(spec: str) -> Dict[str, List[ModelSpec]]:
+    """Parse routes like "PlanChain=gpt-3.5-turbo:temperature=0.2,gpt-4".
+
+    Routes are separated by ";". Each maps a chain class, optionally with a
+    phase (e.g. "NarrateChain.map"), to models in fallback order. Each model
+    may set parameters as ":name=value".
+    """
+    routes: Dict[str, List[ModelSpec]] = OrderedDict()
+    for route in filter(None, (r.strip() for r in spec.split(";"))):
+        key, sep, models = route.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"Invalid model route {route!r}; use Chain=model,...")
+        routes[key.strip()] = [
+            _parse_model(model) for model in models.split(",") if model.strip()
+        ]
+        if not routes[key.strip()]:
+            raise ValueError(f"No models given for route {key.strip()!r}")
+    return routes
+
+
+def _parse_model(spec: str) -> ModelSpec:
+    name, *params = spec.strip().split(":")
+    kwargs: Dict[str, Any] = {}
+    for param in params:
+        key, sep, value = param.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid model parameter {param!r}; use name=value")
+        try:
+            kwargs[key.strip()] = float(value)
+        except ValueError:
+            kwargs[key.strip()] = value.strip()
+    return name, kwargs
+
+
+def label(llm: BaseChatModel) -> str:
+    return model_name(llm) or llm.__class__.__name__
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    errors: int = 0
+    slow: int = 0
+    latency: float = 0.0  # Total seconds of successful calls
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class ModelRouter:
+    """Picks the chat models of each chain, in fallback order.
+
+    Routes are keyed by chain class name, optionally with a phase, e.g.
+    "EvaluateChain" or "NarrateChain.map". "NarrateChain.map" falls back to
+    the "NarrateChain" route, then to the default route.
+
+    A model that took longer than `slow_after` seconds to answer is moved to
+    the end of its fallback list for `cooldown` seconds. Records latency and
+    token counts per model.
+    """
+
+    def __init__(
+        self,
+        default: List[BaseChatModel],
+        routes: Optional[Dict[str, List[BaseChatModel]]] = None,
+        slow_after: Optional[float] = None,
+        cooldown: float = 300,
+    ):
+        self.routes = {DEFAULT_ROUTE: default, **(routes or {})}
+        self.slow_after = slow_after
+        self.cooldown = cooldown
+        self.stats: Dict[str, ModelStats] = OrderedDict()
+        self._slow_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def models(self, chain: str, phase: Optional[str] = None) -> List[BaseChatModel]:
+        keys = [f"{chain}.{phase}"] if phase else []
+        keys += [chain, DEFAULT_ROUTE]
+        candidates = next(self.routes[key] for key in keys if key in self.routes)
+        now = time.monotonic()
+        slow = [m for m in candidates if self._slow_until.get(label(m), 0) > now]
+        return [m for m in candidates if m not in slow] + slow
+
+    def record(
+        self,
+        llm: BaseChatModel,
+        latency: float,
+        messages: List[BaseMessage],
+        response: Optional[BaseMessage],
+    ) -> None:
+        """Record a call; `response` is None if it failed."""
+        name = label(llm)
+        model = model_name(llm)
+        prompt_tokens = count_message_tokens(messages, model)
+        with self._lock:
+            stats = self.stats.setdefault(name, ModelStats())
+            stats.calls += 1
+            stats.prompt_tokens += prompt_tokens
+            if response is None:
+                stats.errors += 1
+                return
+            stats.latency += latency
+            stats.completion_tokens += count_tokens(response.content, model)
+            if self.slow_after and latency > self.slow_after:
+                stats.slow += 1
+                self._slow_until[name] = time.monotonic() + self.cooldown
+
+    def total_tokens(self) -> int:
+        """Prompt and completion tokens of all calls so far."""
+        with self._lock:
+            return sum(
+                s.prompt_tokens + s.completion_tokens for s in self.stats.values()
+            )
+
+    def summary(self) -> str:
+        if not self.stats:
+            return "Models: no calls yet"
+        lines = []
+        for name, stats in self.stats.items():
+            succeeded = stats.calls - stats.errors
+            average = stats.latency / succeeded if succeeded else 0
+            lines.append(
+                f"- {name}: {stats.calls} calls, {stats.errors} errors, "
+                f"{stats.slow} slow, {average:.1f}s avg, "
+                f"{stats.prompt_tokens} prompt + "
+                f"{stats.completion_tokens} completion tokens"
+            )
+        return "Models:\n" + "\n".join(lines)
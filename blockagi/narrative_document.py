@@ -0,0 +1,130 @@
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+FOOTNOTE_PATTERN = re.compile(r"^\[\^([^\]]+?)\^?\]:")
+NON_WORD_PATTERN = re.compile(r"[^\w\s]|_")
+
+PATCH_OPS = (
+    "set_title",
+    "add_section",
+    "replace_section",
+    "delete_section",
+    "add_footnotes",
+)
+
+
+def normalize_heading(heading: str) -> str:
+    # "## 🌈 Automated AI Agent" and "automated ai agent" are the same section
+    heading = NON_WORD_PATTERN.sub(" ", heading.lstrip("#").lower())
+    return " ".join(heading.split())
+
+
+@dataclass
+class Section:
+    heading: str  # e.g. "## 🌈 Automated AI Agent"
+    body: str
+
+
+@dataclass
+class NarrativeDocument:
+    """Markdown report split into title, sections and footnotes.
+
+    Lets the narrator edit single sections instead of rewriting the report.
+    """
+
+    title: str = ""
+    preamble: str = ""
+    sections: List[Section] = field(default_factory=list)
+    footnotes: Dict[str, str] = field(default_factory=OrderedDict)
+
+    @classmethod
+    def parse(cls, markdown: str) -> "NarrativeDocument":
+        doc = cls()
+        preamble: List[str] = []
+        section: Optional[Section] = None
+        body: List[str] = []
+        for line in markdown.splitlines():
+            footnote = FOOTNOTE_PATTERN.match(line)
+            if footnote:
+                doc.footnotes[footnote.group(1)] = line
+            elif line.startswith("# ") and not doc.title:
+                doc.title = line.strip()
+            elif line.startswith("## "):
+                if section is not None:
+                    section.body = "\n".join(body).strip()
+                section = Section(heading=line.strip(), body="")
+                doc.sections.append(section)
+                body = []
+            elif section is not None:
+                body.append(line)
+            else:
+                preamble.append(line)
+        if section is not None:
+            section.body = "\n".join(body).strip()
+        doc.preamble = "\n".join(preamble).strip()
+        return doc
+
+    def render(self) -> str:
+        parts = [p for p in (self.title, self.preamble) if p]
+        for section in self.sections:
+            parts.append(f"{section.heading}\n{section.body}".strip())
+        if self.footnotes:
+            parts.append("\n".join(self.footnotes.values()))
+        return "\n\n".join(parts)
+
+    def find(self, heading: str) -> Optional[int]:
+        key = normalize_heading(heading)
+        for index, section in enumerate(self.sections):
+            if normalize_heading(section.heading) == key:
+                return index
+        return None
+
+    def apply(self, patch: List[Dict[str, Any]]) -> Counter:
+        """Apply edits to the document; return how many of each were applied."""
+        applied = Counter()
+        for edit in patch:
+            op = edit.get("op")
+            if op not in PATCH_OPS:
+                raise ValueError(f"Unknown edit {op}; use one of {PATCH_OPS}")
+            getattr(self, f"_{op}")(edit)
+            applied[op] += 1
+        return applied
+
+    # Edits ==============================================
+
+    def _set_title(self, edit: Dict[str, Any]) -> None:
+        self.title = "# " + edit["heading"].lstrip("#").strip()
+
+    def _add_section(self, edit: Dict[str, Any]) -> None:
+        index = self.find(edit["heading"])
+        if index is not None:
+            # The section exists already; treat as a replacement
+            return self._replace_section(edit)
+        section = Section(
+            heading="## " + edit["heading"].lstrip("#").strip(),
+            body=edit.get("content", "").strip(),
+        )
+        after = self.find(edit["after"]) if edit.get("after") else None
+        if after is None:
+            self.sections.append(section)
+        else:
+            self.sections.insert(after + 1, section)
+
+    def _replace_section(self, edit: Dict[str, Any]) -> None:
+        index = self.find(edit["heading"])
+        if index is None:
+            return self._add_section(edit)
+        self.sections[index].body = edit.get("content", "").strip()
+
+    def _delete_section(self, edit: Dict[str, Any]) -> None:
+        index = self.find(edit["heading"])
+        if index is not None:
+            del self.sections[index]
+
+    def _add_footnotes(self, edit: Dict[str, Any]) -> None:
+        for line in edit.get("footnotes", []):
+            footnote = FOOTNOTE_PATTERN.match(line.strip())
+            if footnote:
+                self.footnotes[footnote.group(1)] = line.strip()
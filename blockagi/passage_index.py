@@ -0,0 +1,165 @@
+import hashlib
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from blockagi.resource_ranker import tokenize
+
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass(frozen=True)
+class Passage:
+    url: str
+    citation: Optional[str]
+    position: int  # Order within its document
+    text: str
+
+
+@dataclass
+class _Document:
+    digest: str  # Of the indexed text
+    passages: List[Passage] = field(default_factory=list)
+    vectors: List[Tuple[np.ndarray, np.ndarray]] = field(default_factory=list)
+
+
+def split_passages(text: str, max_chars: int) -> List[str]:
+    """Split text at paragraphs, then sentences, into pieces of ~`max_chars`."""
+    pieces: List[str] = []
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_PATTERN.split(paragraph):
+            # Hard-wrap whatever has no sentence breaks, e.g. tables
+            pieces.extend(
+                sentence[i : i + max_chars] for i in range(0, len(sentence), max_chars)
+            )
+
+    passages: List[str] = []
+    current = ""
+    for piece in filter(None, pieces):
+        if current and len(current) + len(piece) + 2 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+class PassageIndex:
+    """In-process search over passages of visited content.
+
+    Passages are embedded as TF-IDF vectors with the hashing trick (terms are
+    hashed into `dimensions` buckets), and searched by brute-force cosine
+    similarity. Vectors are stored sparse, so memory grows with the text
+    indexed, not with `dimensions`.
+
+    Documents are keyed by URL; adding changed content for a URL replaces
+    its passages. `retain` drops the documents no longer needed.
+    """
+
+    def __init__(self, dimensions: int = 4096, passage_chars: int = 1000):
+        self.dimensions = dimensions
+        self.passage_chars = passage_chars
+        self._documents: Dict[str, _Document] = {}
+        self._count = 0
+        self._df = np.zeros(dimensions, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _sparse(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        buckets = Counter(
+            zlib.crc32(token.encode("utf-8")) % self.dimensions
+            for token in tokenize(text)
+        )
+        indices = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+        counts = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+        return indices, 1 + np.log(counts)  # Sublinear term frequency
+
+    def _idf(self) -> np.ndarray:
+        return np.log((1 + self._count) / (1 + self._df)) + 1
+
+    def add(self, url: str, text: str, citation: Optional[str] = None) -> int:
+        """Index the passages of a document; return how many were added."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        existing = self._documents.get(url)
+        if existing is not None and existing.digest == digest:
+            return 0  # Already indexed, e.g. a result served from the memo
+        self.remove(url)
+        document = self._documents[url] = _Document(digest)
+        for position, passage in enumerate(split_passages(text, self.passage_chars)):
+            indices, weights = self._sparse(passage)
+            self._df[indices] += 1
+            document.passages.append(Passage(url, citation, position, passage))
+            document.vectors.append((indices, weights))
+        self._count += len(document.passages)
+        return len(document.passages)
+
+    def remove(self, url: str) -> None:
+        document = self._documents.pop(url, None)
+        if document is None:
+            return
+        for indices, _weights in document.vectors:
+            self._df[indices] -= 1
+        self._count -= len(document.passages)
+
+    def retain(self, urls: Iterable[str]) -> int:
+        """Drop every document but those of `urls`; return how many were dropped."""
+        keep = set(urls)
+        dropped = [url for url in self._documents if url not in keep]
+        for url in dropped:
+            self.remove(url)
+        return len(dropped)
+
+    def documents(self, url: str) -> List[Passage]:
+        document = self._documents.get(url)
+        return list(document.passages) if document else []
+
+    def search(
+        self, query: str, top_k: int = 5, urls: Optional[Iterable[str]] = None
+    ) -> List[Tuple[Passage, float]]:
+        """Return the `top_k` passages most similar to `query`, best first.
+
+        Only passages of `urls` are searched, if given.
+        """
+        documents = [
+            self._documents[url]
+            for url in (self._documents if urls is None else urls)
+            if url in self._documents
+        ]
+        candidates = [
+            (passage, vector)
+            for document in documents
+            for passage, vector in zip(document.passages, document.vectors)
+        ]
+        query_indices, query_weights = self._sparse(query)
+        if not candidates or len(query_indices) == 0:
+            return []
+
+        idf = self._idf()
+        matrix = np.zeros((len(candidates), self.dimensions), dtype=np.float32)
+        for row, (_passage, (indices, weights)) in enumerate(candidates):
+            matrix[row, indices] = weights
+        matrix *= idf
+        query_vector = np.zeros(self.dimensions, dtype=np.float32)
+        query_vector[query_indices] = query_weights * idf[query_indices]
+
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+        scores = (matrix @ query_vector) / np.where(norms > 0, norms, 1)
+        best = np.argsort(-scores)[:top_k]
+        return [(candidates[i][0], float(scores[i])) for i in best if scores[i] > 0]
+
+    def summary(self) -> str:
+        return (
+            f"Passage index: {self._count} passages "
+            f"of {len(self._documents)} documents"
+        )
@@ -0,0 +1,112 @@
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from blockagi.resource_pool import normalize_url
+from blockagi.schema import ResearchResult, ResearchTask
+
+# Seconds a memoized result stays fresh, per tool
+DEFAULT_FRESHNESS = {
+    "VisitWeb": float("inf"),
+    "DuckDuckGoSearchAnswer": 1800,
+}
+
+
+def _is_url(value: str) -> bool:
+    parsed = urlparse(value)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+
+def canonicalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k).lower(): canonicalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [canonicalize(v) for v in value]
+    if isinstance(value, str):
+        value = value.strip()
+        if _is_url(value):
+            # Paths and queries are case-sensitive; only normalize the URL
+            return normalize_url(value)
+        return re.sub(r"\s+", " ", value).lower()
+    return value
+
+
+@dataclass
+class MemoEntry:
+    result: ResearchResult
+    created_at: float
+    duration: float
+
+
+class ResearchMemo:
+    """Run-scoped memo of research task results keyed by (tool, args)."""
+
+    def __init__(
+        self,
+        freshness: Dict[str, float] = DEFAULT_FRESHNESS,
+        default_freshness: float = 3600,
+    ):
+        self.freshness = freshness
+        self.default_freshness = default_freshness
+        self.counts = Counter()
+        self.saved_seconds = 0.0
+        self._entries: Dict[str, MemoEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(task: ResearchTask) -> str:
+        return json.dumps(
+            [task.tool.strip(), canonicalize(task.args)], sort_keys=True, default=str
+        )
+
+    def get(self, task: ResearchTask) -> Optional[ResearchResult]:
+        with self._lock:
+            entry = self._entries.get(self.key(task))
+            if entry is None or not self._is_fresh(entry, time.time()):
+                self.counts["miss"] += 1
+                return None
+            self.counts["hit"] += 1
+            self.saved_seconds += entry.duration
+        # Keep the reasoning of the new task, but flag the result as cached
+        return replace(entry.result, reasoning=task.reasoning, cached=True)
+
+    def saved(self, task: ResearchTask) -> float:
+        with self._lock:
+            entry = self._entries.get(self.key(task))
+            return entry.duration if entry else 0.0
+
+    def put(self, task: ResearchTask, result: ResearchResult, duration: float) -> None:
+        if isinstance(result.result, str) and result.result.startswith("Error:"):
+            return
+        with self._lock:
+            key = self.key(task)
+            self._entries.pop(key, None)
+            self._entries[key] = MemoEntry(
+                result=result, created_at=time.time(), duration=duration
+            )
+
+    def executed_tasks(self, limit: int = 20) -> List[ResearchTask]:
+        """Return the most recent tasks the memo still serves, newest first."""
+        now = time.time()
+        with self._lock:
+            entries = [e for e in self._entries.values() if self._is_fresh(e, now)]
+        entries = entries[-limit:]
+        return [
+            ResearchTask(tool=e.result.tool, args=e.result.args, reasoning="")
+            for e in reversed(entries)
+        ]
+
+    def _is_fresh(self, entry: MemoEntry, now: float) -> bool:
+        ttl = self.freshness.get(entry.result.tool, self.default_freshness)
+        return now - entry.created_at < ttl
+
+    def summary(self) -> str:
+        return (
+            f"Research memo: {self.counts['hit']} repeated tasks served from memo, "
+            f"saving {self.saved_seconds:.1f}s"
+        )
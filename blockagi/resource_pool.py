@@ -1,20 +1,41 @@
+import sqlite3
+import threading
+import zlib
 from dataclasses import dataclass, field
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional
 from url_normalize import url_normalize
 from blockagi.schema import Resource, BaseResourcePool
 
 
+@lru_cache(maxsize=262144)
+def normalize_url(url: str) -> str:
+    # url_normalize is relatively expensive and the same links are looked up
+    # over and over again (search results, VisitWeb calls, prompt rendering)
+    return url_normalize(url)
+
+
 @dataclass
 class ResourcePool(BaseResourcePool):
     resources: List[Resource] = field(default_factory=list)
 
+    def __post_init__(self):
+        # Indexes are plain attributes (not dataclass fields) so they are not
+        # serialized alongside `resources` when the pool is sent to the WebUI
+        self._index: Dict[str, Resource] = {}
+        self._unvisited: Dict[str, Resource] = {}
+        for resource in self.resources:
+            self._index_resource(resource)
+
+    def _index_resource(self, resource: Resource) -> None:
+        # Resources passed in may not be normalized yet, unlike those added
+        key = normalize_url(resource.url)
+        self._index[key] = resource
+        if not resource.visited:
+            self._unvisited[key] = resource
+
     def find(self, url: str) -> Optional[Resource]:
-        url = url_normalize(url)
-        resources = [r for r in self.resources if r.url == url]
-        if len(resources) == 0:
-            return None
-        else:
-            return resources[0]
+        return self._index.get(normalize_url(url))
 
     def add(
         self,
@@ -23,25 +44,155 @@ class ResourcePool(BaseResourcePool):
         visited: Optional[bool] = False,
         content: Optional[str] = None,
     ) -> None:
-        if self.find(url) is not None:
+        url = normalize_url(url)
+        if url in self._index:
             return
-        self.resources.append(
-            Resource(
-                url=url_normalize(url),
-                description=description,
-                visited=visited,
-                content=content,
-            )
+        resource = Resource(
+            url=url,
+            description=description,
+            visited=visited,
+            content=content,
         )
+        self.resources.append(resource)
+        self._index_resource(resource)
+        self._notify_added(resource)
 
     def visit(self, url: str, content: str = "") -> None:
         resource = self.find(url)
         if resource is not None:
             resource.visited = True
             resource.content = content
+            self._unvisited.pop(normalize_url(resource.url), None)
 
     def get_all(self) -> List[Resource]:
         return self.resources
 
     def get_unvisited(self) -> List[Resource]:
-        return [r for r in self.resources if not r.visited]
+        return list(self._unvisited.values())
+
+
+class SQLiteResourcePool(BaseResourcePool):
+    """Resource pool persisted to SQLite.
+
+    Only url/description/visited are kept in memory. Page content is stored
+    zlib-compressed on disk and loaded on demand via `get_content`, so memory
+    stays bounded no matter how many pages are visited, and a restarted run
+    picks up where the previous one left off.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resources ("
+            "  url TEXT PRIMARY KEY,"
+            "  description TEXT,"
+            "  visited INTEGER NOT NULL DEFAULT 0,"
+            "  content BLOB"
+            ")"
+        )
+        self._conn.commit()
+        self._index: Dict[str, Resource] = {}
+        self._unvisited: Dict[str, Resource] = {}
+        rows = self._conn.execute(
+            "SELECT url, description, visited FROM resources ORDER BY rowid"
+        )
+        for url, description, visited in rows:
+            self._index_resource(
+                Resource(url=url, description=description, visited=bool(visited))
+            )
+
+    def _index_resource(self, resource: Resource) -> None:
+        self._index[resource.url] = resource
+        if not resource.visited:
+            self._unvisited[resource.url] = resource
+
+    @staticmethod
+    def _compress(content: Optional[str]) -> Optional[bytes]:
+        if content is None:
+            return None
+        return zlib.compress(content.encode("utf-8"))
+
+    def find(self, url: str) -> Optional[Resource]:
+        return self._index.get(normalize_url(url))
+
+    def add(
+        self,
+        url: str,
+        description: Optional[str] = None,
+        visited: Optional[bool] = False,
+        content: Optional[str] = None,
+    ) -> None:
+        url = normalize_url(url)
+        with self._lock:
+            if url in self._index:
+                return
+            self._conn.execute(
+                "INSERT OR IGNORE INTO resources (url, description, visited, content) "
+                "VALUES (?, ?, ?, ?)",
+                (url, description, int(bool(visited)), self._compress(content)),
+            )
+            self._conn.commit()
+            resource = Resource(url=url, description=description, visited=visited)
+            self._index_resource(resource)
+        self._notify_added(resource)
+
+    def add_many(self, resources: List[Resource]) -> None:
+        # Insert the whole batch in a single transaction
+        added = []
+        with self._lock:
+            for r in resources:
+                url = normalize_url(r.url)
+                if url in self._index:
+                    continue
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO resources "
+                    "(url, description, visited, content) VALUES (?, ?, ?, ?)",
+                    (
+                        url,
+                        r.description,
+                        int(bool(r.visited)),
+                        self._compress(r.content),
+                    ),
+                )
+                resource = Resource(
+                    url=url, description=r.description, visited=r.visited
+                )
+                self._index_resource(resource)
+                added.append(resource)
+            self._conn.commit()
+        for resource in added:
+            self._notify_added(resource)
+
+    def visit(self, url: str, content: str = "") -> None:
+        resource = self.find(url)
+        if resource is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE resources SET visited = 1, content = ? WHERE url = ?",
+                (self._compress(content), resource.url),
+            )
+            self._conn.commit()
+            resource.visited = True
+            self._unvisited.pop(resource.url, None)
+
+    def get_content(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM resources WHERE url = ?", (normalize_url(url),)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def get_all(self) -> List[Resource]:
+        return list(self._index.values())
+
+    def get_unvisited(self) -> List[Resource]:
+        return list(self._unvisited.values())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List
+import numpy as np
+
+from blockagi.resource_pool import normalize_url
+from blockagi.schema import Resource
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to "
+    "what when where which who why with www http https com org net html htm "
+    "php index".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        t
+        for t in TOKEN_PATTERN.findall(text.lower())
+        if t not in STOPWORDS and len(t) > 1
+    ]
+
+
+class ResourceRanker:
+    """BM25 ranking of RESOURCE POOL entries against the research context.
+
+    Only the top-k unvisited resources are shown to the planner. Resources that
+    are shown but not picked lose score every round, and are evicted from the
+    candidates after `max_passes` rounds.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 20,
+        max_passes: int = 5,
+        pass_decay: float = 0.8,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.top_k = top_k
+        self.max_passes = max_passes
+        self.pass_decay = pass_decay
+        self.k1 = k1
+        self.b = b
+        self.query = ""
+        self.passes: Dict[str, int] = {}
+        self._doc_tokens: Dict[str, Counter] = {}
+
+    def _tokens(self, resource: Resource) -> Counter:
+        tokens = self._doc_tokens.get(resource.url)
+        if tokens is None:
+            tokens = Counter(tokenize(f"{resource.description or ''} {resource.url}"))
+            self._doc_tokens[resource.url] = tokens
+        return tokens
+
+    def candidates(self, resources: Iterable[Resource]) -> List[Resource]:
+        return [r for r in resources if self.passes.get(r.url, 0) < self.max_passes]
+
+    def score(self, resources: List[Resource], query: str) -> np.ndarray:
+        if len(resources) == 0:
+            return np.zeros(0)
+        docs = [self._tokens(r) for r in resources]
+        doc_len = np.array([sum(d.values()) for d in docs], dtype=float)
+        avg_len = max(doc_len.mean(), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+
+        scores = np.zeros(len(docs))
+        for term, weight in Counter(tokenize(query)).items():
+            tf = np.array([d.get(term, 0) for d in docs], dtype=float)
+            df = np.count_nonzero(tf)
+            if df == 0:
+                continue
+            idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            scores += weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        passes = np.array([self.passes.get(r.url, 0) for r in resources])
+        return scores * np.power(self.pass_decay, passes)
+
+    def rank(self, resources: Iterable[Resource], query: str) -> List[Resource]:
+        self.query = query
+        candidates = self.candidates(resources)
+        # Forget resources visited or evicted since the last round
+        urls = {r.url for r in candidates}
+        for url in [url for url in self._doc_tokens if url not in urls]:
+            del self._doc_tokens[url]
+        scores = self.score(candidates, query)
+        # Stable sort keeps the pool order for equally scored resources
+        order = np.argsort(-scores, kind="stable")[: self.top_k]
+        return [candidates[i] for i in order]
+
+    def record_round(self, shown: List[Resource], chosen_urls: Iterable[str]) -> None:
+        chosen = {normalize_url(url) for url in chosen_urls}
+        for resource in shown:
+            if resource.url not in chosen:
+                self.passes[resource.url] = self.passes.get(resource.url, 0) + 1
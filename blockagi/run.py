@@ -1,16 +1,41 @@
 import os
-from blockagi.chains import BlockAGIChain
+from typing import Any, Callable, Dict, List
+from blockagi.chains import BlockAGIChain, BlockAGICallbackHandler
+from blockagi.chains.research import parse_tool_concurrency
+from blockagi.iteration_scheduler import IterationScheduler
+from blockagi.model_router import DEFAULT_ROUTE, ModelRouter, label, parse_routes
+from blockagi.passage_index import PassageIndex
+from blockagi.research_memo import ResearchMemo
+from blockagi.resource_ranker import ResourceRanker
 from blockagi.schema import Findings
+from blockagi.structured_output import structured_output
 from blockagi.tools import (
     DDGSearchAnswerTool,
     DDGSearchLinksTool,
     GoogleSearchLinksTool,
+    MetaSearchLinksTool,
     VisitWebTool,
+    PageFetcher,
+    Prefetcher,
+    SearchCache,
 )
+from blockagi.tools.visitweb import extract_data
 from langchain.chat_models import ChatOpenAI
 
 
-def run_blockagi(
+class StatsLogCallback(BlockAGICallbackHandler):
+    """Logs summaries of tool statistics at the end of every round."""
+
+    def __init__(self, log: Callable[[str], Any], summaries: List[Callable[[], str]]):
+        self.log = log
+        self.summaries = summaries
+
+    def on_iteration_end(self, outputs: Dict[str, Any]) -> Any:
+        for summary in self.summaries:
+            self.log(summary())
+
+
+def create_blockagi(
     agent_role,
     openai_api_key,
     openai_model,
@@ -19,16 +44,79 @@ def run_blockagi(
     blockagi_callback,
     llm_callback,
     iteration_count,
+    browser_pool=None,
+    page_cache=None,
+    prefetch_workers=0,
+    search_cache=None,
+    llm_cache=None,
+    narrate_mode="sequential",
+    narrate_map_model=None,
+    narrate_passages=0,
+    model_routes=None,
+    model_slow_after=None,
+    metrics=None,
+    fuse_evaluate_plan=False,
+    max_iteration_count=None,
+    min_iteration_count=1,
+    expertise_target=None,
+    min_expertise_gain=0.05,
+    min_narrative_change=0.05,
+    stale_rounds=None,
+    token_budget=None,
+    time_budget=None,
+    research_workers=4,
+    research_concurrency=2,
+    research_tool_concurrency=None,
+    research_task_timeout=90,
+    research_deadline=240,
 ):
-    tools = []
+    fetcher = PageFetcher(browser_pool)
+    search_cache = search_cache or SearchCache()
+    resource_ranker = ResourceRanker()
+    research_memo = ResearchMemo()
+    summaries = [
+        fetcher.summary,
+        search_cache.summary,
+        research_memo.summary,
+        structured_output.summary,
+    ]
+    if page_cache:
+        summaries.append(page_cache.summary)
+    if llm_cache:
+        summaries.append(llm_cache.summary)
+
+    passage_index = None
+    if narrate_passages > 0:
+        passage_index = PassageIndex()
+        summaries.append(passage_index.summary)
+
+    prefetcher = None
+    if prefetch_workers > 0:
+        # Fetch promising links in the background while the LLM is working
+        prefetcher = Prefetcher(
+            fetch=lambda url: extract_data(url, fetcher, page_cache),
+            ranker=resource_ranker,
+            max_workers=prefetch_workers,
+        )
+        resource_pool.add_listener(prefetcher.on_resource_added)
+        summaries.append(prefetcher.summary)
+
+    link_tools = []
     if os.getenv("GOOGLE_API_KEY") and os.getenv("GOOGLE_CSE_ID"):
-        tools.append(GoogleSearchLinksTool(resource_pool))
+        link_tools.append(GoogleSearchLinksTool(resource_pool, search_cache))
+    link_tools.append(DDGSearchLinksTool(resource_pool, search_cache))
+
+    tools = []
+    if len(link_tools) > 1:
+        # Query all search engines in one task instead of one task per engine
+        tools.append(MetaSearchLinksTool(resource_pool, link_tools))
+    else:
+        tools.extend(link_tools)
 
     tools.extend(
         [
-            DDGSearchAnswerTool(),
-            DDGSearchLinksTool(resource_pool),
-            VisitWebTool(resource_pool),
+            DDGSearchAnswerTool(search_cache),
+            VisitWebTool(resource_pool, fetcher, page_cache, prefetcher),
         ]
     )
 
@@ -39,13 +127,57 @@ def run_blockagi(
         )
     )
 
-    llm = ChatOpenAI(
-        temperature=0.8,
-        streaming=True,
-        model=openai_model,
-        openai_api_key=openai_api_key,
-        callbacks=[llm_callback],
-    )  # type: ignore
+    # Collect token, latency and failure counts of every LLM and tool call
+    metrics_callbacks = [metrics] if metrics else []
+    for tool in tools:
+        tool.callbacks = metrics_callbacks or None
+
+    def make_llm(model, params, streaming=True):
+        return ChatOpenAI(
+            **{"temperature": 0.8, "streaming": streaming, **params},
+            model=model,
+            openai_api_key=openai_api_key,
+            callbacks=([llm_callback] if streaming else []) + metrics_callbacks,
+        )  # type: ignore
+
+    route_specs = parse_routes(model_routes or "")
+    route_specs.setdefault(DEFAULT_ROUTE, [(openai_model, {})])
+    if narrate_mode == "map_reduce":
+        route_specs.setdefault(
+            "NarrateChain.map", [(narrate_map_model or openai_model, {})]
+        )
+    routes = {
+        # Map calls run concurrently, so they can't share the streamed LLM log
+        key: [
+            make_llm(m, params, streaming=key != "NarrateChain.map")
+            for m, params in specs
+        ]
+        for key, specs in route_specs.items()
+    }
+    model_router = ModelRouter(
+        default=routes.pop(DEFAULT_ROUTE),
+        routes=routes,
+        slow_after=model_slow_after,
+    )
+    summaries.append(model_router.summary)
+
+    scheduler = IterationScheduler(
+        rounds=iteration_count,
+        max_rounds=max_iteration_count,
+        min_rounds=min_iteration_count,
+        expertise_target=expertise_target,
+        min_expertise_gain=min_expertise_gain,
+        min_narrative_change=min_narrative_change,
+        stale_rounds=stale_rounds,
+        token_budget=token_budget,
+        time_budget=time_budget,
+        tokens_used=model_router.total_tokens,
+    )
+    summaries.append(scheduler.summary)
+    for key, models in model_router.routes.items():
+        blockagi_callback.on_log_message(
+            f"Models for {key}: " + ", ".join(label(m) for m in models)
+        )
 
     inputs = {
         "objectives": objectives,
@@ -56,11 +188,41 @@ def run_blockagi(
         ),
     }
 
-    BlockAGIChain(
+    chain = BlockAGIChain(
         iteration_count=iteration_count,
         agent_role=agent_role,
-        llm=llm,
+        llm=model_router.routes[DEFAULT_ROUTE][0],
+        model_router=model_router,
         tools=tools,
         resource_pool=resource_pool,
-        callbacks=[blockagi_callback],
-    )(inputs=inputs)
+        resource_ranker=resource_ranker,
+        research_memo=research_memo,
+        llm_cache=llm_cache,
+        narrate_mode=narrate_mode,
+        passage_index=passage_index,
+        passages_per_objective=narrate_passages,
+        fuse_evaluate_plan=fuse_evaluate_plan,
+        scheduler=scheduler,
+        max_workers=research_workers,
+        default_tool_concurrency=research_concurrency,
+        tool_concurrency=parse_tool_concurrency(research_tool_concurrency or ""),
+        task_timeout=research_task_timeout,
+        iteration_deadline=research_deadline,
+        callbacks=[
+            blockagi_callback,
+            StatsLogCallback(blockagi_callback.on_log_message, summaries),
+        ]
+        + metrics_callbacks,
+    )
+    return chain, inputs
+
+
+def run_blockagi(**kwargs):
+    chain, inputs = create_blockagi(**kwargs)
+    chain(inputs=inputs)
+
+
+async def arun_blockagi(**kwargs):
+    """Same as run_blockagi(), on the running event loop."""
+    chain, inputs = create_blockagi(**kwargs)
+    await chain.acall(inputs=inputs)
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 
 
 @dataclass
@@ -28,6 +28,7 @@ class ResearchTask:
 class ResearchResult(ResearchTask):
     result: Any
     citation: Optional[str] = None
+    cached: bool = False  # Served from the research memo
 
 
 @dataclass
@@ -53,6 +54,14 @@ class BaseResourcePool(ABC):
     ) -> None:
         pass
 
+    def add_many(self, resources: List[Resource]) -> None:
+        for resource in resources:
+            self.add(
+                url=resource.url,
+                description=resource.description,
+                content=resource.content,
+            )
+
     @abstractmethod
     def visit(self, url: str, content: Optional[str] = "") -> None:
         pass
@@ -64,3 +73,17 @@ class BaseResourcePool(ABC):
     @abstractmethod
     def get_unvisited(self) -> List[Resource]:
         pass
+
+    def get_content(self, url: str) -> Optional[str]:
+        resource = self.find(url)
+        return resource.content if resource is not None else None
+
+    def add_listener(self, listener: Callable[[Resource], Any]) -> None:
+        """Call listener with every newly added resource."""
+        if not hasattr(self, "_listeners"):
+            self._listeners = []
+        self._listeners.append(listener)
+
+    def _notify_added(self, resource: Resource) -> None:
+        for listener in getattr(self, "_listeners", []):
+            listener(resource)
@@ -0,0 +1,334 @@
+import dataclasses
+import json
+import re
+import threading
+import typing
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from langchain.schema import HumanMessage
+
+# Repairs applied to malformed responses, in order
+REPAIRS = ("fence", "extract", "trailing_comma", "close_truncated")
+
+FENCE_PATTERN = re.compile(r"```[\w-]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+
+# Key of the whole response in `invalid_parts()`, when it can't be used at all
+WHOLE = None
+
+Part = Union[int, str, None]
+
+
+class OutputRepairError(ValueError):
+    pass
+
+
+def describe(invalid: Dict[Part, str]) -> str:
+    lines = []
+    for part, error in invalid.items():
+        if part is WHOLE:
+            part = "response"
+        elif isinstance(part, int):
+            part = f"element {part}"
+        lines.append(f"- {part}: {error}")
+    return "\n".join(lines)
+
+
+def _scan(text: str):
+    """Yield (position, char) for each bracket or comma outside of strings."""
+    in_string = escaped = False
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[]{},":
+            yield position, char
+
+
+def strip_fence(text: str) -> str:
+    match = FENCE_PATTERN.search(text)
+    return match.group(1) if match else text
+
+
+def extract_span(text: str) -> str:
+    """Cut the first JSON array or object out of surrounding prose."""
+    starts = [p for p in (text.find("["), text.find("{")) if p >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    depth = 0
+    for position, char in _scan(text[start:]):
+        if char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 0:
+                return text[start : start + position + 1]
+    return text[start:]  # Truncated; left to `close_truncated`
+
+
+def remove_trailing_commas(text: str) -> str:
+    commas = []
+    last = None  # Last comma, if nothing but whitespace followed it
+    for position, char in _scan(text):
+        if char == ",":
+            last = position
+            continue
+        if char in "]}" and last is not None and not text[last + 1 : position].strip():
+            commas.append(last)
+        last = None
+    for position in reversed(commas):
+        text = text[:position] + text[position + 1 :]
+    return text
+
+
+def close_truncated(text: str) -> str:
+    """Drop the unfinished tail of a cut-off response and close its brackets.
+
+    Only complete top-level elements are kept, so a truncated element is
+    dropped rather than half-parsed. A dropped key of an object is then
+    reported as missing; a dropped element of an array is simply lost.
+    """
+    stack: List[str] = []
+    cut = None
+    for position, char in _scan(text):
+        if char in "[{":
+            stack.append("]" if char == "[" else "}")
+            if len(stack) == 1:
+                cut = position + 1
+        elif char in "]}" and stack:
+            stack.pop()
+            if len(stack) <= 1:
+                cut = position + 1
+    if not stack or cut is None:
+        return text
+    return text[:cut].rstrip().rstrip(",") + stack[0]
+
+
+def _is_instance(value: Any, schema: Any) -> bool:
+    if schema is float:
+        if isinstance(value, str):
+            try:
+                float(value)
+                return True
+            except ValueError:
+                return False
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if schema in (str, int, bool):
+        return isinstance(value, schema)
+    return True  # Any, Dict[...], Optional[...]: presence is enough
+
+
+def validate(value: Any, schema: Any) -> Optional[str]:
+    """Return why `value` doesn't match `schema`, or None if it does.
+
+    `schema` is a dataclass, `List[...]` of a schema, a dict of key to schema,
+    or a plain type.
+    """
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            return "expected a JSON object"
+        for key, sub_schema in schema.items():
+            if key not in value:
+                return f'"{key}" is missing'
+            error = validate(value[key], sub_schema)
+            if error:
+                return f'"{key}": {error}'
+        return None
+    if typing.get_origin(schema) is list:
+        if not isinstance(value, list):
+            return "expected a JSON array"
+        (item_schema,) = typing.get_args(schema)
+        for index, item in enumerate(value):
+            error = validate(item, item_schema)
+            if error:
+                return f"element {index}: {error}"
+        return None
+    if dataclasses.is_dataclass(schema):
+        if not isinstance(value, dict):
+            return "expected a JSON object"
+        hints = typing.get_type_hints(schema)
+        for field in dataclasses.fields(schema):
+            required = (
+                field.default is dataclasses.MISSING
+                and field.default_factory is dataclasses.MISSING
+            )
+            if field.name not in value:
+                if required:
+                    return f'"{field.name}" is missing'
+                continue
+            if not _is_instance(value[field.name], hints[field.name]):
+                return f'"{field.name}" has the wrong type'
+        return None
+    if not _is_instance(value, schema):
+        return f"expected {getattr(schema, '__name__', schema)}"
+    return None
+
+
+class StructuredOutput:
+    """Tolerant parsing of JSON responses, validated against a schema.
+
+    Malformed responses are repaired locally where possible. Parts that are
+    still missing or invalid are re-asked from the model on their own,
+    instead of regenerating the whole response. Counts how often each
+    repair path fires.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self.counts[event] += 1
+
+    def loads(self, text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+        repairs = (strip_fence, extract_span, remove_trailing_commas, close_truncated)
+        error = None
+        for name, repair in zip(REPAIRS, repairs):
+            repaired = repair(text)
+            if repaired == text:
+                continue
+            self._count(name)
+            text = repaired
+            try:
+                return json.loads(text)
+            except ValueError as e:
+                error = e
+        self._count("unparseable")
+        raise OutputRepairError(f"Could not parse JSON: {error or 'no JSON found'}")
+
+    def drop_placeholders(self, value: Any, schema: Any) -> Any:
+        """Drop bare strings from arrays of objects.
+
+        Models often copy the "... use up to 3 tools" line of the response
+        format into their answer; it is not worth a re-ask.
+        """
+        if typing.get_origin(schema) is list and isinstance(value, list):
+            (item_schema,) = typing.get_args(schema)
+            if dataclasses.is_dataclass(item_schema) or isinstance(item_schema, dict):
+                kept = [item for item in value if not isinstance(item, str)]
+                if len(kept) < len(value):
+                    self._count("placeholder")
+                return kept
+        elif isinstance(schema, dict) and isinstance(value, dict):
+            return {
+                key: self.drop_placeholders(item, schema[key])
+                if key in schema
+                else item
+                for key, item in value.items()
+            }
+        return value
+
+    def invalid_parts(self, value: Any, schema: Any) -> Dict[Part, str]:
+        """Map each invalid element (list) or key (dict) to its error."""
+        if typing.get_origin(schema) is list and isinstance(value, list):
+            (item_schema,) = typing.get_args(schema)
+            errors = {i: validate(item, item_schema) for i, item in enumerate(value)}
+        elif isinstance(schema, dict) and isinstance(value, dict):
+            errors = {
+                key: validate(value[key], sub_schema) if key in value else "missing"
+                for key, sub_schema in schema.items()
+            }
+        else:
+            errors = {WHOLE: validate(value, schema)}
+        return {part: error for part, error in errors.items() if error}
+
+    def parse(self, text: str, schema: Any) -> Tuple[Any, Dict[Part, str]]:
+        self._count("parsed")
+        try:
+            value = self.loads(text)
+        except OutputRepairError as e:
+            return None, {WHOLE: str(e)}
+        value = self.drop_placeholders(value, schema)
+        return value, self.invalid_parts(value, schema)
+
+    def reask_message(self, invalid: Dict[Part, str]) -> HumanMessage:
+        if WHOLE in invalid:
+            return HumanMessage(
+                content=f"Your response is not valid: {invalid[WHOLE]}\n"
+                "Respond again using ONLY the format specified above:"
+            )
+        problems = describe(invalid)
+        if all(isinstance(part, int) for part in invalid):
+            return HumanMessage(
+                content="These elements of your JSON array are invalid:\n"
+                f"{problems}\n"
+                "Respond with ONLY a JSON array of the corrected elements, "
+                "in the same order:"
+            )
+        return HumanMessage(
+            content="These keys of your JSON object are missing or invalid:\n"
+            f"{problems}\n"
+            "Respond with ONLY a JSON object containing the corrected keys:"
+        )
+
+    def merge(
+        self, value: Any, invalid: Dict[Part, str], fix_text: str, schema: Any
+    ) -> Any:
+        """Put the re-asked parts in place of the invalid ones."""
+        self._count("reask")
+        if WHOLE in invalid:
+            try:
+                value = self.drop_placeholders(self.loads(fix_text), schema)
+            except OutputRepairError as e:
+                return self._fail({WHOLE: str(e)})
+            still_invalid = self.invalid_parts(value, schema)
+            if still_invalid:
+                return self._fail(still_invalid)
+            return value
+        try:
+            fix = self.drop_placeholders(self.loads(fix_text), schema)
+        except OutputRepairError:
+            fix = None
+        if isinstance(schema, dict):
+            fix = fix if isinstance(fix, dict) else {}
+            for key in invalid:
+                if key in fix and not validate(fix[key], schema[key]):
+                    value[key] = fix[key]
+                else:
+                    return self._fail({key: invalid[key]})
+            return value
+        # Lists: replace invalid elements in order, drop those still invalid
+        (item_schema,) = typing.get_args(schema)
+        fixes = fix if isinstance(fix, list) else []
+        fixes = [f for f in fixes if not validate(f, item_schema)]
+        merged = []
+        for index, item in enumerate(value):
+            if index not in invalid:
+                merged.append(item)
+            elif fixes:
+                merged.append(fixes.pop(0))
+            else:
+                self._count("dropped")
+        return merged
+
+    def _fail(self, invalid: Dict[Part, str]) -> Any:
+        self._count("failed")
+        raise OutputRepairError(
+            f"Invalid response after re-asking:\n{describe(invalid)}"
+        )
+
+    def summary(self) -> str:
+        repairs = ", ".join(
+            f"{event} {count}"
+            for event, count in sorted(self.counts.items())
+            if event != "parsed"
+        )
+        return (
+            f"Structured output: {self.counts['parsed']} responses, "
+            f"repairs: {repairs or 'none'}"
+        )
+
+
+structured_output = StructuredOutput()
@@ -1,10 +1,24 @@
 from blockagi.tools.duckduckgo import DDGSearchAnswerTool, DDGSearchLinksTool
 from blockagi.tools.google import GoogleSearchLinksTool
-from blockagi.tools.visitweb import VisitWebTool
+from blockagi.tools.meta_search import MetaSearchLinksTool
+from blockagi.tools.visitweb import VisitWebTool, PageCache
+from blockagi.tools.browser import BrowserPool
+from blockagi.tools.fetch import PageFetcher
+from blockagi.tools.prefetch import Prefetcher
+from blockagi.tools.search_cache import SearchCache
+from blockagi.tools.throttle import Throttle, throttle
 
 __all__ = [
     "DDGSearchAnswerTool",
     "DDGSearchLinksTool",
     "GoogleSearchLinksTool",
+    "MetaSearchLinksTool",
     "VisitWebTool",
+    "BrowserPool",
+    "PageFetcher",
+    "PageCache",
+    "Prefetcher",
+    "SearchCache",
+    "Throttle",
+    "throttle",
 ]
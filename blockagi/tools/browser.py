@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from playwright.async_api import (
+    async_playwright,
+    Browser,
+    BrowserContext,
+    Page,
+    Error as PlaywrightError,
+    TimeoutError as PlaywrightTimeoutError,
+)
+
+WAIT_STRATEGIES = ("commit", "domcontentloaded", "load", "networkidle")
+HEAVY_RESOURCE_TYPES = ("image", "media", "font")
+
+
+@dataclass
+class _Slot:
+    context: BrowserContext
+    page: Page
+    navigations: int = 0
+
+
+class BrowserPool:
+    """Long-lived headless Chromium shared by all VisitWeb calls.
+
+    The browser runs on its own event loop thread, so it can be warmed once at
+    server startup and used from any thread. Each of the `size` slots is a
+    reusable context+page, recycled after `max_navigations` or on crash.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_navigations: int = 50,
+        wait_until: str = "domcontentloaded",
+        timeout: float = 15.0,
+        block_resources: List[str] = HEAVY_RESOURCE_TYPES,
+    ):
+        if wait_until not in WAIT_STRATEGIES:
+            raise ValueError(
+                f"Invalid wait strategy {wait_until}; use one of {WAIT_STRATEGIES}"
+            )
+        self.size = size
+        self.max_navigations = max_navigations
+        self.wait_until = wait_until
+        self.timeout = timeout
+        self.block_resources = set(block_resources)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._playwright: Any = None
+        self._browser: Optional[Browser] = None
+        self._slots: Optional[asyncio.Queue] = None
+
+    # Lifecycle ==========================================
+
+    def start(self) -> None:
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="blockagi-browser", daemon=True
+            ).start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+            self._loop = loop
+
+    def close(self) -> None:
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    async def _start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch()
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            self._slots.put_nowait(await self._new_slot())
+
+    async def _close(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    async def _new_slot(self) -> _Slot:
+        if self._browser is None or not self._browser.is_connected():
+            self._browser = await self._playwright.chromium.launch()
+        context = await self._browser.new_context()
+        if self.block_resources:
+            await context.route("**/*", self._route)
+        page = await context.new_page()
+        return _Slot(context=context, page=page)
+
+    async def _recycle(self, slot: _Slot) -> _Slot:
+        try:
+            await slot.context.close()
+        except PlaywrightError:
+            pass  # Context already died with the browser
+        return await self._new_slot()
+
+    async def _route(self, route, request) -> None:
+        if request.resource_type in self.block_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    # Fetching ===========================================
+
+    def fetch(self, url: str) -> str:
+        """Return the rendered HTML of the url."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop).result()
+
+    async def afetch(self, url: str) -> str:
+        """Same as fetch(), awaitable from any other event loop."""
+        if self._loop is None:
+            await asyncio.to_thread(self.start)  # Launching Chromium blocks
+        future = asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def _fetch(self, url: str) -> str:
+        slot = await self._slots.get()
+        try:
+            try:
+                await slot.page.goto(
+                    url, wait_until=self.wait_until, timeout=self.timeout * 1000
+                )
+            except PlaywrightTimeoutError:
+                pass  # Use whatever has been rendered so far
+            html = await slot.page.content()
+            slot.navigations += 1
+            if slot.navigations >= self.max_navigations:
+                slot = await self._recycle(slot)
+            return html
+        except PlaywrightError:
+            slot = await self._recycle(slot)
+            raise
+        finally:
+            self._slots.put_nowait(slot)
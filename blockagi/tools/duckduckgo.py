@@ -1,15 +1,33 @@
+import asyncio
+import threading
 from itertools import islice
-from typing import Optional, Type
+from typing import Dict, List, Optional, Type
 
-from langchain.tools import DuckDuckGoSearchRun
 from langchain.tools import Tool
 from pydantic import BaseModel, Field
 from langchain.tools.base import BaseTool
 import json
 
 from blockagi.schema import BaseResourcePool
+from blockagi.tools.search_cache import SearchCache
+from blockagi.tools.throttle import throttle
 from duckduckgo_search import DDGS
 
+# Shared Client ======================================
+
+_ddgs: Optional[DDGS] = None
+_ddgs_lock = threading.Lock()
+
+
+def get_ddgs() -> DDGS:
+    """Return a long-lived DDGS client so connections are kept alive."""
+    global _ddgs
+    with _ddgs_lock:
+        if _ddgs is None:
+            _ddgs = DDGS()
+        return _ddgs
+
+
 # Search Answer Tool =================================
 
 
@@ -17,14 +35,63 @@ class SearchAnswerSchema(BaseModel):
     query: str = Field(title="QUESTION", description="A well formed question.")
 
 
-def DDGSearchAnswerTool():
+# Search parameters of LangChain's DuckDuckGoSearchRun: results of the past year
+ANSWER_PARAMS = dict(region="wt-wt", safesearch="moderate", timelimit="y")
+
+
+def _text(query: str, max_results: int, **params: str) -> List[Dict[str, str]]:
+    return list(islice(get_ddgs().text(query, **params) or [], max_results))
+
+
+def _answer(results: List[Dict[str, str]]) -> str:
+    if len(results) == 0:
+        return "No good DuckDuckGo Search Result was found"
+    return " ".join(r["body"] for r in results)
+
+
+def search_answer(query: str, max_results: int = 5) -> str:
+    # Same as LangChain's DuckDuckGoSearchRun, but with the shared client
+    return _answer(
+        throttle.call("duckduckgo", _text, query, max_results, **ANSWER_PARAMS)
+    )
+
+
+async def asearch_answer(query: str, max_results: int = 5) -> str:
+    # duckduckgo_search has no async client, so run it off the event loop
+    return _answer(
+        await throttle.acall(
+            "duckduckgo",
+            asyncio.to_thread,
+            _text,
+            query,
+            max_results,
+            **ANSWER_PARAMS,
+        )
+    )
+
+
+throttle.register_tool("DuckDuckGoSearchAnswer", "duckduckgo")
+
+
+def DDGSearchAnswerTool(search_cache: Optional[SearchCache] = None):
+    search_cache = search_cache or SearchCache()
+
     def searchAnswerDDG(query: str):
-        result = DuckDuckGoSearchRun().run(query)
+        result = search_cache.get_or_compute(
+            "DuckDuckGoSearchAnswer", query, lambda: search_answer(query)
+        )
+        return {"citation": f"DuckDuckGo Search Answer: {query}", "result": result}
+
+    async def asearchAnswerDDG(query: str):
+        result = await search_cache.aget_or_compute(
+            "DuckDuckGoSearchAnswer", query, lambda: asearch_answer(query)
+        )
         return {"citation": f"DuckDuckGo Search Answer: {query}", "result": result}
 
     return Tool.from_function(
         name="DuckDuckGoSearchAnswer",
         func=searchAnswerDDG,
+        coroutine=asearchAnswerDDG,
         description="Useful for when you need an answer to a QUESTION on current event over the internet using DuckDuckGo.",
         args_schema=SearchAnswerSchema,
     )
@@ -42,19 +109,63 @@ class SearchLinksSchema(BaseModel):
     )
 
 
+throttle.register_tool("DuckDuckGoSearchLinks", "duckduckgo")
+
+
 class DDGSearchLinksTool(BaseTool):
     name = "DuckDuckGoSearchLinks"
     description = "Useful for when you need more links to website that points to information about a TOPIC over the internet using DuckDuckGo."
     args_schema: Type[SearchLinksSchema] = SearchLinksSchema
     resource_pool: BaseResourcePool = None
+    search_cache: SearchCache = None
 
-    def __init__(self, resource_pool: BaseResourcePool):
+    def __init__(
+        self,
+        resource_pool: BaseResourcePool,
+        search_cache: Optional[SearchCache] = None,
+    ):
         super().__init__()
         self.resource_pool = resource_pool
+        self.search_cache = search_cache or SearchCache()
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, str]]:
+        return self.search_cache.get_or_compute(
+            self.name,
+            query,
+            lambda: throttle.call("duckduckgo", _text, query, limit),
+            limit=limit,
+        )
+
+    async def asearch(self, query: str, limit: int = 20) -> List[Dict[str, str]]:
+        return await self.search_cache.aget_or_compute(
+            self.name,
+            query,
+            lambda: throttle.acall(
+                "duckduckgo", asyncio.to_thread, _text, query, limit
+            ),
+            limit=limit,
+        )
+
+    def links(self, query: str, limit: int = 20) -> List[Dict[str, str]]:
+        """Return ranked results as title/link/snippet, without side effects."""
+        return self._links(self.search(query, limit))
+
+    async def alinks(self, query: str, limit: int = 20) -> List[Dict[str, str]]:
+        return self._links(await self.asearch(query, limit))
+
+    def _links(self, results: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return [
+            {"title": r["title"], "link": r["href"], "snippet": r["body"]}
+            for r in results
+        ]
 
     def _run(self, query: str, limit: int = 20):
-        ddg = DDGS()
-        results = list(islice(ddg.text(query), limit))
+        return self._output(query, self.search(query, limit))
+
+    async def _arun(self, query: str, limit: int = 20):
+        return self._output(query, await self.asearch(query, limit))
+
+    def _output(self, query: str, results: List[Dict[str, str]]):
         for result in results:
             self.resource_pool.add(
                 url=result["href"], description=result["title"], content=None
@@ -63,6 +174,3 @@ class DDGSearchLinksTool(BaseTool):
             "citation": f"DuckDuckGo Search Links: {query}",
             "result": json.dumps(results, indent=2),
         }
-
-    def _arun(self, query: str, limit: int = 20):
-        raise NotImplementedError("custom_search does not support async")
@@ -0,0 +1,183 @@
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from html2text import HTML2Text
+
+# Elements that never carry article content
+SKIP_TAGS = frozenset(
+    [
+        "script",
+        "style",
+        "noscript",
+        "template",
+        "svg",
+        "canvas",
+        "iframe",
+        "nav",
+        "aside",
+        "footer",
+        "form",
+        "button",
+        "select",
+        "dialog",
+    ]
+)
+# Elements without an end tag
+VOID_TAGS = frozenset(
+    [
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+    ]
+)
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|consent|gdpr|banner|navbar|navigation|menu|sidebar|footer|breadcrumb"
+    r"|share|social|subscribe|newsletter|signup|login|advert|sponsor|\bads?\b"
+    r"|promo|popup|modal|overlay|comment|related|recommend",
+    re.IGNORECASE,
+)
+MAIN_CONTENT_PATTERN = re.compile(
+    r"<(?:main|article)[\s>]|role=[\"']main[\"']", re.IGNORECASE
+)
+# Fall back to the whole page when the main content is suspiciously short
+MIN_MAIN_CONTENT_LENGTH = 500
+CHUNK_SIZE = 16384
+
+
+class BoilerplateFilter(HTMLParser):
+    """Streams HTML through, dropping navigation, ads, banners and scripts.
+
+    With `main_only`, only content inside <main>, <article> or role="main" is
+    kept. The cleaned HTML is collected in `output` for the caller to drain.
+    """
+
+    def __init__(self, main_only: bool = False):
+        super().__init__(convert_charrefs=False)
+        self.main_only = main_only
+        self.output: List[str] = []
+        self._stack: List[str] = []
+        self._skip_depth: Optional[int] = None
+        self._main_depth: Optional[int] = None
+
+    @property
+    def _emitting(self) -> bool:
+        return self._skip_depth is None and (
+            not self.main_only or self._main_depth is not None
+        )
+
+    def _is_boilerplate(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> bool:
+        if tag in SKIP_TAGS:
+            return True
+        if tag == "header" and self._main_depth is None:
+            return True
+        attrs = dict(attrs)
+        if "hidden" in attrs or attrs.get("aria-hidden") == "true":
+            return True
+        if "display:none" in (attrs.get("style") or "").replace(" ", ""):
+            return True
+        names = f"{attrs.get('id') or ''} {attrs.get('class') or ''}"
+        return tag not in ("body", "main", "article") and bool(
+            BOILERPLATE_PATTERN.search(names)
+        )
+
+    def _is_main(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> bool:
+        return tag in ("main", "article") or dict(attrs).get("role") == "main"
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if self._emitting:
+                self.output.append(self.get_starttag_text())
+            return
+        self._stack.append(tag)
+        if self._skip_depth is not None:
+            return
+        if self._is_boilerplate(tag, attrs):
+            self._skip_depth = len(self._stack)
+            return
+        if self._main_depth is None and self._is_main(tag, attrs):
+            self._main_depth = len(self._stack)
+        if self._emitting:
+            self.output.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        if self._emitting and not self._is_boilerplate(tag, attrs):
+            self.output.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return  # Stray end tag
+        # Pop until the matching start tag to recover from unclosed elements
+        while self._stack:
+            emitting = self._emitting
+            depth = len(self._stack)
+            popped = self._stack.pop()
+            if emitting:
+                self.output.append(f"</{popped}>")
+            if self._skip_depth == depth:
+                self._skip_depth = None
+            if self._main_depth == depth:
+                self._main_depth = None
+            if popped == tag:
+                break
+
+    def handle_data(self, data):
+        if self._emitting:
+            self.output.append(data)
+
+    def handle_entityref(self, name):
+        if self._emitting:
+            self.output.append(f"&{name};")
+
+    def handle_charref(self, name):
+        if self._emitting:
+            self.output.append(f"&#{name};")
+
+
+class _BudgetHTML2Text(HTML2Text):
+    def __init__(self):
+        super().__init__()
+        self.ignore_links = False
+        self.output_length = 0
+
+    def outtextf(self, s: str) -> None:
+        super().outtextf(s)
+        self.output_length += len(s)
+
+
+def _extract(html: str, max_length: int, main_only: bool) -> str:
+    converter = _BudgetHTML2Text()
+    converter.start = True
+    parser = BoilerplateFilter(main_only=main_only)
+    for offset in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[offset : offset + CHUNK_SIZE])
+        converter.feed("".join(parser.output))
+        parser.output.clear()
+        # Stop parsing as soon as the output budget is used up
+        if converter.output_length >= max_length:
+            break
+    else:
+        parser.close()
+        converter.feed("".join(parser.output))
+    converter.feed("")
+    return converter.optwrap(converter.finish())[:max_length]
+
+
+def extract_markdown(html: str, max_length: int = 20000) -> str:
+    """Convert the main content of an HTML page into at most max_length chars."""
+    if MAIN_CONTENT_PATTERN.search(html):
+        markdown = _extract(html, max_length, main_only=True)
+        if len(markdown.strip()) >= min(MIN_MAIN_CONTENT_LENGTH, max_length):
+            return markdown
+    return _extract(html, max_length, main_only=False)
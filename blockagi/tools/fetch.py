@@ -0,0 +1,263 @@
+import asyncio
+import io
+import json
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+from pypdf import PdfReader
+
+from blockagi.tools.browser import BrowserPool
+from blockagi.tools.extract import extract_markdown
+from blockagi.tools.throttle import RateLimitedError, parse_retry_after, throttle
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+)
+
+# Markers of client-side rendered pages whose HTML is only an empty shell
+SPA_SHELL_PATTERN = re.compile(
+    r'<div[^>]+id="(?:root|app|__next|__nuxt)"[^>]*>\s*</div>'
+    r"|<noscript>[^<]*(?:enable|requires?) javascript",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class FetchResult:
+    content: str
+    tier: str  # "http", "browser" or "error"
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+
+
+class PageFetcher:
+    """Fetch a page as text, using plain HTTP when possible.
+
+    Static pages, plain text, JSON and PDF are served by a pooled keep-alive
+    HTTP client. Headless Chromium is only used when the HTTP response fails
+    or looks like a JavaScript-rendered shell.
+    """
+
+    def __init__(
+        self,
+        browser_pool: Optional[BrowserPool] = None,
+        max_length: int = 20000,
+        min_content_length: int = 200,
+        max_bytes: int = 10_000_000,
+        timeout: float = 10.0,
+    ):
+        self.browser_pool = browser_pool or BrowserPool()
+        self.max_length = max_length
+        self.min_content_length = min_content_length
+        self.max_bytes = max_bytes
+        client_options = dict(
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        )
+        self.client = httpx.Client(**client_options)
+        self.async_client = httpx.AsyncClient(**client_options)
+        self.tier_counts = Counter()
+        self._lock = threading.Lock()
+
+    def fetch(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> FetchResult:
+        """Fetch the url; with validators, a 304 returns `not_modified`."""
+        # Rate limit per website so we don't hammer a single domain
+        domain = f"domain:{urlparse(url).netloc}"
+        try:
+            result = throttle.call(domain, self._fetch_http, url, etag, last_modified)
+        except httpx.TransportError:
+            result = None  # Backed off and recorded; the browser may still succeed
+        if result is None:
+            content = throttle.call(domain, self._fetch_browser, url)
+            result = FetchResult(content=content, tier="browser")
+        with self._lock:
+            self.tier_counts[result.tier] += 1
+        return result
+
+    async def afetch(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> FetchResult:
+        """Same as fetch(), without blocking the event loop."""
+        domain = f"domain:{urlparse(url).netloc}"
+        try:
+            result = await throttle.acall(
+                domain, self._afetch_http, url, etag, last_modified
+            )
+        except httpx.TransportError:
+            result = None
+        if result is None:
+            content = await throttle.acall(domain, self._afetch_browser, url)
+            result = FetchResult(content=content, tier="browser")
+        with self._lock:
+            self.tier_counts[result.tier] += 1
+        return result
+
+    def summary(self) -> str:
+        total = sum(self.tier_counts.values())
+        if total == 0:
+            return "VisitWeb: no pages fetched yet"
+        return (
+            f"VisitWeb: {total} pages fetched, "
+            f"{self.tier_counts['http']} over plain HTTP "
+            f"({self.tier_counts['http'] / total:.0%}), "
+            f"{self.tier_counts['browser']} with the browser"
+        )
+
+    # Tiers ==============================================
+
+    def _fetch_browser(self, url: str) -> str:
+        html = self.browser_pool.fetch(url)
+        return extract_markdown(html, self.max_length)
+
+    async def _afetch_browser(self, url: str) -> str:
+        html = await self.browser_pool.afetch(url)
+        return await asyncio.to_thread(extract_markdown, html, self.max_length)
+
+    def _fetch_http(
+        self, url: str, etag: Optional[str], last_modified: Optional[str]
+    ) -> Optional[FetchResult]:
+        """Return the page content, or None to escalate to the browser."""
+        headers = self._conditional_headers(etag, last_modified)
+        try:
+            with self.client.stream("GET", url, headers=headers) as response:
+                if self._is_error(url, response):
+                    return None
+                if response.status_code == 304:
+                    return FetchResult(content="", tier="http", not_modified=True)
+                body = self._read(response)
+        except httpx.TransportError:
+            raise  # Timeouts and resets are retried and counted by the throttle
+        except httpx.HTTPError:
+            return None
+        return self._result(response, body)
+
+    async def _afetch_http(
+        self, url: str, etag: Optional[str], last_modified: Optional[str]
+    ) -> Optional[FetchResult]:
+        headers = self._conditional_headers(etag, last_modified)
+        try:
+            async with self.async_client.stream(
+                "GET", url, headers=headers
+            ) as response:
+                if self._is_error(url, response):
+                    return None
+                if response.status_code == 304:
+                    return FetchResult(content="", tier="http", not_modified=True)
+                body = await self._aread(response)
+        except httpx.TransportError:
+            raise  # Timeouts and resets are retried and counted by the throttle
+        except httpx.HTTPError:
+            return None
+        # Parsing large pages is CPU bound
+        return await asyncio.to_thread(self._result, response, body)
+
+    def _conditional_headers(
+        self, etag: Optional[str], last_modified: Optional[str]
+    ) -> Dict[str, str]:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def _is_error(self, url: str, response: httpx.Response) -> bool:
+        if response.status_code in (429, 503):
+            raise RateLimitedError(
+                f"{url} responded with {response.status_code}",
+                parse_retry_after(response.headers.get("retry-after")),
+            )
+        return response.status_code >= 400
+
+    def _result(self, response: httpx.Response, body: bytes) -> Optional[FetchResult]:
+        content_type = response.headers.get("content-type", "").lower()
+        content = self._convert(body, content_type, response.encoding or "utf-8")
+        if content is None:
+            return None
+        return FetchResult(
+            content=content,
+            tier="http",
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+        )
+
+    def _read(self, response: httpx.Response) -> bytes:
+        chunks = []
+        size = 0
+        for chunk in response.iter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                break
+        return b"".join(chunks)
+
+    async def _aread(self, response: httpx.Response) -> bytes:
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                break
+        return b"".join(chunks)
+
+    def _convert(self, body: bytes, content_type: str, encoding: str) -> Optional[str]:
+        if self._is_pdf(body, content_type):
+            return self._convert_pdf(body)
+
+        head = body[:1024].lstrip()
+        text = body.decode(encoding, errors="replace")
+        if "json" in content_type:
+            try:
+                return json.dumps(json.loads(text), indent=2)[: self.max_length]
+            except ValueError:
+                return text[: self.max_length]
+        if content_type.startswith("text/plain") or "markdown" in content_type:
+            return text[: self.max_length]
+        if "html" in content_type or head.startswith(b"<"):
+            content = extract_markdown(text, self.max_length)
+            if self._looks_js_rendered(text, content):
+                return None
+            return content
+        return None  # Unknown content type, let the browser handle it
+
+    def _is_pdf(self, body: bytes, content_type: str) -> bool:
+        head = body[:1024].lstrip()
+        return "application/pdf" in content_type or head.startswith(b"%PDF")
+
+    def _convert_pdf(self, body: bytes) -> str:
+        reader = PdfReader(io.BytesIO(body))
+        pages = []
+        length = 0
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            pages.append(text)
+            length += len(text)
+            if length >= self.max_length:
+                break
+        return "\n\n".join(pages)[: self.max_length]
+
+    def _looks_js_rendered(self, html: str, content: str) -> bool:
+        if len(content.strip()) < self.min_content_length:
+            return True
+        return (
+            len(content.strip()) < 2 * self.min_content_length
+            and SPA_SHELL_PATTERN.search(html) is not None
+        )
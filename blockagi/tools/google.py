@@ -1,12 +1,35 @@
 import json
 import os
+import threading
+
+import httpx
 from langchain.tools.base import BaseTool
 from pydantic import BaseModel, Field
-from typing import Optional, Type
+from typing import Dict, List, Optional, Type
 
 from blockagi.schema import BaseResourcePool
+from blockagi.tools.search_cache import SearchCache
+from blockagi.tools.throttle import throttle
 from googleapiclient.discovery import build
 
+CUSTOM_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+
+# googleapiclient services are not thread-safe, so keep one per thread
+_local = threading.local()
+
+
+def get_service(api_key: str):
+    """Return a long-lived Custom Search service for the current thread."""
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+    if api_key not in services:
+        services[api_key] = build("customsearch", "v1", developerKey=api_key)
+    return services[api_key]
+
+
+throttle.register_tool("GoogleSearchLinks", "google")
+
 
 class GoogleLinksSchema(BaseModel):
     query: str = Field(
@@ -22,36 +45,87 @@ class GoogleSearchLinksTool(BaseTool):
     description = "Useful for when you need more links to website that points to information about a TOPIC over the internet using Google."
     args_schema: Type[GoogleLinksSchema] = GoogleLinksSchema
     resource_pool: BaseResourcePool = None
+    search_cache: SearchCache = None
+    client: httpx.AsyncClient = None
 
-    def __init__(self, resource_pool: BaseResourcePool):
+    def __init__(
+        self,
+        resource_pool: BaseResourcePool,
+        search_cache: Optional[SearchCache] = None,
+    ):
         super().__init__()
         self.resource_pool = resource_pool
+        self.search_cache = search_cache or SearchCache()
+        self.client = httpx.AsyncClient(timeout=10.0)
 
-    def _run(self, query: str, limit: int = 10):
+    def links(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Return ranked results as title/link/snippet, without side effects."""
+        self._check_credentials()
+        # Custom Search returns at most 10 results per request
+        limit = min(limit, 10)
+        result = self.search_cache.get_or_compute(
+            self.name,
+            query,
+            lambda: throttle.call(
+                "google",
+                lambda: get_service(os.getenv("GOOGLE_API_KEY"))
+                .cse()
+                .list(q=query, cx=os.getenv("GOOGLE_CSE_ID"), num=limit)
+                .execute(),
+            ),
+            limit=limit,
+        )
+        return self._links(result)
+
+    async def alinks(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        self._check_credentials()
+        limit = min(limit, 10)
+        result = await self.search_cache.aget_or_compute(
+            self.name,
+            query,
+            lambda: throttle.acall("google", self._alist, query, limit),
+            limit=limit,
+        )
+        return self._links(result)
+
+    async def _alist(self, query: str, limit: int) -> Dict:
+        # Same request as the client library makes, over async HTTP
+        response = await self.client.get(
+            CUSTOM_SEARCH_URL,
+            params={
+                "key": os.getenv("GOOGLE_API_KEY"),
+                "cx": os.getenv("GOOGLE_CSE_ID"),
+                "q": query,
+                "num": limit,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _check_credentials(self) -> None:
         if not os.getenv("GOOGLE_API_KEY") or not os.getenv("GOOGLE_CSE_ID"):
             raise ValueError("Cannot use Google; No GOOGLE_API_KEY and GOOGLE_CSE_ID")
-        service = build("customsearch", "v1", developerKey=os.getenv("GOOGLE_API_KEY"))
-        result = (
-            service.cse()
-            .list(q=query, cx=os.getenv("GOOGLE_CSE_ID"), num=limit)
-            .execute()
-        )
-        for e in result["items"]:
+
+    def _links(self, result: Dict) -> List[Dict[str, str]]:
+        return [
+            {
+                "title": e["title"],
+                "link": e["link"],
+                "snippet": e.get("snippet", ""),
+            }
+            for e in result.get("items", [])
+        ]
+
+    def _run(self, query: str, limit: int = 10):
+        return self._output(query, self.links(query, limit))
+
+    async def _arun(self, query: str, limit: int = 10):
+        return self._output(query, await self.alinks(query, limit))
+
+    def _output(self, query: str, links: List[Dict[str, str]]):
+        for e in links:
             self.resource_pool.add(url=e["link"], description=e["title"], content=None)
         return {
             "citation": f"Google Search Links: {query}",
-            "result": json.dumps(
-                [
-                    {
-                        "title": e["title"],
-                        "link": e["link"],
-                        "snippet": e["snippet"],
-                    }
-                    for e in result["items"]
-                ],
-                indent=2,
-            ),
+            "result": json.dumps(links, indent=2),
         }
-
-    def _arun(self, query: str, limit: int = 10):
-        raise NotImplementedError("custom_search does not support async")
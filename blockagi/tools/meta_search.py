@@ -0,0 +1,116 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Type
+
+from langchain.tools.base import BaseTool
+from pydantic import BaseModel, Field
+
+from blockagi.resource_pool import normalize_url
+from blockagi.schema import BaseResourcePool, Resource
+from blockagi.tools.throttle import throttle
+
+# Constant of reciprocal rank fusion; dampens the weight of top ranks
+RRF_K = 60
+
+
+class MetaSearchLinksSchema(BaseModel):
+    query: str = Field(
+        title="TOPIC", description="any topic you want find relevant links."
+    )
+    limit: Optional[int] = Field(
+        title="NUMBER", description="amount of links you want", default=20
+    )
+
+
+def fuse_rankings(rankings: Dict[str, List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+    """Merge ranked title/link/snippet lists with reciprocal rank fusion."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for backend, links in rankings.items():
+        for rank, link in enumerate(links):
+            url = normalize_url(link["link"])
+            entry = merged.setdefault(
+                url, {**link, "link": url, "score": 0.0, "sources": []}
+            )
+            entry["score"] += 1 / (RRF_K + rank + 1)
+            if backend not in entry["sources"]:
+                entry["sources"].append(backend)
+    return sorted(merged.values(), key=lambda e: e["score"], reverse=True)
+
+
+class MetaSearchLinksTool(BaseTool):
+    name = "WebSearchLinks"
+    description = "Useful for when you need more links to website that points to information about a TOPIC over the internet using all available search engines at once."
+    args_schema: Type[MetaSearchLinksSchema] = MetaSearchLinksSchema
+    resource_pool: BaseResourcePool = None
+    backends: List[BaseTool] = []
+    executor: ThreadPoolExecutor = None
+
+    def __init__(self, resource_pool: BaseResourcePool, backends: List[BaseTool]):
+        super().__init__()
+        self.resource_pool = resource_pool
+        # Each backend must provide `links(query, limit)`
+        self.backends = backends
+        # Available to the planner as long as any search engine is up
+        throttle.register_tool(
+            self.name, *[b for tool in backends for b in throttle.backends(tool.name)]
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(backends), thread_name_prefix="blockagi-search"
+        )
+
+    def _run(self, query: str, limit: int = 20):
+        futures = {
+            backend.name: self.executor.submit(backend.links, query, limit)
+            for backend in self.backends
+        }
+        outcomes = {}
+        for name, future in futures.items():
+            try:
+                outcomes[name] = future.result()
+            except Exception as e:
+                outcomes[name] = e
+        return self._output(query, limit, outcomes)
+
+    async def _arun(self, query: str, limit: int = 20):
+        # Each backend must also provide `alinks(query, limit)`
+        results = await asyncio.gather(
+            *[backend.alinks(query, limit) for backend in self.backends],
+            return_exceptions=True,
+        )
+        outcomes = {b.name: r for b, r in zip(self.backends, results)}
+        return self._output(query, limit, outcomes)
+
+    def _output(self, query: str, limit: int, outcomes: Dict[str, Any]):
+        rankings = {}
+        errors = []
+        for name, outcome in outcomes.items():
+            if isinstance(outcome, Exception):
+                errors.append(f"{name}: {outcome}")
+            else:
+                rankings[name] = outcome
+        if len(rankings) == 0:
+            raise ValueError(f"All search engines failed; {'; '.join(errors)}")
+
+        results = fuse_rankings(rankings)[:limit]
+        self.resource_pool.add_many(
+            [
+                Resource(url=r["link"], description=r["title"], visited=False)
+                for r in results
+            ]
+        )
+        return {
+            "citation": f"Web Search Links: {query}",
+            "result": json.dumps(
+                [
+                    {
+                        "title": r["title"],
+                        "link": r["link"],
+                        "snippet": r["snippet"],
+                        "sources": r["sources"],
+                    }
+                    for r in results
+                ],
+                indent=2,
+            ),
+        }
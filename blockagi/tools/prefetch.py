@@ -0,0 +1,117 @@
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+
+from blockagi.resource_pool import normalize_url
+from blockagi.resource_ranker import ResourceRanker
+from blockagi.schema import Resource
+from blockagi.tools.fetch import FetchResult
+
+
+class Prefetcher:
+    """Fetches promising unvisited resources in the background.
+
+    Listens to resources added to the RESOURCE POOL and, with at most
+    `max_workers` fetches in flight, fetches the pending resource that ranks
+    highest against the planner's latest query. VisitWeb then picks up the
+    already extracted content with `take`.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], FetchResult],
+        ranker: Optional[ResourceRanker] = None,
+        max_workers: int = 2,
+        max_pending: int = 20,
+        max_ready: int = 50,
+    ):
+        self.fetch = fetch
+        self.ranker = ranker or ResourceRanker()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_ready = max_ready
+        self.counts = Counter()
+        # Reentrant: done callbacks run inline when a future is already finished
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="blockagi-prefetch"
+        )
+        self._pending: Dict[str, Resource] = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._ready: Dict[str, FetchResult] = OrderedDict()
+        self._claimed: Set[str] = set()
+
+    def on_resource_added(self, resource: Resource) -> None:
+        if resource.visited:
+            return
+        with self._lock:
+            self._pending[resource.url] = resource
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+            self._dispatch()
+
+    def take(self, url: str) -> Optional[FetchResult]:
+        """Return prefetched content for url, waiting if it is being fetched."""
+        url = normalize_url(url)
+        with self._lock:
+            self._pending.pop(url, None)
+            result = self._ready.pop(url, None)
+            future = self._inflight.get(url)
+            if result is not None:
+                self.counts["hit"] += 1
+            elif future is None:
+                self.counts["miss"] += 1
+            else:
+                self._claimed.add(url)
+        if result is None and future is not None:
+            try:
+                result = future.result()
+                if result.tier == "error":
+                    result = None
+            except Exception:
+                result = None
+            with self._lock:
+                self.counts["hit" if result is not None else "miss"] += 1
+        return result
+
+    def summary(self) -> str:
+        with self._lock:
+            counts = Counter(self.counts)
+            ready, pending = len(self._ready), len(self._pending)
+        visits = counts["hit"] + counts["miss"]
+        ratio = counts["hit"] / visits if visits else 0
+        # Pages fetched but not visited (yet) count as wasted too
+        wasted = counts["evicted"] + ready
+        return (
+            f"Prefetch: {counts['hit']}/{visits} visits served ({ratio:.0%}), "
+            f"{counts['fetched']} fetched, {wasted} wasted "
+            f"({counts['evicted']} evicted, {ready} not visited), "
+            f"{pending} pending"
+        )
+
+    def _dispatch(self) -> None:
+        # Called with the lock held
+        while self._pending and len(self._inflight) < self.max_workers:
+            candidates = list(self._pending.values())
+            scores = self.ranker.score(candidates, self.ranker.query)
+            resource = candidates[int(scores.argmax())]
+            del self._pending[resource.url]
+            future = self._executor.submit(self.fetch, resource.url)
+            self._inflight[resource.url] = future
+            future.add_done_callback(
+                lambda future, url=resource.url: self._on_done(url, future)
+            )
+
+    def _on_done(self, url: str, future: Future) -> None:
+        with self._lock:
+            del self._inflight[url]
+            self.counts["fetched"] += 1
+            if url in self._claimed:
+                self._claimed.discard(url)  # Already handed over by `take`
+            elif future.exception() is None and future.result().tier != "error":
+                self._ready[url] = future.result()
+                while len(self._ready) > self.max_ready:
+                    self._ready.popitem(last=False)
+                    self.counts["evicted"] += 1
+            self._dispatch()
@@ -0,0 +1,131 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    # "What is Neutron?" and "what is  neutron" should hit the same entry
+    query = PUNCTUATION_PATTERN.sub(" ", query.lower())
+    return WHITESPACE_PATTERN.sub(" ", query).strip()
+
+
+class SearchCache:
+    """LRU cache of search results keyed by backend and normalized query.
+
+    Entries expire after `ttl` seconds. With `path`, entries are also
+    persisted to SQLite so they survive across runs.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, ttl: float = 3600, max_entries: int = 1024
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                "  key TEXT PRIMARY KEY,"
+                "  value TEXT NOT NULL,"
+                "  created_at REAL NOT NULL"
+                ")"
+            )
+            self._conn.execute(
+                "DELETE FROM searches WHERE created_at < ?", (time.time() - ttl,)
+            )
+            self._conn.commit()
+
+    def get_or_compute(
+        self, backend: str, query: str, compute: Callable[[], Any], **params: Any
+    ) -> Any:
+        """Return the cached result, calling compute() on a miss.
+
+        Results must be JSON serializable.
+        """
+        key = self._key(backend, query, params)
+        value = self._get(key)
+        self._count("hit" if value is not None else "miss")
+        if value is not None:
+            return value
+        value = compute()
+        self._set(key, value)
+        return value
+
+    async def aget_or_compute(
+        self,
+        backend: str,
+        query: str,
+        compute: Callable[[], Awaitable[Any]],
+        **params: Any,
+    ) -> Any:
+        """Same as get_or_compute(), awaiting compute() on a miss."""
+        key = self._key(backend, query, params)
+        value = self._get(key)
+        self._count("hit" if value is not None else "miss")
+        if value is not None:
+            return value
+        value = await compute()
+        self._set(key, value)
+        return value
+
+    def summary(self) -> str:
+        with self._lock:
+            hits, misses = self.counts["hit"], self.counts["miss"]
+        total = hits + misses
+        if total == 0:
+            return "Search cache: no lookups yet"
+        return f"Search cache: {hits}/{total} hits ({hits / total:.0%})"
+
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self.counts[event] += 1
+
+    @staticmethod
+    def _key(backend: str, query: str, params: Dict[str, Any]) -> str:
+        return json.dumps([backend, normalize_query(query), params], sort_keys=True)
+
+    def _get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created_at, value FROM searches WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._entries[key] = entry
+            if entry is None:
+                return None
+            created_at, value = entry
+            if now - created_at >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO searches (key, value, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now),
+                )
+                self._conn.commit()
@@ -0,0 +1,260 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import httpx
+
+
+class RateLimitedError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    resp = getattr(exc, "resp", None)  # googleapiclient.errors.HttpError
+    return getattr(resp, "status", None)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    if isinstance(exc, RateLimitedError):
+        return exc.retry_after
+    if isinstance(exc, httpx.HTTPStatusError):
+        return parse_retry_after(exc.response.headers.get("retry-after"))
+    resp = getattr(exc, "resp", None)
+    if resp is not None and hasattr(resp, "get"):
+        return parse_retry_after(resp.get("retry-after"))
+    return None
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, (RateLimitedError, httpx.TransportError, TimeoutError)):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    # DDGS raises a bare HTTPError when DuckDuckGo throttles us
+    return isinstance(exc, (httpx.HTTPError, ConnectionError))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while (wait := self._take()) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+    def _take(self) -> float:
+        """Take a token, or return how long to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all callers, e.g. to honor Retry-After."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 120):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return (
+            self.opened_at is not None
+            and time.monotonic() - self.opened_at < self.reset_timeout
+        )
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.is_open or self._trial:
+                return False
+            self._trial = True  # Half-open: let a single call through
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class Throttle:
+    """Rate limiting, retries and circuit breaking for tool backends.
+
+    Every backend (e.g. "duckduckgo", "google" or "domain:example.com") gets a
+    token bucket and a circuit breaker. Transient failures are retried with
+    jittered exponential backoff, honoring Retry-After. Tools registered for a
+    backend are hidden from the planner while all their backends are open.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 2,
+        max_retries: int = 2,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        failure_threshold: int = 3,
+        reset_timeout: float = 120,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._limits: Dict[str, tuple] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._tools: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, backend: str, rate: float, burst: int) -> None:
+        with self._lock:
+            self._limits[backend] = (rate, burst)
+            self._buckets.pop(backend, None)
+
+    def register_tool(self, tool_name: str, *backends: str) -> None:
+        with self._lock:
+            self._tools.setdefault(tool_name, set()).update(backends)
+
+    def backends(self, tool_name: str) -> Set[str]:
+        return set(self._tools.get(tool_name, ()))
+
+    def is_available(self, tool_name: str) -> bool:
+        backends = self._tools.get(tool_name)
+        if not backends:
+            return True
+        return any(not self._breaker(b).is_open for b in backends)
+
+    def call(self, backend: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        breaker = self._allow(backend)
+        bucket = self._bucket(backend)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._on_error(e, attempt, breaker, bucket))
+                continue
+            breaker.record_success()
+            return result
+
+    async def acall(
+        self, backend: str, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> Any:
+        """Same as call(), for coroutine functions."""
+        breaker = self._allow(backend)
+        bucket = self._bucket(backend)
+        for attempt in range(self.max_retries + 1):
+            await bucket.aacquire()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._on_error(e, attempt, breaker, bucket))
+                continue
+            breaker.record_success()
+            return result
+
+    def _allow(self, backend: str) -> CircuitBreaker:
+        breaker = self._breaker(backend)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{backend} is temporarily disabled after errors")
+        return breaker
+
+    def _on_error(
+        self, e: Exception, attempt: int, breaker: CircuitBreaker, bucket: TokenBucket
+    ) -> float:
+        """Re-raise `e` unless it should be retried; return the backoff."""
+        if not is_transient(e):
+            # The backend is up; the request itself is at fault
+            breaker.record_success()
+            raise e
+        if attempt == self.max_retries:
+            breaker.record_failure()
+            raise e
+        retry_after = _retry_after(e)
+        if retry_after is not None:
+            # Everyone waits for the backend; acquire() does the sleeping
+            bucket.pause(min(retry_after, self.max_backoff))
+            return 0
+        wait = min(self.backoff * 2**attempt, self.max_backoff)
+        return random.uniform(wait / 2, wait)  # Jitter
+
+    def _bucket(self, backend: str) -> TokenBucket:
+        with self._lock:
+            if backend not in self._buckets:
+                rate, burst = self._limits.get(backend, (self.rate, self.burst))
+                self._buckets[backend] = TokenBucket(rate, burst)
+            return self._buckets[backend]
+
+    def _breaker(self, backend: str) -> CircuitBreaker:
+        with self._lock:
+            if backend not in self._breakers:
+                self._breakers[backend] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return self._breakers[backend]
+
+
+# Shared by all tools so limits apply across tools using the same backend
+throttle = Throttle()
+throttle.configure("duckduckgo", rate=0.5, burst=2)
+throttle.configure("google", rate=1.0, burst=5)
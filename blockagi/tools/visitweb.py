@@ -1,33 +1,217 @@
-from playwright.sync_api import sync_playwright
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Optional, Tuple
 from pydantic import BaseModel, Field
-from html2text import HTML2Text
+from blockagi.resource_pool import normalize_url
 from blockagi.schema import BaseResourcePool
+from blockagi.tools.fetch import FetchResult, PageFetcher
+from blockagi.tools.prefetch import Prefetcher
 
 
-def extract_data(url: str) -> str:
-    try:
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch()
-            context = browser.new_context()
-            page = context.new_page()
+class PageCache:
+    """On-disk cache of extracted pages keyed by normalized URL.
+
+    Entries younger than `ttl` seconds are served directly. Older entries are
+    revalidated with a conditional request (ETag/Last-Modified). The least
+    recently used entries are evicted once the cache exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, max_bytes: int = 500_000_000):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "  url TEXT PRIMARY KEY,"
+            "  content BLOB NOT NULL,"
+            "  size INTEGER NOT NULL,"
+            "  etag TEXT,"
+            "  last_modified TEXT,"
+            "  fetched_at REAL NOT NULL,"
+            "  accessed_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)"
+        )
+        self._conn.commit()
+        # Running total of stored bytes, so puts don't scan the whole table
+        (self._total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()
+
+    def fetch(self, url: str, fetcher: PageFetcher) -> FetchResult:
+        key = normalize_url(url)
+        entry = self._lookup(key)
+        if entry is None:
+            return self._store(key, fetcher.fetch(url))
+        content, etag, last_modified, fresh = entry
+        if fresh:
+            return self._hit(key, content)
+        if not (etag or last_modified):
+            return self._store(key, fetcher.fetch(url))
+        try:
+            result = fetcher.fetch(url, etag=etag, last_modified=last_modified)
+        except Exception:
+            return self._stale(content)
+        return self._revalidated(key, content, result)
+
+    async def afetch(self, url: str, fetcher: PageFetcher) -> FetchResult:
+        """Same as fetch(), fetching with `fetcher.afetch`."""
+        key = normalize_url(url)
+        entry = self._lookup(key)
+        if entry is None:
+            return self._store(key, await fetcher.afetch(url))
+        content, etag, last_modified, fresh = entry
+        if fresh:
+            return self._hit(key, content)
+        if not (etag or last_modified):
+            return self._store(key, await fetcher.afetch(url))
+        try:
+            result = await fetcher.afetch(url, etag=etag, last_modified=last_modified)
+        except Exception:
+            return self._stale(content)
+        return self._revalidated(key, content, result)
+
+    def summary(self) -> str:
+        hits = self.counts["hit"] + self.counts["revalidated"]
+        total = hits + self.counts["miss"]
+        if total == 0:
+            return "Page cache: no lookups yet"
+        return (
+            f"Page cache: {hits}/{total} hits ({hits / total:.0%}), "
+            f"{self.counts['revalidated']} revalidated, "
+            f"{self.counts['evicted']} evicted"
+        )
+
+    def _lookup(self, key: str) -> Optional[Tuple[str, str, str, bool]]:
+        """Return (content, etag, last_modified, fresh) of a cached page."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, etag, last_modified, fetched_at FROM pages "
+                "WHERE url = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        content, etag, last_modified, fetched_at = row
+        content = zlib.decompress(content).decode("utf-8")
+        return content, etag, last_modified, time.time() - fetched_at < self.ttl
+
+    def _hit(self, key: str, content: str) -> FetchResult:
+        self._touch(key, refreshed=False)
+        self._count("hit")
+        return FetchResult(content=content, tier="cache")
+
+    def _stale(self, content: str) -> FetchResult:
+        # Serve the stale copy rather than nothing
+        self._count("stale")
+        return FetchResult(content=content, tier="cache (stale)")
+
+    def _revalidated(self, key: str, content: str, result: FetchResult) -> FetchResult:
+        if not result.not_modified:
+            return self._store(key, result)
+        self._touch(key, refreshed=True)
+        self._count("revalidated")
+        return FetchResult(content=content, tier="cache (revalidated)")
+
+    def _store(self, key: str, result: FetchResult) -> FetchResult:
+        self._count("miss")
+        self._put(key, result)
+        return result
+
+    def _count(self, event: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[event] += amount
 
-            page.goto(url)
+    def _touch(self, key: str, refreshed: bool) -> None:
+        now = time.time()
+        with self._lock:
+            if refreshed:
+                self._conn.execute(
+                    "UPDATE pages SET accessed_at = ?, fetched_at = ? WHERE url = ?",
+                    (now, now, key),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE pages SET accessed_at = ? WHERE url = ?", (now, key)
+                )
+            self._conn.commit()
 
-            # Get page content
-            page_content = page.content()
-            browser.close()
+    def _put(self, key: str, result: FetchResult) -> None:
+        if result.tier == "error":
+            return
+        content = zlib.compress(result.content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT size FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(url, content, size, etag, last_modified, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    content,
+                    len(content),
+                    result.etag,
+                    result.last_modified,
+                    now,
+                    now,
+                ),
+            )
+            self._total += len(content) - (replaced[0] if replaced else 0)
+            evicted = self._evict()
+            self._conn.commit()
+        if evicted:
+            self._count("evicted", evicted)
 
-            # Convert HTML to Markdown
-            h = HTML2Text()
-            h.ignore_links = False
+    def _evict(self) -> int:
+        evicted = 0
+        if self._total <= self.max_bytes:
+            return evicted
+        rows = self._conn.execute("SELECT url, size FROM pages ORDER BY accessed_at")
+        for url, size in rows.fetchall():
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._total -= size
+            evicted += 1
+        return evicted
 
-            content_markdown = h.handle(page_content)
 
-            # Serialize everything into a JSON string
-            # Limit the size of the string to 20,000 characters
-            return content_markdown[:20000]
+def extract_data(
+    url: str, fetcher: PageFetcher, cache: Optional[PageCache] = None
+) -> FetchResult:
+    try:
+        # Get page content as markdown, limited to 20,000 characters
+        if cache is not None:
+            return cache.fetch(url, fetcher)
+        return fetcher.fetch(url)
+    except Exception as e:
+        return FetchResult(
+            content="Error: Could not extract data from website.", tier="error"
+        )
+
+
+async def aextract_data(
+    url: str, fetcher: PageFetcher, cache: Optional[PageCache] = None
+) -> FetchResult:
+    try:
+        if cache is not None:
+            return await cache.afetch(url, fetcher)
+        return await fetcher.afetch(url)
     except Exception as e:
-        return "Error: Could not extract data from website."
+        return FetchResult(
+            content="Error: Could not extract data from website.", tier="error"
+        )
 
 
 from langchain.tools import Tool
@@ -39,18 +223,62 @@ class VisitWebSchema(BaseModel):
     url: str = Field(title="URL", description="A url in RESOURCE POOL.")
 
 
-def VisitWebTool(resource_pool: BaseResourcePool):
-    def func(url: str) -> str:
+def VisitWebTool(
+    resource_pool: BaseResourcePool,
+    fetcher: Optional[PageFetcher] = None,
+    cache: Optional[PageCache] = None,
+    prefetcher: Optional[Prefetcher] = None,
+):
+    # The browser is launched lazily on first use unless a warmed pool is given
+    fetcher = fetcher or PageFetcher()
+
+    def stored(url: str):
         resource = resource_pool.find(url)
         if resource is None:
             raise ValueError(f"URL {url} not found in RESOURCE POOL.")
-        content = extract_data(url)
-        resource_pool.visit(url, content)
-        return {"citation": f"[{resource.description}]({url})", "result": content}
+        # Reuse content of an already visited page (e.g. from a persisted pool)
+        content = resource_pool.get_content(url) if resource.visited else None
+        return resource, content
+
+    def visited(url: str, resource, fetched: FetchResult, source: str):
+        # Mark failed visits without storing the error, so a later visit retries
+        failed = fetched.tier == "error"
+        resource_pool.visit(url, None if failed else fetched.content)
+        return output(url, resource, fetched.content, source)
+
+    def output(url: str, resource, content: str, source: str):
+        return {
+            "citation": f"[{resource.description}]({url})",
+            "result": content,
+            "source": source,
+        }
+
+    def func(url: str) -> str:
+        resource, content = stored(url)
+        if content is not None:
+            # Already stored as visited; no need to write it again
+            return output(url, resource, content, "resource pool")
+        fetched = prefetcher.take(url) if prefetcher else None
+        if fetched is not None:
+            return visited(url, resource, fetched, f"prefetch ({fetched.tier})")
+        fetched = extract_data(url, fetcher, cache)
+        return visited(url, resource, fetched, fetched.tier)
+
+    async def coroutine(url: str) -> str:
+        resource, content = stored(url)
+        if content is not None:
+            return output(url, resource, content, "resource pool")
+        # Prefetches run on threads; take() may wait for one in flight
+        fetched = await asyncio.to_thread(prefetcher.take, url) if prefetcher else None
+        if fetched is not None:
+            return visited(url, resource, fetched, f"prefetch ({fetched.tier})")
+        fetched = await aextract_data(url, fetcher, cache)
+        return visited(url, resource, fetched, fetched.tier)
 
     return Tool.from_function(
         name="VisitWeb",
         func=func,
+        coroutine=coroutine,
         description="Useful for when you need to visit a website in the RESOURCE POOL and extract information from it.",
         args_schema=VisitWebSchema,
     )
@@ -3,6 +3,7 @@ from blockagi.utils.format_data import (
     to_simple,
     format_objectives,
     format_resources,
+    format_executed_tasks,
 )
 from blockagi.utils.pretty_prompt import pretty_prompt
 from blockagi.utils.format_tools import format_tools
@@ -13,5 +14,6 @@ __all__ = [
     "to_simple",
     "format_objectives",
     "format_resources",
+    "format_executed_tasks",
     "format_tools",
 ]
@@ -1,7 +1,7 @@
 import json
 import dataclasses
 from typing import Any, List
-from blockagi.schema import Objective, Resource
+from blockagi.schema import Objective, Resource, ResearchTask
 
 
 def format_objectives(objectives: List[Objective]) -> str:
@@ -23,6 +23,13 @@ def format_resources(resources: List[Resource]) -> str:
     return "\n".join([f"- {r.url} ({r.description})" for r in resources])
 
 
+def format_executed_tasks(tasks: List[ResearchTask]) -> str:
+    if len(tasks) == 0:
+        return "- None"
+
+    return "\n".join([f"- {t.tool} {json.dumps(t.args)}" for t in tasks])
+
+
 def to_json_str(data: Any) -> str:
     return json.dumps(to_simple(data), indent=2)
 
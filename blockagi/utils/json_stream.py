@@ -0,0 +1,59 @@
+import json
+from typing import Any, List
+
+
+class JSONArrayStream:
+    """Incrementally parse a streamed JSON array of objects.
+
+    `feed()` takes the next piece of text and returns the objects of the
+    top-level array that were completed by it. Anything before the opening
+    `[` (e.g. a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._start = None  # Offset where the current element started
+        self._done = False
+
+    def feed(self, text: str) -> List[Any]:
+        self.buffer += text
+        items = []
+        while self._position < len(self.buffer) and not self._done:
+            char = self.buffer[self._position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if char == "[":
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+                if self._depth == 2 and char == "{":
+                    self._start = self._position
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._start is not None:
+                    item = self._parse(self.buffer[self._start : self._position + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._start = None
+                elif self._depth == 0:
+                    self._done = True
+            self._position += 1
+        return items
+
+    def _parse(self, text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None  # Leave malformed elements to the final parse
@@ -0,0 +1,93 @@
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence
+
+try:
+    import tiktoken
+except ImportError:  # Installed with BlockAGI; estimate counts if it is missing
+    tiktoken = None
+
+# Context window of each model family, matched by longest prefix
+MODEL_CONTEXT_SIZES = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-vision": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo-1106": 16385,
+    "gpt-3.5-turbo-0125": 16385,
+    "gpt-3.5-turbo-16k": 16384,
+    "gpt-3.5-turbo": 4096,
+}
+DEFAULT_CONTEXT_SIZE = 4096
+
+# Tokens OpenAI adds around every chat message
+TOKENS_PER_MESSAGE = 4
+
+TRUNCATION_MARKER = "\n... (truncated)"
+
+
+def model_name(llm: Any) -> Optional[str]:
+    return getattr(llm, "model_name", None)
+
+
+def context_size(model: Optional[str]) -> int:
+    if model:
+        for prefix in sorted(MODEL_CONTEXT_SIZES, key=len, reverse=True):
+            if model.startswith(prefix):
+                return MODEL_CONTEXT_SIZES[prefix]
+    return DEFAULT_CONTEXT_SIZE
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: Optional[str]):
+    if model is None:
+        return tiktoken.get_encoding("cl100k_base")
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if tiktoken is None:
+        # Roughly 4 characters per token for English text
+        return (len(text) + 3) // 4
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Sequence[Any], model: Optional[str] = None) -> int:
+    return sum(count_tokens(m.content, model) + TOKENS_PER_MESSAGE for m in messages)
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut `text` to at most `max_tokens` tokens, marking the cut."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    max_tokens = max(0, max_tokens - count_tokens(TRUNCATION_MARKER, model))
+    if tiktoken is None:
+        return text[: max_tokens * 4] + TRUNCATION_MARKER
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARKER
+
+
+def pack_bins(sizes: List[int], capacity: int) -> List[List[int]]:
+    """Pack item indices into as few bins of `capacity` as possible.
+
+    Uses first-fit decreasing, which needs at most 11/9 of the optimal number
+    of bins. Items larger than `capacity` get a bin of their own.
+    """
+    bins: List[List[int]] = []
+    remaining: List[int] = []
+    for index in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        for b, space in enumerate(remaining):
+            if sizes[index] <= space:
+                bins[b].append(index)
+                remaining[b] -= sizes[index]
+                break
+        else:
+            bins.append([index])
+            remaining.append(capacity - sizes[index])
+    return bins
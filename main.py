@@ -1,22 +1,25 @@
+import asyncio
 import os
 import dotenv
 import typer
 import uvicorn
 import webbrowser
-import threading
 from typing import Any, Dict, Optional
 from datetime import datetime
 from dataclasses import dataclass
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from langchain.callbacks.base import BaseCallbackHandler
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, PlainTextResponse
 
 
 from blockagi.chains.base import BlockAGICallbackHandler
 from blockagi.schema import Objective, Findings, Narrative, Resource
-from blockagi.resource_pool import ResourcePool
-from blockagi.run import run_blockagi
+from blockagi.resource_pool import ResourcePool, SQLiteResourcePool
+from blockagi.llm_cache import LLMCache
+from blockagi.metrics import MetricsCollector
+from blockagi.run import arun_blockagi
+from blockagi.tools import BrowserPool, PageCache, SearchCache
 
 
 app = FastAPI()
@@ -29,8 +32,30 @@ def get_index():
 
 @app.get("/api/state")
 def get_api_state():
-    app.state.blockagi_state.resource_pool = app.state.resource_pool
-    return app.state.blockagi_state
+    # Only expose resource metadata; page content can be large and is not shown
+    return {
+        **vars(app.state.blockagi_state),
+        "resource_pool": {
+            "resources": [
+                Resource(url=r.url, description=r.description, visited=r.visited)
+                for r in app.state.resource_pool.get_all()
+            ]
+        },
+    }
+
+
+@app.get("/api/metrics")
+def get_api_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(
+        app.state.metrics.prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@app.get("/api/metrics/summary")
+def get_api_metrics_summary():
+    return app.state.metrics.summary_json()
 
 
 app.mount("/", StaticFiles(directory="dist"), name="dist")
@@ -86,19 +111,38 @@ class BlockAGIState:
 
 
 @app.on_event("startup")
-def on_startup():
-    app.state.resource_pool = ResourcePool()
-
-    def target(**kwargs):
+async def on_startup():
+    if app.state.resource_pool_path:
+        app.state.resource_pool = SQLiteResourcePool(app.state.resource_pool_path)
+    else:
+        app.state.resource_pool = ResourcePool()
+
+    # Launch the browser once so the first VisitWeb doesn't pay for startup
+    app.state.browser_pool = BrowserPool(**app.state.browser_options)
+    try:
+        # Launching Chromium blocks; keep the server's event loop responsive
+        await asyncio.to_thread(app.state.browser_pool.start)
+    except Exception as e:
+        app.state.blockagi_state.add_agent_log(f"Error: Cannot start browser: {e}")
+
+    app.state.page_cache = None
+    if app.state.page_cache_options["path"]:
+        app.state.page_cache = PageCache(**app.state.page_cache_options)
+
+    app.state.llm_cache = None
+    if app.state.llm_cache_options["path"]:
+        app.state.llm_cache = LLMCache(**app.state.llm_cache_options)
+
+    async def target(**kwargs):
         try:
-            run_blockagi(**kwargs)
+            await arun_blockagi(**kwargs)
         except Exception as e:
             app.state.blockagi_state.add_agent_log(f"Error: {e}")
         app.state.blockagi_state.end_time = datetime.utcnow().isoformat()
 
-    threading.Thread(
-        target=target,
-        kwargs=dict(
+    # Run the agent on the server's event loop; keep a reference to the task
+    app.state.agent_task = asyncio.create_task(
+        target(
             agent_role=app.state.blockagi_state.agent_role,
             openai_api_key=app.state.openai_api_key,
             openai_model=app.state.openai_model,
@@ -107,8 +151,19 @@ def on_startup():
             blockagi_callback=BlockAGICallback(app.state.blockagi_state),
             llm_callback=LLMCallback(app.state.blockagi_state),
             iteration_count=app.state.iteration_count,
-        ),
-    ).start()
+            browser_pool=app.state.browser_pool,
+            page_cache=app.state.page_cache,
+            prefetch_workers=app.state.prefetch_workers,
+            search_cache=SearchCache(**app.state.search_cache_options),
+            llm_cache=app.state.llm_cache,
+            **app.state.narrate_options,
+            **app.state.model_options,
+            metrics=app.state.metrics,
+            fuse_evaluate_plan=app.state.fuse_evaluate_plan,
+            **app.state.schedule_options,
+            **app.state.research_options,
+        )
+    )
     webbrowser.open(f"http://{app.state.host}:{app.state.port}")
 
 
@@ -139,7 +194,7 @@ class BlockAGICallback(BlockAGICallbackHandler):
             pass
         elif step == "NarrateChain":
             self.state.narratives.append(outputs["narrative"])
-        elif step == "EvaluateChain":
+        elif step in ("EvaluateChain", "EvaluatePlanChain"):
             self.state.objectives = outputs["updated_objectives"]
             self.state.findings = outputs["updated_findings"]
 
@@ -170,9 +225,119 @@ def main(
     objectives: list[str] = typer.Option(None, "--objectives", "-o"),
     openai_api_key: str = typer.Option(envvar="OPENAI_API_KEY"),
     openai_model: str = typer.Option(envvar="OPENAI_MODEL"),
+    resource_pool_path: Optional[str] = typer.Option(
+        None, envvar="BLOCKAGI_RESOURCE_POOL_PATH"
+    ),
+    browser_contexts: int = typer.Option(2, envvar="BLOCKAGI_BROWSER_CONTEXTS"),
+    browser_max_navigations: int = typer.Option(
+        50, envvar="BLOCKAGI_BROWSER_MAX_NAVIGATIONS"
+    ),
+    browser_wait_until: str = typer.Option(
+        "domcontentloaded", envvar="BLOCKAGI_BROWSER_WAIT_UNTIL"
+    ),
+    browser_timeout: float = typer.Option(15.0, envvar="BLOCKAGI_BROWSER_TIMEOUT"),
+    page_cache_path: Optional[str] = typer.Option(
+        None, envvar="BLOCKAGI_PAGE_CACHE_PATH"
+    ),
+    page_cache_ttl: float = typer.Option(86400, envvar="BLOCKAGI_PAGE_CACHE_TTL"),
+    page_cache_max_mb: int = typer.Option(500, envvar="BLOCKAGI_PAGE_CACHE_MAX_MB"),
+    prefetch_workers: int = typer.Option(0, envvar="BLOCKAGI_PREFETCH_WORKERS"),
+    search_cache_path: Optional[str] = typer.Option(
+        None, envvar="BLOCKAGI_SEARCH_CACHE_PATH"
+    ),
+    search_cache_ttl: float = typer.Option(3600, envvar="BLOCKAGI_SEARCH_CACHE_TTL"),
+    llm_cache_path: Optional[str] = typer.Option(
+        None, envvar="BLOCKAGI_LLM_CACHE_PATH"
+    ),
+    llm_cache_mode: str = typer.Option("read-write", envvar="BLOCKAGI_LLM_CACHE_MODE"),
+    llm_cache_max_mb: int = typer.Option(100, envvar="BLOCKAGI_LLM_CACHE_MAX_MB"),
+    narrate_mode: str = typer.Option("sequential", envvar="BLOCKAGI_NARRATE_MODE"),
+    narrate_map_model: Optional[str] = typer.Option(
+        None, envvar="BLOCKAGI_NARRATE_MAP_MODEL"
+    ),
+    narrate_passages: int = typer.Option(0, envvar="BLOCKAGI_NARRATE_PASSAGES"),
+    fuse_evaluate_plan: bool = typer.Option(
+        False, envvar="BLOCKAGI_FUSE_EVALUATE_PLAN"
+    ),
+    max_iteration_count: Optional[int] = typer.Option(
+        None, envvar="BLOCKAGI_MAX_ITERATION_COUNT"
+    ),
+    min_iteration_count: int = typer.Option(1, envvar="BLOCKAGI_MIN_ITERATION_COUNT"),
+    expertise_target: Optional[float] = typer.Option(
+        None, envvar="BLOCKAGI_EXPERTISE_TARGET"
+    ),
+    min_expertise_gain: float = typer.Option(
+        0.05, envvar="BLOCKAGI_MIN_EXPERTISE_GAIN"
+    ),
+    min_narrative_change: float = typer.Option(
+        0.05, envvar="BLOCKAGI_MIN_NARRATIVE_CHANGE"
+    ),
+    stale_rounds: Optional[int] = typer.Option(None, envvar="BLOCKAGI_STALE_ROUNDS"),
+    token_budget: Optional[int] = typer.Option(None, envvar="BLOCKAGI_TOKEN_BUDGET"),
+    time_budget: Optional[float] = typer.Option(None, envvar="BLOCKAGI_TIME_BUDGET"),
+    research_workers: int = typer.Option(4, envvar="BLOCKAGI_RESEARCH_WORKERS"),
+    research_concurrency: int = typer.Option(2, envvar="BLOCKAGI_RESEARCH_CONCURRENCY"),
+    research_tool_concurrency: Optional[str] = typer.Option(
+        None, envvar="BLOCKAGI_RESEARCH_TOOL_CONCURRENCY"
+    ),
+    research_task_timeout: float = typer.Option(
+        90, envvar="BLOCKAGI_RESEARCH_TASK_TIMEOUT"
+    ),
+    research_deadline: float = typer.Option(240, envvar="BLOCKAGI_RESEARCH_DEADLINE"),
+    model_routes: Optional[str] = typer.Option(None, envvar="BLOCKAGI_MODEL_ROUTES"),
+    model_slow_after: Optional[float] = typer.Option(
+        None, envvar="BLOCKAGI_MODEL_SLOW_AFTER"
+    ),
 ):
     app.state.host = host
     app.state.port = port
+    app.state.resource_pool_path = resource_pool_path
+    app.state.browser_options = dict(
+        size=browser_contexts,
+        max_navigations=browser_max_navigations,
+        wait_until=browser_wait_until,
+        timeout=browser_timeout,
+    )
+    app.state.page_cache_options = dict(
+        path=page_cache_path,
+        ttl=page_cache_ttl,
+        max_bytes=page_cache_max_mb * 1_000_000,
+    )
+    app.state.prefetch_workers = prefetch_workers
+    app.state.search_cache_options = dict(path=search_cache_path, ttl=search_cache_ttl)
+    app.state.narrate_options = dict(
+        narrate_mode=narrate_mode,
+        narrate_map_model=narrate_map_model,
+        narrate_passages=narrate_passages,
+    )
+    app.state.metrics = MetricsCollector()
+    app.state.fuse_evaluate_plan = fuse_evaluate_plan
+    app.state.schedule_options = dict(
+        max_iteration_count=max_iteration_count,
+        min_iteration_count=min_iteration_count,
+        expertise_target=expertise_target,
+        min_expertise_gain=min_expertise_gain,
+        min_narrative_change=min_narrative_change,
+        stale_rounds=stale_rounds,
+        token_budget=token_budget,
+        time_budget=time_budget,
+    )
+    app.state.research_options = dict(
+        research_workers=research_workers,
+        research_concurrency=research_concurrency,
+        research_tool_concurrency=research_tool_concurrency,
+        research_task_timeout=research_task_timeout,
+        research_deadline=research_deadline,
+    )
+    app.state.model_options = dict(
+        model_routes=model_routes,
+        model_slow_after=model_slow_after,
+    )
+    app.state.llm_cache_options = dict(
+        path=llm_cache_path,
+        mode=llm_cache_mode,
+        max_bytes=llm_cache_max_mb * 1_000_000,
+    )
     if not objectives:
         for index in range(1, 11):
             key = f"BLOCKAGI_OBJECTIVE_{index}"
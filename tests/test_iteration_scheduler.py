@@ -0,0 +1,106 @@
+import sys
+
+import pytest
+
+from blockagi.iteration_scheduler import IterationScheduler, narrative_change
+from blockagi.schema import Objective
+
+scheduler_module = sys.modules["blockagi.iteration_scheduler"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    return clock
+
+
+def objectives(*expertise):
+    return [Objective(topic=f"t{i}", expertise=e) for i, e in enumerate(expertise)]
+
+
+def run(scheduler, rounds):
+    """Feed (expertise, narrative) per round; return how many rounds ran."""
+    scheduler.start(objectives(0.0), "")
+    for count, (expertise, narrative) in enumerate(rounds, start=1):
+        another, _report = scheduler.end_round(objectives(expertise), narrative)
+        if not another:
+            return count
+    return len(rounds)
+
+
+def test_narrative_change():
+    assert narrative_change("a\nb", "a\nb") == 0
+    assert narrative_change("", "a\nb") == 1
+    assert 0 < narrative_change("a\nb\nc\nd", "a\nb\nc\nx") < 1
+
+
+def test_runs_exactly_the_planned_rounds_by_default(clock):
+    scheduler = IterationScheduler(rounds=3)
+    assert run(scheduler, [(0.1 * i, f"v{i}") for i in range(1, 10)]) == 3
+    assert scheduler.stop_reason == "finished the 3 planned rounds"
+
+
+def test_stops_when_every_objective_reaches_the_target(clock):
+    scheduler = IterationScheduler(rounds=5, expertise_target=0.8)
+    assert run(scheduler, [(0.5, "a"), (0.9, "b"), (1.0, "c")]) == 2
+    assert "expertise 0.8" in scheduler.stop_reason
+
+
+def test_min_rounds_delays_early_stops(clock):
+    scheduler = IterationScheduler(rounds=5, min_rounds=3, expertise_target=0.8)
+    assert run(scheduler, [(0.9, "a"), (0.9, "b"), (0.9, "c")]) == 3
+
+
+def test_stops_after_stale_rounds(clock):
+    scheduler = IterationScheduler(rounds=5, stale_rounds=2)
+    rounds = [(0.5, "a"), (0.51, "a"), (0.52, "a"), (0.9, "b")]
+    assert run(scheduler, rounds) == 3
+    assert scheduler.stop_reason.startswith("2 rounds in a row")
+
+
+def test_extends_while_making_progress_up_to_max_rounds(clock):
+    scheduler = IterationScheduler(rounds=2, max_rounds=4)
+    assert run(scheduler, [(0.1 * i, f"v{i}") for i in range(1, 10)]) == 4
+    assert scheduler.stop_reason == "reached the maximum of 4 rounds"
+
+
+def test_does_not_extend_after_a_stale_round(clock):
+    scheduler = IterationScheduler(rounds=2, max_rounds=4)
+    assert run(scheduler, [(0.5, "a"), (0.5, "a"), (0.9, "b")]) == 2
+
+
+def test_stops_before_exceeding_the_token_budget(clock):
+    used = {"tokens": 0}
+    scheduler = IterationScheduler(
+        rounds=10, token_budget=250, tokens_used=lambda: used["tokens"]
+    )
+    scheduler.start(objectives(0.0), "")
+    for count in range(1, 10):
+        used["tokens"] += 100
+        another, _report = scheduler.end_round(objectives(0.1 * count), f"v{count}")
+        if not another:
+            break
+    # After 2 rounds of 100 tokens, a third would likely exceed 250
+    assert count == 2
+    assert "token budget" in scheduler.stop_reason
+
+
+def test_stops_before_exceeding_the_time_budget(clock):
+    scheduler = IterationScheduler(rounds=10, time_budget=100)
+    scheduler.start(objectives(0.0), "")
+    for count in range(1, 10):
+        clock.now += 40
+        another, _report = scheduler.end_round(objectives(0.1 * count), f"v{count}")
+        if not another:
+            break
+    assert count == 2
+    assert "time budget" in scheduler.stop_reason
@@ -0,0 +1,49 @@
+import json
+
+from blockagi.utils.json_stream import JSONArrayStream
+
+TASKS = [
+    {
+        "tool": "VisitWeb",
+        "args": {"url": "https://a.com/{[x]}"},
+        "reasoning": 'say "hi"',
+    },
+    {"tool": "DuckDuckGoSearchLinks", "args": {"query": "q"}, "reasoning": "r"},
+]
+
+
+def feed_in_pieces(text, size):
+    stream = JSONArrayStream()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(stream.feed(text[start : start + size]))
+    return items
+
+
+def test_yields_each_object_once_whatever_the_chunking():
+    text = json.dumps(TASKS)
+    for size in (1, 2, 7, len(text)):
+        assert feed_in_pieces(text, size) == TASKS
+
+
+def test_yields_objects_as_soon_as_they_close():
+    stream = JSONArrayStream()
+    text = json.dumps(TASKS)
+    first_end = text.index("}, {") + 2  # After the "args" and task objects close
+    assert stream.feed(text[:first_end]) == [TASKS[0]]
+    assert stream.feed(text[first_end:]) == [TASKS[1]]
+
+
+def test_ignores_text_before_the_array():
+    text = "```json\n" + json.dumps(TASKS) + "\n```"
+    assert feed_in_pieces(text, 5) == TASKS
+
+
+def test_skips_malformed_and_non_object_elements():
+    text = '["... use up to 3 tools", {"tool": "A",, }, {"tool": "B"}]'
+    assert feed_in_pieces(text, 3) == [{"tool": "B"}]
+
+
+def test_stops_at_the_end_of_the_array():
+    text = '[{"a": 1}] and then [{"b": 2}]'
+    assert feed_in_pieces(text, 4) == [{"a": 1}]
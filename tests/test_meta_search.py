@@ -0,0 +1,38 @@
+from blockagi.tools.meta_search import RRF_K, fuse_rankings
+
+
+def link(url, title="title"):
+    return {"title": title, "link": url, "snippet": "snippet"}
+
+
+def test_links_found_by_several_backends_rank_first():
+    fused = fuse_rankings(
+        {
+            "google": [link("https://a.com/"), link("https://b.com/")],
+            "duckduckgo": [link("https://b.com/"), link("https://c.com/")],
+        }
+    )
+    assert [e["link"] for e in fused] == [
+        "https://b.com/",
+        "https://a.com/",
+        "https://c.com/",
+    ]
+    assert fused[0]["sources"] == ["google", "duckduckgo"]
+    assert fused[0]["score"] == 1 / (RRF_K + 2) + 1 / (RRF_K + 1)
+
+
+def test_links_are_merged_by_normalized_url():
+    fused = fuse_rankings(
+        {
+            "google": [link("HTTPS://Example.com:443/path", title="first")],
+            "duckduckgo": [link("https://example.com/path", title="second")],
+        }
+    )
+    assert len(fused) == 1
+    # The first backend's title and snippet are kept
+    assert fused[0]["title"] == "first"
+    assert fused[0]["link"] == "https://example.com/path"
+
+
+def test_no_results():
+    assert fuse_rankings({"google": [], "duckduckgo": []}) == []
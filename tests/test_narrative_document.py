@@ -0,0 +1,102 @@
+import pytest
+
+from blockagi.narrative_document import NarrativeDocument
+
+REPORT = """# ⛳️ Neutron
+
+Intro.
+
+## 🌈 Overview
+Neutron is a smart contract platform.
+
+## 📚 Security
+Uses Interchain Security.
+
+[^1^]: [Docs](https://docs.neutron.org)"""
+
+
+@pytest.fixture
+def document():
+    return NarrativeDocument.parse(REPORT)
+
+
+def test_parse_and_render_round_trip(document):
+    assert document.title == "# ⛳️ Neutron"
+    assert document.preamble == "Intro."
+    assert [s.heading for s in document.sections] == ["## 🌈 Overview", "## 📚 Security"]
+    assert list(document.footnotes) == ["1"]
+    assert document.render() == REPORT
+
+
+def test_replace_section_matches_heading_loosely(document):
+    applied = document.apply(
+        [{"op": "replace_section", "heading": "overview", "content": "New text."}]
+    )
+    assert applied == {"replace_section": 1}
+    assert document.sections[0].heading == "## 🌈 Overview"
+    assert document.sections[0].body == "New text."
+
+
+def test_add_section_after_an_existing_one(document):
+    document.apply(
+        [
+            {
+                "op": "add_section",
+                "heading": "## 🤖 Tokenomics",
+                "content": "NTRN.",
+                "after": "## 🌈 Overview",
+            }
+        ]
+    )
+    assert [s.heading for s in document.sections] == [
+        "## 🌈 Overview",
+        "## 🤖 Tokenomics",
+        "## 📚 Security",
+    ]
+
+
+def test_add_existing_section_replaces_it(document):
+    document.apply([{"op": "add_section", "heading": "## Security", "content": "X."}])
+    assert len(document.sections) == 2
+    assert document.sections[1].body == "X."
+
+
+def test_replace_missing_section_adds_it(document):
+    document.apply([{"op": "replace_section", "heading": "## New", "content": "Y."}])
+    assert document.sections[-1].heading == "## New"
+
+
+def test_delete_section_and_set_title(document):
+    document.apply(
+        [
+            {"op": "delete_section", "heading": "## 📚 Security"},
+            {"op": "delete_section", "heading": "## Missing"},
+            {"op": "set_title", "heading": "# Neutron Report"},
+        ]
+    )
+    assert [s.heading for s in document.sections] == ["## 🌈 Overview"]
+    assert document.title == "# Neutron Report"
+
+
+def test_add_footnotes_replaces_same_label(document):
+    document.apply(
+        [
+            {
+                "op": "add_footnotes",
+                "footnotes": [
+                    "[^1^]: [New docs](https://neutron.org)",
+                    "[^2^]: [Blog](https://blog.neutron.org)",
+                    "not a footnote",
+                ],
+            }
+        ]
+    )
+    assert list(document.footnotes.values()) == [
+        "[^1^]: [New docs](https://neutron.org)",
+        "[^2^]: [Blog](https://blog.neutron.org)",
+    ]
+
+
+def test_unknown_edit_raises(document):
+    with pytest.raises(ValueError):
+        document.apply([{"op": "rewrite_everything"}])
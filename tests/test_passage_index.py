@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from blockagi.passage_index import PassageIndex, split_passages
+
+ORACLE = "Band protocol oracles provide decentralized price feeds. " * 5
+ZEBRA = "Zebras are African equines with black and white stripes. " * 5
+
+
+@pytest.fixture
+def index():
+    return PassageIndex(passage_chars=100)
+
+
+def test_split_passages_respects_max_chars():
+    text = "First paragraph.\n\nSecond one. It has two sentences.\n\n" + "x" * 250
+    passages = split_passages(text, max_chars=100)
+    assert all(len(p) <= 100 for p in passages)
+    assert passages[0] == "First paragraph.\n\nSecond one. It has two sentences."
+    assert "".join(passages[1:]) == "x" * 250
+
+
+def test_search_finds_relevant_passages(index):
+    index.add("https://a.com", ORACLE, "[A](https://a.com)")
+    index.add("https://z.com", ZEBRA)
+    results = index.search("oracle price feeds", top_k=3)
+    assert results
+    assert {p.url for p, _score in results} == {"https://a.com"}
+    assert results[0][0].citation == "[A](https://a.com)"
+    assert index.search("price feeds", urls=["https://z.com"]) == []
+
+
+def test_adding_the_same_content_again_is_a_no_op(index):
+    assert index.add("https://a.com", ORACLE) > 0
+    assert index.add("https://a.com", ORACLE) == 0
+    assert len(index) == len(index.documents("https://a.com"))
+
+
+def test_changed_content_replaces_the_document(index):
+    index.add("https://a.com", ORACLE)
+    index.add("https://a.com", ZEBRA)
+    assert all("Zebras" in p.text for p in index.documents("https://a.com"))
+    assert index.search("oracle") == []
+
+
+def test_retain_drops_other_documents_and_their_frequencies(index):
+    index.add("https://a.com", ORACLE)
+    index.add("https://z.com", ZEBRA)
+    assert index.retain(["https://z.com"]) == 1
+    assert index.documents("https://a.com") == []
+
+    fresh = PassageIndex(passage_chars=100)
+    fresh.add("https://z.com", ZEBRA)
+    assert len(index) == len(fresh)
+    assert np.array_equal(index._df, fresh._df)
+
+
+def test_search_empty_index(index):
+    assert index.search("anything") == []
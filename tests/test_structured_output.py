@@ -0,0 +1,133 @@
+import json
+from typing import List
+
+import pytest
+
+from blockagi.schema import ResearchTask
+from blockagi.structured_output import (
+    WHOLE,
+    OutputRepairError,
+    StructuredOutput,
+    close_truncated,
+    extract_span,
+    remove_trailing_commas,
+    strip_fence,
+    validate,
+)
+
+TASK = {"tool": "VisitWeb", "args": {"url": "https://example.com"}, "reasoning": "r"}
+EVALUATION_SCHEMA = {"remark": str, "expertise": float}
+
+
+@pytest.fixture
+def output():
+    return StructuredOutput()
+
+
+def test_strip_fence():
+    assert strip_fence("```json\n[1, 2]\n```") == "[1, 2]\n"
+    assert strip_fence("[1, 2]") == "[1, 2]"
+
+
+def test_extract_span_cuts_out_surrounding_prose():
+    assert extract_span('Here is the plan: [{"a": "]"}] Good luck!') == '[{"a": "]"}]'
+
+
+def test_remove_trailing_commas_ignores_commas_in_strings():
+    text = '{"a": [1, 2,], "b": "x,}",}'
+    assert json.loads(remove_trailing_commas(text)) == {"a": [1, 2], "b": "x,}"}
+
+
+def test_close_truncated_drops_the_unfinished_element():
+    text = '[{"a": 1}, {"b": 2}, {"c": "cut off'
+    assert json.loads(close_truncated(text)) == [{"a": 1}, {"b": 2}]
+
+
+def test_validate_dataclass():
+    assert validate(TASK, ResearchTask) is None
+    assert validate({**TASK, "tool": 1}, ResearchTask) == '"tool" has the wrong type'
+    assert validate({"tool": "x"}, ResearchTask) == '"args" is missing'
+    assert validate("x", ResearchTask) == "expected a JSON object"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        f"```json\n[{json.dumps(TASK)}]\n```",
+        f"Sure! [{json.dumps(TASK)}] Hope this helps.",
+        f"[{json.dumps(TASK)},]",
+        f'[{json.dumps(TASK)}, {{"tool": "Visit',
+    ],
+    ids=["fence", "prose", "trailing_comma", "truncated"],
+)
+def test_parse_repairs_malformed_responses(output, text):
+    value, invalid = output.parse(text, List[ResearchTask])
+    assert value == [TASK]
+    assert invalid == {}
+
+
+def test_parse_drops_copied_placeholders(output):
+    text = json.dumps([TASK, "... use up to 3 tools"])
+    assert output.parse(text, List[ResearchTask]) == ([TASK], {})
+    nested = json.dumps({"research_tasks": [TASK, "... use up to 3 tools"]})
+    assert output.parse(nested, {"research_tasks": List[ResearchTask]}) == (
+        {"research_tasks": [TASK]},
+        {},
+    )
+    assert output.counts["placeholder"] == 2
+
+
+def test_parse_keeps_strings_in_arrays_of_strings(output):
+    assert output.parse('["a", "b"]', List[str]) == (["a", "b"], {})
+
+
+def test_parse_reports_unparseable_response(output):
+    value, invalid = output.parse("no JSON here", List[ResearchTask])
+    assert value is None
+    assert list(invalid) == [WHOLE]
+
+
+def test_parse_reports_invalid_elements_and_keys(output):
+    _, invalid = output.parse(json.dumps([TASK, {"tool": "x"}]), List[ResearchTask])
+    assert list(invalid) == [1]
+    _, invalid = output.parse('{"remark": "ok"}', EVALUATION_SCHEMA)
+    assert invalid == {"expertise": "missing"}
+
+
+def test_merge_replaces_invalid_elements_in_order(output):
+    fixed = {**TASK, "reasoning": "fixed"}
+    value = [TASK, {"tool": "x"}, TASK]
+    merged = output.merge(
+        value, {1: "invalid"}, json.dumps([fixed]), List[ResearchTask]
+    )
+    assert merged == [TASK, fixed, TASK]
+
+
+def test_merge_drops_elements_still_invalid(output):
+    value = [TASK, {"tool": "x"}]
+    merged = output.merge(value, {1: "invalid"}, "[]", List[ResearchTask])
+    assert merged == [TASK]
+    assert output.counts["dropped"] == 1
+
+
+def test_merge_fills_missing_keys(output):
+    merged = output.merge(
+        {"remark": "ok"},
+        {"expertise": "missing"},
+        '```json\n{"expertise": 0.5}\n```',
+        EVALUATION_SCHEMA,
+    )
+    assert merged == {"remark": "ok", "expertise": 0.5}
+
+
+def test_merge_fails_when_keys_are_still_missing(output):
+    with pytest.raises(OutputRepairError):
+        output.merge(
+            {"remark": "ok"}, {"expertise": "missing"}, "{}", EVALUATION_SCHEMA
+        )
+    assert output.counts["failed"] == 1
+
+
+def test_merge_replaces_an_unusable_response(output):
+    invalid = {WHOLE: "no JSON found"}
+    assert output.merge(None, invalid, json.dumps([TASK]), List[ResearchTask]) == [TASK]
@@ -0,0 +1,83 @@
+import sys
+
+import pytest
+
+from blockagi.tools.throttle import CircuitBreaker, TokenBucket, parse_retry_after
+
+# `blockagi.tools.throttle` is shadowed by the Throttle singleton of that name
+throttle_module = sys.modules["blockagi.tools.throttle"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle_module.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_waits(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket._take() for _ in range(3)] == [0, 0, 0]
+    assert bucket._take() == pytest.approx(0.5)
+
+
+def test_token_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket._take()
+    bucket._take()
+    clock.now += 10
+    assert [bucket._take() for _ in range(2)] == [0, 0]
+    assert bucket._take() > 0
+
+
+def test_token_bucket_pause_holds_back_callers(clock):
+    bucket = TokenBucket(rate=1, burst=5)
+    bucket.pause(10)
+    assert bucket._take() == pytest.approx(11)
+    clock.now += 11
+    assert bucket._take() == 0
+
+
+def test_circuit_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_lets_one_trial_call_through_after_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    assert not breaker.allow()  # Only a single trial while half-open
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_circuit_breaker_reopens_when_the_trial_fails(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("-5") == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
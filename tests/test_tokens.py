@@ -0,0 +1,58 @@
+import pytest
+
+from blockagi.utils.tokens import (
+    DEFAULT_CONTEXT_SIZE,
+    context_size,
+    count_tokens,
+    pack_bins,
+    truncate_tokens,
+)
+
+
+def test_pack_bins_fills_bins_first_fit_decreasing():
+    assert pack_bins([5, 4, 3, 2, 1], capacity=7) == [[0, 3], [1, 2], [4]]
+
+
+def test_pack_bins_gives_oversized_items_their_own_bin():
+    assert pack_bins([10, 2, 3], capacity=5) == [[0], [2, 1]]
+
+
+def test_pack_bins_keeps_every_item_once():
+    sizes = [3, 8, 1, 7, 4, 4, 2, 9, 5]
+    bins = pack_bins(sizes, capacity=10)
+    assert sorted(i for b in bins for i in b) == list(range(len(sizes)))
+    assert all(sum(sizes[i] for i in b) <= 10 for b in bins)
+
+
+def test_pack_bins_without_items():
+    assert pack_bins([], capacity=10) == []
+
+
+@pytest.mark.parametrize(
+    "model, size",
+    [
+        ("gpt-4", 8192),
+        ("gpt-4-0613", 8192),
+        ("gpt-4-32k-0613", 32768),
+        ("gpt-4-1106-preview", 128000),
+        ("gpt-4o-mini", 128000),
+        ("gpt-3.5-turbo-16k", 16384),
+        ("gpt-3.5-turbo-0125", 16385),
+        ("gpt-3.5-turbo", 4096),
+        ("unknown-model", DEFAULT_CONTEXT_SIZE),
+        (None, DEFAULT_CONTEXT_SIZE),
+    ],
+)
+def test_context_size(model, size):
+    assert context_size(model) == size
+
+
+def test_truncate_tokens_keeps_short_text():
+    assert truncate_tokens("short text", 100) == "short text"
+
+
+def test_truncate_tokens_fits_the_budget():
+    text = "word " * 1000
+    truncated = truncate_tokens(text, 50)
+    assert truncated.endswith("(truncated)")
+    assert count_tokens(truncated) <= 50